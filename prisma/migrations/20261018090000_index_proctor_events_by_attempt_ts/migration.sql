@@ -0,0 +1,5 @@
+-- CreateIndex
+CREATE INDEX "ProctorEvent_attemptId_ts_idx" ON "ProctorEvent"("attemptId", "ts");
+
+-- CreateIndex
+CREATE INDEX "PublicProctorEvent_attemptId_ts_idx" ON "PublicProctorEvent"("attemptId", "ts");
@@ -0,0 +1,32 @@
+-- Tables owned by the proctor worker (workers/proctor), kept in their own
+-- schema outside the Prisma-managed models. IF NOT EXISTS: workers before
+-- this migration created them at startup.
+
+-- CreateSchema
+CREATE SCHEMA IF NOT EXISTS "proctor_worker";
+
+-- CreateTable
+CREATE TABLE IF NOT EXISTS "proctor_worker"."analysis_result_cache" (
+    "content_hash" TEXT NOT NULL,
+    "analyzer_version" TEXT NOT NULL,
+    "events" JSONB NOT NULL,
+    "features" BYTEA,
+    "created_on" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY ("content_hash", "analyzer_version")
+);
+
+-- CreateTable
+CREATE TABLE IF NOT EXISTS "proctor_worker"."risk_score_cache" (
+    "key" TEXT PRIMARY KEY,
+    "result" JSONB NOT NULL,
+    "created_on" TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- CreateTable
+CREATE TABLE IF NOT EXISTS "proctor_worker"."analysis_checkpoint" (
+    "key" TEXT NOT NULL,
+    "analyzer" TEXT NOT NULL,
+    "state" BYTEA NOT NULL,
+    "updated_on" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY ("key", "analyzer")
+);
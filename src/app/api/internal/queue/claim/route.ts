@@ -18,7 +18,40 @@ export async function POST(request: NextRequest) {
     return auth.response;
   }
 
-  const job = await fetchProctorAnalysisJob();
+  // Older workers send no body and get FIFO order
+  const body = await request.json().catch(() => ({}));
+  const { sizePreference, minBytes, maxBytes, maxWaitSeconds } = body ?? {};
+
+  if (
+    sizePreference !== undefined &&
+    !['fifo', 'small', 'large'].includes(sizePreference)
+  ) {
+    return NextResponse.json(
+      { error: 'sizePreference must be fifo, small or large' },
+      { status: 400 }
+    );
+  }
+
+  // Workers send null for limits they do not set
+  const limits = { minBytes, maxBytes, maxWaitSeconds };
+  for (const [name, value] of Object.entries(limits)) {
+    if (
+      value != null &&
+      (typeof value !== 'number' || !Number.isFinite(value) || value < 0)
+    ) {
+      return NextResponse.json(
+        { error: `${name} must be a non-negative number` },
+        { status: 400 }
+      );
+    }
+  }
+
+  const job = await fetchProctorAnalysisJob({
+    sizePreference,
+    minBytes,
+    maxBytes,
+    maxWaitSeconds,
+  });
 
   if (!job) {
     return NextResponse.json({ job: null });
@@ -15,13 +15,21 @@ export async function POST(request: NextRequest) {
   }
 
   const body = await request.json();
-  const { jobId, error } = body ?? {};
+  const { jobId, error, retry } = body ?? {};
 
   if (!jobId) {
     return NextResponse.json({ error: 'jobId is required' }, { status: 400 });
   }
 
-  await failProctorAnalysisJob(jobId, error);
+  if (retry !== undefined && typeof retry !== 'boolean') {
+    return NextResponse.json(
+      { error: 'retry must be a boolean if provided' },
+      { status: 400 }
+    );
+  }
+
+  // Workers send retry: false for jobs that cannot succeed on another attempt
+  await failProctorAnalysisJob(jobId, error, { retry });
 
   return NextResponse.json({ success: true });
 }
@@ -0,0 +1,48 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { extendProctorAnalysisJobLeases } from '@/lib/queue';
+import { requireWorkerAuth } from '@/lib/worker-auth';
+import { rateLimitConfigs, withRateLimit } from '@/lib/rate-limit';
+
+const MAX_LEASE_SECONDS = 60 * 60;
+
+export async function POST(request: NextRequest) {
+  // Heartbeats arrive every minute or so per worker; use the general API limit
+  const rateLimited = await withRateLimit(request, rateLimitConfigs.api);
+  if (rateLimited) {
+    return rateLimited;
+  }
+
+  const auth = requireWorkerAuth(request);
+  if (!auth.authorized) {
+    return auth.response;
+  }
+
+  const body = await request.json();
+  const { jobIds, leaseSeconds } = body ?? {};
+
+  if (
+    !Array.isArray(jobIds) ||
+    jobIds.length === 0 ||
+    !jobIds.every((id) => typeof id === 'string')
+  ) {
+    return NextResponse.json(
+      { error: 'jobIds must be a non-empty array of strings' },
+      { status: 400 }
+    );
+  }
+
+  if (
+    typeof leaseSeconds !== 'number' ||
+    leaseSeconds <= 0 ||
+    leaseSeconds > MAX_LEASE_SECONDS
+  ) {
+    return NextResponse.json(
+      { error: `leaseSeconds must be between 1 and ${MAX_LEASE_SECONDS}` },
+      { status: 400 }
+    );
+  }
+
+  const extended = await extendProctorAnalysisJobLeases(jobIds, leaseSeconds);
+
+  return NextResponse.json({ success: true, extended });
+}
@@ -0,0 +1,27 @@
+import { NextRequest, NextResponse } from 'next/server';
+import { releaseProctorAnalysisJob } from '@/lib/queue';
+import { requireWorkerAuth } from '@/lib/worker-auth';
+import { rateLimitConfigs, withRateLimit } from '@/lib/rate-limit';
+
+export async function POST(request: NextRequest) {
+  const rateLimited = await withRateLimit(request, rateLimitConfigs.api);
+  if (rateLimited) {
+    return rateLimited;
+  }
+
+  const auth = requireWorkerAuth(request);
+  if (!auth.authorized) {
+    return auth.response;
+  }
+
+  const body = await request.json();
+  const { jobId } = body ?? {};
+
+  if (!jobId) {
+    return NextResponse.json({ error: 'jobId is required' }, { status: 400 });
+  }
+
+  const released = await releaseProctorAnalysisJob(jobId);
+
+  return NextResponse.json({ success: true, released });
+}
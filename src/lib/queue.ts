@@ -31,6 +31,7 @@ export interface ProctorAnalysisJobData {
   attemptId: string;
   s3Url?: string; // Optional for S3-stored videos
   databaseStored?: boolean; // Flag for database-stored videos
+  profile?: boolean; // Profile this job when the worker has PROFILE_DIR set
 }
 
 // Helper function to enqueue analysis job
@@ -64,9 +65,69 @@ export async function enqueueProctorAnalysis(data: ProctorAnalysisJobData) {
   }
 }
 
-export async function fetchProctorAnalysisJob() {
+// Claim preferences sent by a worker. `sizePreference` orders waiting jobs
+// by their asset's fileSize; min/max bytes restrict a worker to a size
+// range; jobs waiting longer than `maxWaitSeconds` are claimed first.
+export interface ProctorJobClaimOptions {
+  sizePreference?: 'fifo' | 'small' | 'large';
+  minBytes?: number | null;
+  maxBytes?: number | null;
+  maxWaitSeconds?: number | null;
+}
+
+export async function fetchProctorAnalysisJob(
+  options: ProctorJobClaimOptions = {}
+) {
   const pgBoss = await getBoss();
-  return pgBoss.fetch<ProctorAnalysisJobData>('proctor.analyse');
+  const sizePreference = options.sizePreference ?? 'fifo';
+  if (
+    sizePreference === 'fifo' &&
+    options.minBytes == null &&
+    options.maxBytes == null
+  ) {
+    return pgBoss.fetch<ProctorAnalysisJobData>('proctor.analyse');
+  }
+
+  // Same state transition as pgBoss.fetch, with a cost-aware order
+  const result = await pgBoss.getDb().executeSql(
+    `WITH next_job AS (
+       SELECT j.id FROM pgboss.job j
+       LEFT JOIN "ProctorAsset" a ON a.id = j.data->>'assetId'
+       WHERE j.name = 'proctor.analyse'
+         AND j.state < 'active'
+         AND j.startAfter < now()
+         AND ($1::bigint IS NULL OR COALESCE(a."fileSize", 0) >= $1)
+         AND ($2::bigint IS NULL OR COALESCE(a."fileSize", 0) <= $2)
+       ORDER BY j.createdOn < now() - make_interval(secs => $3) DESC,
+                j.priority DESC,
+                CASE WHEN $4 = 'small' THEN a."fileSize" END ASC NULLS FIRST,
+                CASE WHEN $4 = 'large' THEN a."fileSize" END DESC NULLS FIRST,
+                j.createdOn, j.id
+       LIMIT 1
+       FOR UPDATE OF j SKIP LOCKED
+     )
+     UPDATE pgboss.job j
+     SET state = 'active',
+         startedOn = now(),
+         retryCount = CASE WHEN j.state = 'retry' THEN j.retryCount + 1 ELSE j.retryCount END
+     FROM next_job
+     WHERE j.id = next_job.id
+     RETURNING j.id, j.name, j.data`,
+    [
+      options.minBytes ?? null,
+      options.maxBytes ?? null,
+      options.maxWaitSeconds ?? 1800,
+      sizePreference,
+    ]
+  );
+  const row = result.rows[0];
+  return row
+    ? {
+        id: row.id as string,
+        name: row.name as string,
+        data: row.data as ProctorAnalysisJobData,
+      }
+    : null;
 }
 
 export async function completeProctorAnalysisJob(
@@ -81,11 +142,23 @@ export async function completeProctorAnalysisJob(
   }
 }
 
+// Failed jobs are retried up to their retryLimit; with `retry: false` the
+// failure is final, e.g. for media that can never be analyzed
 export async function failProctorAnalysisJob(
   jobId: string,
-  error?: Record<string, any>
+  error?: Record<string, any>,
+  options: { retry?: boolean } = {}
 ) {
   const pgBoss = await getBoss();
+  if (options.retry === false) {
+    // pgBoss.fail only schedules a retry while retryCount < retryLimit
+    await pgBoss.getDb().executeSql(
+      `UPDATE pgboss.job
+       SET retryLimit = retryCount
+       WHERE id = $1::uuid AND name = 'proctor.analyse' AND state = 'active'`,
+      [jobId]
+    );
+  }
   if (error) {
     await pgBoss.fail(jobId, error);
   } else {
@@ -93,6 +166,39 @@ export async function failProctorAnalysisJob(
   }
 }
 
+// Extend the expiry of active jobs held by a worker. pg-boss expires an
+// active job once startedOn + expireIn has passed; the expiry is pushed to at
+// least leaseSeconds from now and never shortened below the queue's
+// expireInSeconds. Returns the ids that are still active.
+export async function extendProctorAnalysisJobLeases(
+  jobIds: string[],
+  leaseSeconds: number
+): Promise<string[]> {
+  const pgBoss = await getBoss();
+  const result = await pgBoss.getDb().executeSql(
+    `UPDATE pgboss.job
+     SET expireIn = GREATEST(expireIn, (now() - startedOn) + make_interval(secs => $2))
+     WHERE id = ANY($1::uuid[]) AND name = 'proctor.analyse' AND state = 'active'
+     RETURNING id`,
+    [jobIds, leaseSeconds]
+  );
+  return result.rows.map((row: { id: string }) => row.id);
+}
+
+// Return an active job to the queue without counting an attempt, e.g. when
+// a worker shuts down before finishing it
+export async function releaseProctorAnalysisJob(jobId: string) {
+  const pgBoss = await getBoss();
+  const result = await pgBoss.getDb().executeSql(
+    `UPDATE pgboss.job
+     SET state = 'created', startedOn = NULL
+     WHERE id = $1::uuid AND name = 'proctor.analyse' AND state = 'active'
+     RETURNING id`,
+    [jobId]
+  );
+  return result.rows.length > 0;
+}
+
 // Get queue status for monitoring
 export async function getQueueStatus() {
   try {
@@ -2,13 +2,71 @@ import os
 import ffmpeg
 import webrtcvad
 import wave
+import tempfile
 import numpy as np
 import logging
-from typing import List, Dict, Optional
-from pyannote.audio import Pipeline
+from typing import List, Dict, Optional, Tuple
+
+from .event_batch import EventBatch
+from .checkpoints import AnalysisCheckpointer, decode_stage_checkpoint, encode_stage_checkpoint
+from .metrics import stage_timer
+from .errors import AnalysisIncomplete
 
 logger = logging.getLogger(__name__)
 
+
+class SpectralFeatures:
+    """Mel-band power spectrogram of a recording, shared by the spectral detectors"""
+
+    def __init__(self, band_power: np.ndarray, band_edges_hz: np.ndarray, sample_rate: int, hop_length: int):
+        # band_power: (frames, bands) float32, mean-square signal power per mel band
+        self.band_power = band_power
+        self.band_edges_hz = band_edges_hz
+        self.band_centers_hz = band_edges_hz[1:-1]
+        self.sample_rate = sample_rate
+        self.hop_length = hop_length
+
+    @property
+    def num_frames(self) -> int:
+        return self.band_power.shape[0]
+
+    @property
+    def frame_seconds(self) -> float:
+        return self.hop_length / self.sample_rate
+
+    def band_energy(self, low_hz: float, high_hz: float) -> np.ndarray:
+        """Per-frame power of the mel bands centred in [low_hz, high_hz)"""
+        mask = (self.band_centers_hz >= low_hz) & (self.band_centers_hz < high_hz)
+        return self.band_power[:, mask].sum(axis=1, dtype=np.float32)
+
+    def window_means(self, values: np.ndarray, window_seconds: float) -> np.ndarray:
+        """Average per-frame values over consecutive non-overlapping windows (partial tail dropped)"""
+        frames_per_window = max(1, int(round(window_seconds / self.frame_seconds)))
+        num_windows = len(values) // frames_per_window
+        if num_windows == 0:
+            return np.zeros(0, dtype=np.float32)
+        return values[:num_windows * frames_per_window].reshape(num_windows, frames_per_window).mean(axis=1)
+
+
+def _mel_filterbank(sample_rate: int, n_fft: int, n_mels: int, fmin: float = 0.0, fmax: Optional[float] = None):
+    """Triangular (unnormalised, partition-of-unity) mel filters and their edge frequencies"""
+    fmax = fmax or sample_rate / 2.0
+    hz_to_mel = lambda hz: 2595.0 * np.log10(1.0 + hz / 700.0)
+    mel_to_hz = lambda mel: 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    edges_hz = mel_to_hz(np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), n_mels + 2))
+    fft_hz = np.linspace(0.0, sample_rate / 2.0, n_fft // 2 + 1)
+
+    filters = np.zeros((n_fft // 2 + 1, n_mels), dtype=np.float32)
+    for m in range(n_mels):
+        lower, center, upper = edges_hz[m], edges_hz[m + 1], edges_hz[m + 2]
+        rising = (fft_hz - lower) / (center - lower)
+        falling = (upper - fft_hz) / (upper - center)
+        filters[:, m] = np.maximum(0.0, np.minimum(rising, falling))
+
+    return filters, edges_hz
+
+
 class AudioAnalyzer:
     """Analyzes audio for proctoring violations"""
     
@@ -16,15 +74,35 @@ class AudioAnalyzer:
         # Initialize VAD
         self.vad = webrtcvad.Vad(2)  # Aggressiveness level 0-3 (higher = more aggressive)
         
-        # Initialize speaker diarization pipeline
-        try:
-            # This requires a HuggingFace token for pyannote models
-            # For now, we'll implement a simple approach
-            self.diarization_pipeline = None
-            logger.info("AudioAnalyzer initialized (basic mode)")
-        except Exception as e:
-            logger.warning(f"Could not initialize speaker diarization: {e}")
-            self.diarization_pipeline = None
+        # No diarization model: detect_multiple_speakers compares the mean
+        # amplitude of consecutive 5-second waveform segments instead
+        self.diarization_pipeline = None
+        logger.info("AudioAnalyzer initialized (basic mode)")
+
+        # Spectral feature stage (computed once per recording, queried by detectors)
+        self.n_fft = 512            # 32 ms at 16 kHz
+        self.hop_length = 320       # 20 ms
+        self.n_mels = 64
+        self.chunk_seconds = 30     # Audio is decoded and transformed in chunks of this size
+        self._spectral_cache: Optional[Tuple[str, SpectralFeatures]] = None
+    
+    def warm_up(self, seconds: float = 2.0, sample_rate: int = 16000):
+        """
+        Run the detectors once on a short buffer of low-level noise, so the
+        first job does not pay for VAD and FFT setup
+        """
+        samples = np.random.default_rng(0).normal(0, 300, int(seconds * sample_rate)).astype(np.int16)
+        with tempfile.TemporaryDirectory(prefix='audio_warm_up_') as temp_dir:
+            audio_path = os.path.join(temp_dir, 'warm_up.wav')
+            with wave.open(audio_path, 'wb') as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(sample_rate)
+                wav_file.writeframes(samples.tobytes())
+            self.detect_voice_activity(audio_path)
+            self.detect_multiple_speakers(audio_path)
+            self.detect_background_noise(audio_path)
+        self._spectral_cache = None
     
     def extract_audio(self, video_path: str, audio_path: str) -> bool:
         """Extract audio from video file"""
@@ -44,194 +122,247 @@ class AudioAnalyzer:
             logger.error(f"Failed to extract audio: {e}")
             return False
     
-    def detect_voice_activity(self, audio_path: str) -> List[Dict]:
+    def compute_spectral_features(self, audio_path: str) -> SpectralFeatures:
+        """Compute the framed mel spectrogram of a recording in float32, chunk by chunk"""
+        with wave.open(audio_path, 'rb') as wav_file:
+            sample_rate = wav_file.getframerate()
+            n_fft, hop = self.n_fft, self.hop_length
+
+            window = np.hanning(n_fft).astype(np.float32)
+            filters, edges_hz = _mel_filterbank(sample_rate, n_fft, self.n_mels)
+
+            # One-sided power scaled so that summing all bins gives the mean-square signal level
+            bin_scale = np.full(n_fft // 2 + 1, 2.0, dtype=np.float32)
+            bin_scale[0] = bin_scale[-1] = 1.0
+            bin_scale /= n_fft * float(np.sum(window ** 2))
+
+            chunk_samples = max(n_fft, int(sample_rate * self.chunk_seconds) // hop * hop)
+            carry = np.zeros(0, dtype=np.float32)
+            band_chunks = []
+
+            while True:
+                frames = wav_file.readframes(chunk_samples)
+                if not frames:
+                    break
+                samples = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+                buffer = np.concatenate([carry, samples])
+                if len(buffer) < n_fft:
+                    carry = buffer
+                    continue
+
+                num_frames = 1 + (len(buffer) - n_fft) // hop
+                framed = np.lib.stride_tricks.sliding_window_view(buffer, n_fft)[::hop][:num_frames]
+                spectrum = np.fft.rfft(framed * window, axis=1)
+                power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32) * bin_scale
+                band_chunks.append(power @ filters)
+
+                carry = buffer[num_frames * hop:]
+
+        if band_chunks:
+            band_power = np.concatenate(band_chunks)
+        else:
+            band_power = np.zeros((0, self.n_mels), dtype=np.float32)
+
+        logger.info(f"Computed spectral features: {band_power.shape[0]} frames x {band_power.shape[1]} mel bands")
+        return SpectralFeatures(band_power, edges_hz, sample_rate, self.hop_length)
+
+    def get_spectral_features(self, audio_path: str) -> SpectralFeatures:
+        """Return the cached spectral features for a recording, computing them on first use"""
+        if self._spectral_cache is None or self._spectral_cache[0] != audio_path:
+            self._spectral_cache = (audio_path, self.compute_spectral_features(audio_path))
+        return self._spectral_cache[1]
+
+    def detect_voice_activity(self, audio_path: str) -> EventBatch:
         """Detect voice activity segments using WebRTC VAD"""
-        events = []
+        events = EventBatch()
         
-        try:
-            with wave.open(audio_path, 'rb') as wav_file:
-                sample_rate = wav_file.getframerate()
-                
-                # Check if sample rate is supported by VAD
-                if sample_rate not in [8000, 16000, 32000, 48000]:
-                    logger.warning(f"Unsupported sample rate: {sample_rate}")
-                    return events
-                
-                frame_duration = 30  # ms
-                frame_size = int(sample_rate * frame_duration / 1000)
-                
-                silent_periods = []
-                current_silent_start = None
-                time_ms = 0
+        with wave.open(audio_path, 'rb') as wav_file:
+            sample_rate = wav_file.getframerate()
+            
+            # Check if sample rate is supported by VAD
+            if sample_rate not in [8000, 16000, 32000, 48000]:
+                raise ValueError(f"Unsupported sample rate for voice activity detection: {sample_rate}")
+            
+            frame_duration = 30  # ms
+            frame_size = int(sample_rate * frame_duration / 1000)
+            
+            silent_periods = []
+            current_silent_start = None
+            time_ms = 0
+            
+            while True:
+                frame = wav_file.readframes(frame_size)
+                if len(frame) < frame_size * 2:  # 2 bytes per sample
+                    break
                 
-                while True:
-                    frame = wav_file.readframes(frame_size)
-                    if len(frame) < frame_size * 2:  # 2 bytes per sample
-                        break
-                    
-                    # Check if frame contains speech
-                    is_speech = self.vad.is_speech(frame, sample_rate)
-                    
-                    if not is_speech:
-                        if current_silent_start is None:
-                            current_silent_start = time_ms
-                    else:
-                        if current_silent_start is not None:
-                            silent_duration = time_ms - current_silent_start
-                            # Report suspicious silence (longer than 30 seconds)
-                            if silent_duration > 30000:
-                                events.append({
-                                    'type': 'SUSPICIOUS_SILENCE',
-                                    'timestamp': current_silent_start / 1000.0,
-                                    'extra': {
-                                        'duration_seconds': silent_duration / 1000.0,
-                                        'start_time': current_silent_start / 1000.0,
-                                        'end_time': time_ms / 1000.0
-                                    }
-                                })
-                            current_silent_start = None
-                    
-                    time_ms += frame_duration
+                # Check if frame contains speech
+                is_speech = self.vad.is_speech(frame, sample_rate)
                 
-                # Handle final silent period
-                if current_silent_start is not None:
-                    silent_duration = time_ms - current_silent_start
-                    if silent_duration > 30000:
-                        events.append({
-                            'type': 'SUSPICIOUS_SILENCE',
-                            'timestamp': current_silent_start / 1000.0,
-                            'extra': {
+                if not is_speech:
+                    if current_silent_start is None:
+                        current_silent_start = time_ms
+                else:
+                    if current_silent_start is not None:
+                        silent_duration = time_ms - current_silent_start
+                        # Report suspicious silence (longer than 30 seconds)
+                        if silent_duration > 30000:
+                            events.append('SUSPICIOUS_SILENCE', current_silent_start / 1000.0, {
                                 'duration_seconds': silent_duration / 1000.0,
                                 'start_time': current_silent_start / 1000.0,
                                 'end_time': time_ms / 1000.0
-                            }
-                        })
+                            })
+                        current_silent_start = None
                 
-        except Exception as e:
-            logger.error(f"Error in voice activity detection: {e}")
+                time_ms += frame_duration
+            
+            # Handle final silent period
+            if current_silent_start is not None:
+                silent_duration = time_ms - current_silent_start
+                if silent_duration > 30000:
+                    events.append('SUSPICIOUS_SILENCE', current_silent_start / 1000.0, {
+                        'duration_seconds': silent_duration / 1000.0,
+                        'start_time': current_silent_start / 1000.0,
+                        'end_time': time_ms / 1000.0
+                    })
         
         return events
     
-    def detect_multiple_speakers(self, audio_path: str) -> List[Dict]:
+    def detect_multiple_speakers(self, audio_path: str) -> EventBatch:
         """Detect multiple speakers (simplified implementation)"""
-        events = []
+        events = EventBatch()
         
-        try:
-            # Simple energy-based analysis for multiple speakers
-            # This is a basic implementation - for production, use pyannote or similar
+        # Simple energy-based analysis for multiple speakers
+        # This is a basic implementation - for production, use pyannote or similar
+        
+        with wave.open(audio_path, 'rb') as wav_file:
+            sample_rate = wav_file.getframerate()
+            frames = wav_file.readframes(-1)
+            audio_data = np.frombuffer(frames, dtype=np.int16)
             
-            with wave.open(audio_path, 'rb') as wav_file:
-                sample_rate = wav_file.getframerate()
-                frames = wav_file.readframes(-1)
-                audio_data = np.frombuffer(frames, dtype=np.int16)
-                
-                # Split audio into 5-second segments
-                segment_length = sample_rate * 5
-                num_segments = len(audio_data) // segment_length
+            # Split audio into 5-second segments
+            segment_length = sample_rate * 5
+            num_segments = len(audio_data) // segment_length
+            
+            speaker_change_threshold = 0.3  # Threshold for detecting speaker changes
+            
+            for i in range(1, num_segments):
+                # Calculate energy difference between consecutive segments
+                prev_segment = audio_data[(i-1)*segment_length:i*segment_length]
+                curr_segment = audio_data[i*segment_length:(i+1)*segment_length]
                 
-                speaker_change_threshold = 0.3  # Threshold for detecting speaker changes
+                prev_energy = np.mean(np.abs(prev_segment))
+                curr_energy = np.mean(np.abs(curr_segment))
                 
-                for i in range(1, num_segments):
-                    # Calculate energy difference between consecutive segments
-                    prev_segment = audio_data[(i-1)*segment_length:i*segment_length]
-                    curr_segment = audio_data[i*segment_length:(i+1)*segment_length]
-                    
-                    prev_energy = np.mean(np.abs(prev_segment))
-                    curr_energy = np.mean(np.abs(curr_segment))
+                if prev_energy > 0:
+                    energy_ratio = abs(curr_energy - prev_energy) / prev_energy
                     
-                    if prev_energy > 0:
-                        energy_ratio = abs(curr_energy - prev_energy) / prev_energy
-                        
-                        # If energy changes significantly, might indicate speaker change
-                        if energy_ratio > speaker_change_threshold and curr_energy > 1000:
-                            events.append({
-                                'type': 'POSSIBLE_SPEAKER_CHANGE',
-                                'timestamp': i * 5.0,
-                                'extra': {
-                                    'energy_ratio': energy_ratio,
-                                    'segment_start': i * 5.0,
-                                    'prev_energy': float(prev_energy),
-                                    'curr_energy': float(curr_energy)
-                                }
-                            })
-                
-                # If we detect multiple speaker changes, flag as multiple speakers
-                if len(events) > 3:  # More than 3 speaker changes suggests multiple people
-                    events.append({
-                        'type': 'MULTIPLE_SPEAKERS_DETECTED',
-                        'timestamp': 0.0,
-                        'extra': {
-                            'speaker_changes': len(events),
-                            'confidence': min(len(events) / 10.0, 1.0)
-                        }
-                    })
-                
-        except Exception as e:
-            logger.error(f"Error in multiple speaker detection: {e}")
+                    # If energy changes significantly, might indicate speaker change
+                    if energy_ratio > speaker_change_threshold and curr_energy > 1000:
+                        events.append('POSSIBLE_SPEAKER_CHANGE', i * 5.0, {
+                            'energy_ratio': energy_ratio,
+                            'segment_start': i * 5.0,
+                            'prev_energy': float(prev_energy),
+                            'curr_energy': float(curr_energy)
+                        })
+            
+            # If we detect multiple speaker changes, flag as multiple speakers
+            if len(events) > 3:  # More than 3 speaker changes suggests multiple people
+                events.append('MULTIPLE_SPEAKERS_DETECTED', 0.0, {
+                    'speaker_changes': len(events),
+                    'confidence': min(len(events) / 10.0, 1.0)
+                })
         
         return events
     
-    def detect_background_noise(self, audio_path: str) -> List[Dict]:
-        """Detect suspicious background noises"""
-        events = []
+    def detect_background_noise(self, audio_path: str) -> EventBatch:
+        """Detect suspicious background noises from broadband (non-speech band) energy"""
+        events = EventBatch()
         
-        try:
-            with wave.open(audio_path, 'rb') as wav_file:
-                sample_rate = wav_file.getframerate()
-                frames = wav_file.readframes(-1)
-                audio_data = np.frombuffer(frames, dtype=np.int16)
-                
-                # Calculate RMS energy in 2-second windows
-                window_size = sample_rate * 2
-                noise_threshold = 5000  # Threshold for background noise
-                
-                for i in range(0, len(audio_data) - window_size, window_size):
-                    window = audio_data[i:i + window_size]
-                    rms_energy = np.sqrt(np.mean(window**2))
-                    
-                    # Detect sudden spikes in background noise
-                    if rms_energy > noise_threshold:
-                        events.append({
-                            'type': 'BACKGROUND_NOISE',
-                            'timestamp': i / sample_rate,
-                            'extra': {
-                                'rms_energy': float(rms_energy),
-                                'duration': 2.0
-                            }
-                        })
-                
-        except Exception as e:
-            logger.error(f"Error in background noise detection: {e}")
+        features = self.get_spectral_features(audio_path)
+        
+        # Speech is concentrated in 300-3400 Hz; energy outside that band is environmental
+        speech_power = features.band_energy(300.0, 3400.0)
+        total_power = features.band_power.sum(axis=1, dtype=np.float32)
+        noise_power = np.maximum(total_power - speech_power, 0.0)
+        
+        # Mean band RMS in 2-second windows
+        window_seconds = 2.0
+        noise_rms = np.sqrt(features.window_means(noise_power, window_seconds))
+        speech_rms = np.sqrt(features.window_means(speech_power, window_seconds))
+        noise_threshold = 5000 / 32768.0  # Same level as the former int16 RMS threshold
+        
+        for i in np.flatnonzero(noise_rms > noise_threshold):
+            events.append('BACKGROUND_NOISE', float(i * window_seconds), {
+                'noise_band_rms': float(noise_rms[i]),
+                'speech_band_rms': float(speech_rms[i]),
+                'duration': window_seconds
+            })
         
         return events
     
-    def analyze_audio(self, video_path: str, audio_path: str) -> List[Dict]:
-        """Main audio analysis pipeline"""
+    def analyze_audio(self, video_path: str, audio_path: str,
+                      checkpoint: Optional[AnalysisCheckpointer] = None) -> EventBatch:
+        """
+        Main audio analysis pipeline. With `checkpoint`, the events of each
+        completed detector are checkpointed and a retried job skips them.
+        
+        Raises AnalysisIncomplete, carrying the events found, when the audio
+        cannot be extracted or a detector fails.
+        """
         logger.info(f"Starting audio analysis: {video_path}")
         
-        all_events = []
+        all_events = EventBatch()
+        completed: List[str] = []
+        saved = checkpoint.load('audio') if checkpoint else None
+        if saved is not None:
+            completed, all_events = decode_stage_checkpoint(saved)
+            logger.info(f"Resuming audio analysis after stages: {', '.join(completed) or 'none'}")
         
-        # Extract audio from video
-        if not self.extract_audio(video_path, audio_path):
-            logger.error("Failed to extract audio")
+        stages = [
+            ('voice_activity', self.detect_voice_activity),
+            ('multiple_speakers', self.detect_multiple_speakers),
+            ('background_noise', self.detect_background_noise),
+        ]
+        if all(name in completed for name, _ in stages):
+            logger.info(f"Audio analysis complete. Found {len(all_events)} events")
             return all_events
         
-        # Perform various audio analyses
+        # Extract audio from video
+        with stage_timer('audio_extract'):
+            extracted = self.extract_audio(video_path, audio_path)
+        if not extracted:
+            raise AnalysisIncomplete("Failed to extract audio", all_events)
+        
+        # Perform various audio analyses. A failed detector does not stop the
+        # others; it is left out of the checkpoint so a retry runs it again.
+        failed: List[str] = []
         try:
-            # Voice activity detection
-            vad_events = self.detect_voice_activity(audio_path)
-            all_events.extend(vad_events)
-            
-            # Multiple speaker detection
-            speaker_events = self.detect_multiple_speakers(audio_path)
-            all_events.extend(speaker_events)
+            # Spectral feature stage, shared by the spectral detectors below
+            try:
+                with stage_timer('spectral'):
+                    self.get_spectral_features(audio_path)
+            except Exception as e:
+                logger.error(f"Spectral feature stage failed: {e}")
             
-            # Background noise detection
-            noise_events = self.detect_background_noise(audio_path)
-            all_events.extend(noise_events)
-            
-        except Exception as e:
-            logger.error(f"Error during audio analysis: {e}")
+            # Voice activity, multiple speaker and background noise detection
+            for name, detect in stages:
+                if name in completed:
+                    continue
+                try:
+                    with stage_timer(name):
+                        all_events.extend(detect(audio_path))
+                except Exception as e:
+                    logger.error(f"Audio stage {name} failed: {e}")
+                    failed.append(name)
+                    continue
+                completed.append(name)
+                if checkpoint:
+                    checkpoint.save('audio', encode_stage_checkpoint(completed, all_events))
+        finally:
+            # Release the spectrogram; it is only valid for this recording
+            self._spectral_cache = None
         
+        if failed:
+            raise AnalysisIncomplete(f"Audio stages failed: {', '.join(failed)}", all_events)
         logger.info(f"Audio analysis complete. Found {len(all_events)} events")
-        return all_events 
\ No newline at end of file
+        return all_events
@@ -0,0 +1,212 @@
+import logging
+from datetime import timezone
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .risk_calculator import (
+    ImprovedRiskCalculator,
+    CLUSTER_EVENTS,
+    COPY_EVENTS,
+    COPY_FOLLOW_UP_EVENTS,
+    TAB_SWITCH_EVENTS,
+    _window_timestamp,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EventColumns:
+    """
+    Events of many attempts as parallel arrays. Rows are grouped by attempt
+    (contiguous, in input order); `sorted_order` orders each group by timestamp.
+    """
+
+    def __init__(self, attempt_ids: List[str], attempt_index: np.ndarray, type_names: List[str],
+                 type_code: np.ndarray, timestamp: np.ndarray, window_timestamp: np.ndarray,
+                 extras: List[Optional[Dict]]):
+        self.attempt_ids = attempt_ids
+        self.attempt_index = attempt_index
+        self.type_names = type_names
+        self.type_code = type_code
+        self.timestamp = timestamp
+        self.window_timestamp = window_timestamp
+        self.extras = extras
+
+        # np.lexsort is stable, so equal timestamps keep their input order
+        self.sorted_order = np.lexsort((timestamp, attempt_index))
+
+    def __len__(self) -> int:
+        return len(self.type_code)
+
+    @classmethod
+    def from_rows(cls, attempt_ids: List[str], rows: Iterable[Tuple[str, str, Any, Optional[Dict]]]) -> 'EventColumns':
+        """Build from (attemptId, type, ts, extra) rows grouped by attempt, as read from ProctorEvent"""
+        attempt_positions = {attempt_id: i for i, attempt_id in enumerate(attempt_ids)}
+        type_codes: Dict[str, int] = {}
+        attempt_index, codes, timestamps, extras = [], [], [], []
+
+        for attempt_id, event_type, ts, extra in rows:
+            code = type_codes.get(event_type)
+            if code is None:
+                code = type_codes[event_type] = len(type_codes)
+            attempt_index.append(attempt_positions[attempt_id])
+            codes.append(code)
+            # Prisma timestamps carry no zone and are UTC, as in ProctorWorker.load_browser_events
+            timestamps.append(ts.replace(tzinfo=timezone.utc).timestamp())
+            extras.append(extra)
+
+        timestamp = np.array(timestamps, dtype=np.float64)
+        return cls(
+            attempt_ids,
+            np.array(attempt_index, dtype=np.int64),
+            list(type_codes),
+            np.array(codes, dtype=np.int64),
+            timestamp,
+            timestamp,
+            extras,
+        )
+
+    @classmethod
+    def from_event_lists(cls, attempt_ids: List[str], event_lists: List[List[Dict]]) -> 'EventColumns':
+        """Build from per-attempt event dicts, as passed to calculate_risk_score"""
+        type_codes: Dict[str, int] = {}
+        attempt_index, codes, timestamps, window_timestamps, extras = [], [], [], [], []
+
+        for position, events in enumerate(event_lists):
+            for event in events:
+                event_type = event.get('type', 'UNKNOWN')
+                code = type_codes.get(event_type)
+                if code is None:
+                    code = type_codes[event_type] = len(type_codes)
+                attempt_index.append(position)
+                codes.append(code)
+                timestamps.append(event.get('timestamp', 0))
+                window_timestamps.append(_window_timestamp(event))
+                extras.append(event.get('extra'))
+
+        return cls(
+            list(attempt_ids),
+            np.array(attempt_index, dtype=np.int64),
+            list(type_codes),
+            np.array(codes, dtype=np.int64),
+            np.array(timestamps, dtype=np.float64),
+            np.array(window_timestamps, dtype=np.float64),
+            extras,
+        )
+
+
+class BatchRiskScorer:
+    """
+    Scores many attempts at once. Grouping, counting, pattern matching and
+    temporal windowing run as NumPy group-by passes over EventColumns; the
+    per-type, pattern and context formulas are those of ImprovedRiskCalculator,
+    so every breakdown equals calculate_risk_score on the same attempt.
+    """
+
+    def __init__(self, calculator: Optional[ImprovedRiskCalculator] = None):
+        self.calculator = calculator or ImprovedRiskCalculator()
+
+    def _codes(self, columns: EventColumns, event_types: Iterable[str]) -> np.ndarray:
+        wanted = set(event_types)
+        return np.array([code for code, name in enumerate(columns.type_names) if name in wanted], dtype=np.int64)
+
+    def score(self, columns: EventColumns, test_durations: List[float], question_counts: List[int]) -> List[Dict[str, Any]]:
+        """Return one risk breakdown per attempt in columns.attempt_ids"""
+        calculator = self.calculator
+        rules = calculator.refresh_rules()
+        num_attempts = len(columns.attempt_ids)
+        num_types = max(len(columns.type_names), 1)
+        attempts = columns.attempt_index
+        codes = columns.type_code
+
+        # Per (attempt, type) counts, and pairs in first-seen order within each attempt
+        pair_keys = attempts * num_types + codes
+        counts = np.bincount(pair_keys, minlength=num_attempts * num_types).reshape(num_attempts, num_types)
+        unique_pairs, first_positions = np.unique(pair_keys, return_index=True)
+        ordered_pairs = unique_pairs[np.argsort(first_positions, kind='stable')]
+        pair_bounds = np.searchsorted(ordered_pairs // num_types, np.arange(num_attempts + 1))
+
+        # Extras of context-dependent event types, per pair, in input order
+        context_extras: Dict[int, List[Dict]] = {}
+        context_codes = self._codes(columns, rules.context_event_types)
+        for position in np.flatnonzero(np.isin(codes, context_codes)).tolist():
+            extra = columns.extras[position]
+            context_extras.setdefault(int(pair_keys[position]), []).append({'extra': extra} if extra is not None else {})
+
+        # Timestamp-ordered view for the pattern checks
+        order = columns.sorted_order
+        sorted_attempts = attempts[order]
+        sorted_codes = codes[order]
+        sorted_times = columns.timestamp[order]
+
+        # Copy followed by tab activity within 30 s and 9 events, in the same attempt
+        copy_positions = np.flatnonzero(np.isin(sorted_codes, self._codes(columns, COPY_EVENTS)))
+        follow_positions = np.flatnonzero(np.isin(sorted_codes, self._codes(columns, COPY_FOLLOW_UP_EVENTS)))
+        copy_search_counts = np.zeros(num_attempts, dtype=np.int64)
+        if len(copy_positions) and len(follow_positions):
+            next_index = np.searchsorted(follow_positions, copy_positions, side='right')
+            has_next = next_index < len(follow_positions)
+            next_follow = follow_positions[np.minimum(next_index, len(follow_positions) - 1)]
+            matched = (
+                has_next
+                & (sorted_attempts[next_follow] == sorted_attempts[copy_positions])
+                & (next_follow < copy_positions + 10)
+                & (sorted_times[next_follow] - sorted_times[copy_positions] <= 30)
+            )
+            copy_search_counts = np.bincount(sorted_attempts[copy_positions[matched]], minlength=num_attempts)
+
+        # Three tab switches within 120 s, in the same attempt
+        tab_positions = np.flatnonzero(np.isin(sorted_codes, self._codes(columns, TAB_SWITCH_EVENTS)))
+        tab_counts = np.bincount(sorted_attempts[tab_positions], minlength=num_attempts)
+        rapid_switching = np.zeros(num_attempts, dtype=bool)
+        if len(tab_positions) >= 3:
+            first, third = tab_positions[:-2], tab_positions[2:]
+            burst = (sorted_attempts[first] == sorted_attempts[third]) & (sorted_times[third] - sorted_times[first] <= 120)
+            rapid_switching[sorted_attempts[first[burst]]] = True
+
+        # High-risk event counts per (attempt, 60 s window)
+        cluster_rows = np.flatnonzero(np.isin(codes, self._codes(columns, CLUSTER_EVENTS)))
+        windows = np.floor_divide(columns.window_timestamp[cluster_rows], 60).astype(np.int64)
+        window_keys = np.stack([attempts[cluster_rows], windows], axis=1)
+        unique_windows, window_counts = np.unique(window_keys, axis=0, return_counts=True)
+        window_bounds = np.searchsorted(unique_windows[:, 0], np.arange(num_attempts + 1)) if len(unique_windows) else np.zeros(num_attempts + 1, dtype=np.int64)
+
+        type_score_cache: Dict[Tuple[int, int, int], Optional[float]] = {}
+        results = []
+        for attempt in range(num_attempts):
+            total_questions = question_counts[attempt]
+            question_factor = calculator._get_question_normalization_factor(total_questions)
+
+            event_counts: Dict[str, int] = {}
+            base_score = 0.0
+            for pair in ordered_pairs[pair_bounds[attempt]:pair_bounds[attempt + 1]].tolist():
+                code = pair % num_types
+                event_type = columns.type_names[code]
+                count = int(counts[attempt, code])
+                event_counts[event_type] = count
+
+                cache_key = (code, count, total_questions)
+                if cache_key not in type_score_cache:
+                    type_score_cache[cache_key] = calculator._event_type_score(event_type, count, total_questions, question_factor)
+                event_score = type_score_cache[cache_key]
+                if event_score is None:
+                    continue
+                if pair in context_extras:
+                    event_score = calculator._apply_enhanced_context(event_type, context_extras[pair], event_score)
+                base_score += event_score
+
+            pattern_score = calculator._pattern_score(
+                int(copy_search_counts[attempt]), int(tab_counts[attempt]), bool(rapid_switching[attempt]), total_questions
+            )
+            temporal_score = calculator._temporal_score(
+                window_counts[window_bounds[attempt]:window_bounds[attempt + 1]].tolist()
+            )
+            context_adjustment = calculator._calculate_context_adjustments(
+                event_counts, test_durations[attempt], total_questions
+            )
+            results.append(calculator._assemble_breakdown(
+                event_counts, base_score, pattern_score, temporal_score, context_adjustment, total_questions
+            ))
+
+        return results
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from typing import List, Dict, Any, Optional
+import psycopg2
+
+from .event_batch import EventBatch
+
+logger = logging.getLogger(__name__)
+
+
+class FileCheckpointStore:
+    """Checkpoints as files in a local directory, one per (key, analyzer)"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, analyzer: str) -> str:
+        return os.path.join(self.directory, f"{key}.{analyzer}.ckpt")
+
+    def load(self, key: str, analyzer: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key, analyzer), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, key: str, analyzer: str, data: bytes):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, self._path(key, analyzer))
+
+    def clear(self, key: str):
+        for name in os.listdir(self.directory):
+            if name.startswith(f"{key}.") and name.endswith('.ckpt'):
+                os.unlink(os.path.join(self.directory, name))
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete checkpoints not saved for `max_age_seconds`; returns how many"""
+        cutoff = time.time() - max_age_seconds
+        pruned = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.ckpt') and os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                pruned += 1
+        return pruned
+
+
+class PostgresCheckpointStore:
+    """
+    Checkpoints in the worker-owned proctor_worker.analysis_checkpoint table
+    (see prisma/migrations), so that a job redelivered to another worker
+    resumes too. Uses its own
+    connection: analyzers checkpoint from the analysis threads. A failed
+    statement is rolled back and a lost connection is reopened on next use,
+    so one error does not disable checkpointing for the rest of the process.
+    """
+
+    def __init__(self, db_params: Dict[str, Any]):
+        self.db_params = db_params
+        self.db_connection = psycopg2.connect(**db_params)
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params: tuple = (), fetch: bool = False):
+        """Run one statement in its own transaction; returns the first row when `fetch`"""
+        with self._lock:
+            if self.db_connection.closed:
+                self.db_connection = psycopg2.connect(**self.db_params)
+            connection = self.db_connection
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    row = cursor.fetchone() if fetch else None
+                connection.commit()
+                return row
+            except Exception:
+                if not connection.closed:
+                    try:
+                        connection.rollback()
+                    except Exception as e:
+                        logger.warning(f"Failed to roll back checkpoint connection: {e}")
+                raise
+
+    def load(self, key: str, analyzer: str) -> Optional[bytes]:
+        row = self._execute("""
+            SELECT state FROM proctor_worker.analysis_checkpoint WHERE key = %s AND analyzer = %s
+        """, (key, analyzer), fetch=True)
+        return bytes(row[0]) if row else None
+
+    def save(self, key: str, analyzer: str, data: bytes):
+        self._execute("""
+            INSERT INTO proctor_worker.analysis_checkpoint (key, analyzer, state)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (key, analyzer) DO UPDATE SET state = EXCLUDED.state, updated_on = NOW()
+        """, (key, analyzer, data))
+
+    def clear(self, key: str):
+        self._execute("DELETE FROM proctor_worker.analysis_checkpoint WHERE key = %s", (key,))
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete checkpoints not saved for `max_age_seconds`; returns how many"""
+        row = self._execute("""
+            WITH pruned AS (
+                DELETE FROM proctor_worker.analysis_checkpoint
+                WHERE updated_on < NOW() - make_interval(secs => %s)
+                RETURNING 1
+            )
+            SELECT COUNT(*) FROM pruned
+        """, (max_age_seconds,), fetch=True)
+        return row[0]
+
+
+class AnalysisCheckpointer:
+    """
+    Periodic checkpoints of one job's analysis progress. Analyzers call due()
+    as they go and save() their resumable state when it returns True, so at
+    most `interval_seconds` of work is lost when the job is retried.
+    Store failures are logged and never fail the analysis.
+    """
+
+    def __init__(self, store, key: str, interval_seconds: float = 60.0):
+        self.store = store
+        self.key = key
+        self.interval_seconds = interval_seconds
+        self._last_saved: Dict[str, float] = {}
+        self._save_requested_at = float('-inf')
+
+    def load(self, analyzer: str) -> Optional[bytes]:
+        try:
+            data = self.store.load(self.key, analyzer)
+        except Exception as e:
+            logger.warning(f"Failed to load {analyzer} checkpoint for {self.key}: {e}")
+            return None
+        self._last_saved[analyzer] = time.monotonic()
+        return data
+
+    def due(self, analyzer: str) -> bool:
+        last_saved = self._last_saved.setdefault(analyzer, time.monotonic())
+        return (time.monotonic() - last_saved >= self.interval_seconds
+                or last_saved < self._save_requested_at)
+
+    def save_soon(self):
+        """Make every analyzer's next due() True, e.g. before shutdown"""
+        self._save_requested_at = time.monotonic()
+
+    def save(self, analyzer: str, data: bytes):
+        try:
+            self.store.save(self.key, analyzer, data)
+        except Exception as e:
+            logger.warning(f"Failed to save {analyzer} checkpoint for {self.key}: {e}")
+        self._last_saved[analyzer] = time.monotonic()
+
+    def clear(self):
+        try:
+            self.store.clear(self.key)
+        except Exception as e:
+            logger.warning(f"Failed to clear checkpoints for {self.key}: {e}")
+
+
+def encode_stage_checkpoint(stages: List[str], events: EventBatch) -> bytes:
+    """Completed stage names plus their accumulated events"""
+    return json.dumps({
+        'stages': stages,
+        'events': [[event['type'], event['timestamp'], event['extra']] for event in events],
+    }).encode()
+
+
+def decode_stage_checkpoint(data: bytes):
+    state = json.loads(data)
+    events = EventBatch()
+    for event_type, timestamp, extra in state['events']:
+        events.append(event_type, timestamp, extra)
+    return state['stages'], events
@@ -0,0 +1,118 @@
+import os
+import sys
+import logging
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Read by OpenMP, OpenBLAS, MKL, numexpr and Accelerate when they start their pools
+BLAS_THREAD_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+)
+
+
+def parse_cpu_list(text: str) -> FrozenSet[int]:
+    """CPU numbers from a list like '0-3,8,10-11' (the taskset / cpuset format)"""
+    cpus = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = (int(bound) for bound in part.split('-', 1))
+            if last < first:
+                raise ValueError(f"Invalid CPU range {part!r}")
+            cpus.update(range(first, last + 1))
+        else:
+            cpus.add(int(part))
+    if not cpus:
+        raise ValueError(f"No CPUs in {text!r}")
+    return frozenset(cpus)
+
+
+class CpuBudget(NamedTuple):
+    """
+    How many cores a worker may use, from WORKER_CPU_BUDGET, and which ones,
+    from WORKER_CPUS. With only WORKER_CPUS set the budget is its size; with
+    neither, native libraries keep their own defaults.
+    """
+
+    threads: Optional[int]          # Native threads for the whole worker; None keeps library defaults
+    cpus: Optional[FrozenSet[int]]  # Cores to pin the worker to; None leaves affinity alone
+
+    def share(self, processes: int) -> Optional[int]:
+        """Threads for each of `processes` processes splitting the budget"""
+        if self.threads is None:
+            return None
+        return max(1, self.threads // max(1, processes))
+
+
+def configured_cpu_budget() -> CpuBudget:
+    cpus = parse_cpu_list(os.environ['WORKER_CPUS']) if os.getenv('WORKER_CPUS') else None
+    threads = int(os.environ['WORKER_CPU_BUDGET']) if os.getenv('WORKER_CPU_BUDGET') else None
+    if threads is None and cpus is not None:
+        threads = len(cpus)
+    if threads is not None and threads < 1:
+        raise ValueError(f"WORKER_CPU_BUDGET must be at least 1, got {threads}")
+    return CpuBudget(threads, cpus)
+
+
+def apply_process_budget(budget: CpuBudget, blas_threads: Optional[int]):
+    """
+    Pin this process to the budget's cores and size the BLAS / OpenMP pools.
+    BLAS reads its variables once, when numpy is first imported, so this
+    must run before that; spawned child processes inherit both settings.
+    Variables already set in the environment are left alone.
+    """
+    if budget.cpus is not None:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, budget.cpus)
+        else:
+            logger.warning("WORKER_CPUS is set but CPU affinity is not supported on this platform")
+    if blas_threads is not None:
+        if 'numpy' in sys.modules:
+            logger.warning("numpy was imported before the CPU budget was applied; BLAS may ignore it")
+        for name in BLAS_THREAD_VARS:
+            os.environ.setdefault(name, str(blas_threads))
+
+
+def configure_native_threads(threads: Optional[int]):
+    """
+    Size the OpenCV and torch thread pools, for whichever of them is
+    imported. MediaPipe has no thread setting and is bounded only by pinning.
+    """
+    if threads is None:
+        return
+    cv2 = sys.modules.get('cv2')
+    if cv2 is not None:
+        cv2.setNumThreads(threads)
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(threads)
+        try:
+            # Inference runs one op graph at a time; only settable before torch's first parallel work
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+
+
+def thread_report() -> Dict[str, Any]:
+    """Cores this process may run on and the thread counts native libraries will use"""
+    report: Dict[str, Any] = {
+        'cpus': sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+    }
+    for name in BLAS_THREAD_VARS:
+        if os.getenv(name):
+            report[name] = os.environ[name]
+    cv2 = sys.modules.get('cv2')
+    if cv2 is not None:
+        report['opencv'] = cv2.getNumThreads()
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        report['torch'] = torch.get_num_threads()
+        report['torch_interop'] = torch.get_num_interop_threads()
+    return report
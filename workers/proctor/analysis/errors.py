@@ -0,0 +1,15 @@
+from typing import Optional
+
+from .event_batch import EventBatch
+
+
+class AnalysisIncomplete(Exception):
+    """
+    An analyzer could not cover the whole recording (media extraction or a
+    detector failed). `events` holds what it did find; it is used for the
+    job but never cached, so a retry can still produce the full result.
+    """
+
+    def __init__(self, message: str, events: Optional[EventBatch] = None):
+        super().__init__(message)
+        self.events = events if events is not None else EventBatch()
@@ -0,0 +1,234 @@
+import json
+import numbers
+from datetime import datetime, timezone
+from array import array
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+from .risk_rules import EVENT_TYPE_IDS
+
+# Numeric `extra` fields stored as typed columns; anything else goes to the side table
+METRIC_FIELDS: Tuple[Tuple[str, type], ...] = (
+    ('yaw', float),
+    ('pitch', float),
+    ('roll', float),
+    ('confidence', float),
+    ('duration_seconds', float),
+    ('frame_number', int),
+    ('person_count', int),
+)
+_METRIC_INDEX = {name: i for i, (name, _) in enumerate(METRIC_FIELDS)}
+
+# Event types written by the video and audio analyzers. Stored rows of these
+# types come from earlier runs of the worker, not from the browser.
+ANALYSIS_EVENT_TYPES = (
+    'LOOK_AWAY', 'PHONE_DETECTED', 'MULTIPLE_PEOPLE',
+    'SUSPICIOUS_SILENCE', 'POSSIBLE_SPEAKER_CHANGE', 'MULTIPLE_SPEAKERS_DETECTED', 'BACKGROUND_NOISE',
+)
+
+
+class EventBatch:
+    """
+    Proctoring events stored column-wise: interned type id, timestamp (seconds)
+    and a few numeric metric columns in typed arrays, with rare `extra` fields
+    in a side table keyed by row.
+
+    The dict form ({'type', 'timestamp', 'extra'}) is available through
+    iteration, indexing and to_dicts() for code that still expects it.
+    """
+
+    def __init__(self):
+        self._type_ids = array('i')
+        self._timestamps = array('d')
+        self._metrics = [array('d') for _ in METRIC_FIELDS]
+        self._present = array('H')                 # Bit i set when metric column i holds a value
+        self._side_extras: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._type_ids)
+
+    def append(self, event_type: str, timestamp: float, extra: Optional[Dict[str, Any]] = None):
+        """Add one event"""
+        row = len(self._type_ids)
+        self._type_ids.append(EVENT_TYPE_IDS.id_of(event_type))
+        self._timestamps.append(timestamp)
+
+        present = 0
+        values = [0.0] * len(METRIC_FIELDS)
+        side = None
+        for key, value in (extra or {}).items():
+            index = _METRIC_INDEX.get(key)
+            if index is not None and _matches_kind(value, METRIC_FIELDS[index][1]):
+                values[index] = value
+                present |= 1 << index
+            else:
+                if side is None:
+                    side = self._side_extras[row] = {}
+                side[key] = value
+
+        for column, value in zip(self._metrics, values):
+            column.append(value)
+        self._present.append(present)
+
+    def extend(self, other: 'EventBatch'):
+        """Append all events of another batch"""
+        offset = len(self)
+        self._type_ids.extend(other._type_ids)
+        self._timestamps.extend(other._timestamps)
+        for column, other_column in zip(self._metrics, other._metrics):
+            column.extend(other_column)
+        self._present.extend(other._present)
+        for row, extra in other._side_extras.items():
+            self._side_extras[offset + row] = extra
+
+    @classmethod
+    def concat(cls, batches: Iterable['EventBatch']) -> 'EventBatch':
+        combined = cls()
+        for batch in batches:
+            combined.extend(batch)
+        return combined
+
+    @classmethod
+    def from_dicts(cls, events: Iterable[Dict]) -> 'EventBatch':
+        """Build from event dicts with 'type', 'timestamp' and optional 'extra'"""
+        batch = cls()
+        for event in events:
+            batch.append(event.get('type', 'UNKNOWN'), event.get('timestamp', 0), event.get('extra'))
+        return batch
+
+    # Column access
+
+    @property
+    def type_ids(self) -> np.ndarray:
+        return np.frombuffer(self._type_ids, dtype=np.intc) if len(self) else np.zeros(0, dtype=np.intc)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return np.frombuffer(self._timestamps, dtype=np.float64) if len(self) else np.zeros(0)
+
+    def type_name(self, row: int) -> str:
+        return EVENT_TYPE_IDS.name_of(self._type_ids[row])
+
+    def timestamp(self, row: int) -> float:
+        return self._timestamps[row]
+
+    def extra_value(self, row: int, field: str, default: Any = None) -> Any:
+        """One `extra` field of one event, without building the extra dict"""
+        index = _METRIC_INDEX.get(field)
+        if index is not None and self._present[row] & (1 << index):
+            return METRIC_FIELDS[index][1](self._metrics[index][row])
+        side = self._side_extras.get(row)
+        if side is not None and field in side:
+            return side[field]
+        return default
+
+    def extra(self, row: int) -> Dict[str, Any]:
+        extra = {}
+        present = self._present[row]
+        if present:
+            for index, (name, kind) in enumerate(METRIC_FIELDS):
+                if present & (1 << index):
+                    extra[name] = kind(self._metrics[index][row])
+        side = self._side_extras.get(row)
+        if side:
+            extra.update(side)
+        return extra
+
+    def group_by_type(self) -> Tuple[List[str], List[int], List[List[int]]]:
+        """
+        Type names in first-seen order, each row's index into them, and the
+        rows of each type in input order
+        """
+        type_ids = self.type_ids
+        if not len(type_ids):
+            return [], [], []
+        unique_ids, first_rows = np.unique(type_ids, return_index=True)
+        ordered_ids = unique_ids[np.argsort(first_rows, kind='stable')]
+        remap = np.empty(int(ordered_ids.max()) + 1, dtype=np.int64)
+        remap[ordered_ids] = np.arange(len(ordered_ids))
+        codes = remap[type_ids]
+
+        rows_by_code = np.argsort(codes, kind='stable')
+        bounds = np.cumsum(np.bincount(codes, minlength=len(ordered_ids)))[:-1]
+        positions = [rows.tolist() for rows in np.split(rows_by_code, bounds)]
+        names = [EVENT_TYPE_IDS.name_of(int(type_id)) for type_id in ordered_ids]
+        return names, codes.tolist(), positions
+
+    def time_order(self) -> np.ndarray:
+        """Row order by timestamp; ties keep input order"""
+        return np.argsort(self.timestamps, kind='stable')
+
+    def take(self, rows: np.ndarray) -> 'EventBatch':
+        """New batch with the given rows, in the given order"""
+        rows = np.asarray(rows, dtype=np.intp)
+        batch = EventBatch()
+        if not len(rows):
+            return batch
+        batch._type_ids.frombytes(self.type_ids[rows].tobytes())
+        batch._timestamps.frombytes(self.timestamps[rows].tobytes())
+        for column, source in zip(batch._metrics, self._metrics):
+            column.frombytes(np.frombuffer(source, dtype=np.float64)[rows].tobytes())
+        batch._present.frombytes(np.frombuffer(self._present, dtype=np.uint16)[rows].tobytes())
+        if self._side_extras:
+            for new_row, row in enumerate(rows.tolist()):
+                side = self._side_extras.get(row)
+                if side is not None:
+                    batch._side_extras[new_row] = side
+        return batch
+
+    def shift_timestamps(self, offset: float):
+        """Add `offset` seconds to every timestamp, in place"""
+        if len(self) and offset:
+            shifted = self.timestamps + offset
+            self._timestamps = array('d', shifted.tobytes())
+
+    def shift_to_attempt_clock(self, started_at: Optional[datetime], browser_events: 'EventBatch'):
+        """
+        Move analysis timestamps (seconds into the recording) onto the browser
+        clock (UTC epoch seconds): from the attempt start, or from the first
+        browser event when the attempt has no start time
+        """
+        if started_at is not None:
+            self.shift_timestamps(started_at.replace(tzinfo=timezone.utc).timestamp())
+        elif len(browser_events):
+            self.shift_timestamps(browser_events.timestamp(0))
+
+    # Dict compatibility view
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        if row < 0:
+            row += len(self)
+        return {'type': self.type_name(row), 'timestamp': self._timestamps[row], 'extra': self.extra(row)}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def extra_json(self, row: int) -> str:
+        return json.dumps(self.extra(row))
+
+    def update_digest(self, digest):
+        """
+        Feed the batch contents to a hashlib digest. Type ids are interned per
+        process, so rows are hashed as indexes into the list of type names.
+        """
+        used_ids, codes = np.unique(self.type_ids, return_inverse=True)
+        digest.update(json.dumps([EVENT_TYPE_IDS.name_of(int(type_id)) for type_id in used_ids]).encode())
+        digest.update(codes.astype(np.int32).tobytes())
+        digest.update(self._timestamps.tobytes())
+        for column in self._metrics:
+            digest.update(column.tobytes())
+        digest.update(self._present.tobytes())
+        digest.update(json.dumps(sorted(self._side_extras.items()), sort_keys=True, default=str).encode())
+
+
+def _matches_kind(value: Any, kind: type) -> bool:
+    if isinstance(value, bool):
+        return False
+    if kind is int:
+        return isinstance(value, numbers.Integral)
+    return isinstance(value, float)
@@ -0,0 +1,347 @@
+import io
+import os
+import logging
+import tempfile
+from typing import Callable, List, Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .event_batch import EventBatch
+
+logger = logging.getLogger(__name__)
+
+FEATURES_VERSION = 1
+
+# COCO class ids kept as detections
+PERSON_CLASS_ID = 0
+PHONE_CLASS_ID = 67
+
+# Frames analyzed per second of video
+ANALYSIS_FPS = 2
+
+# Event types derived from frame features
+FRAME_EVENT_TYPES = ('LOOK_AWAY', 'PHONE_DETECTED', 'MULTIPLE_PEOPLE')
+
+
+class FrameEventThresholds(NamedTuple):
+    """Thresholds that turn per-frame features into proctoring events"""
+    look_away_yaw: float = 30.0
+    phone_confidence: float = 0.5
+    person_confidence: float = 0.5
+
+
+class FrameFeatures:
+    """
+    Per-frame video features of one asset: head pose of the detected face and
+    every person/phone detection (class, confidence, box) in model output order.
+    Events for any thresholds can be derived from these without re-running the
+    models; see derive_frame_events().
+    """
+
+    def __init__(self, fps: float, frame_number: np.ndarray, face_count: np.ndarray, pose: np.ndarray,
+                 detection_frame: np.ndarray, detection_class: np.ndarray, detection_confidence: np.ndarray,
+                 detection_bbox: np.ndarray, metadata: Optional[Dict[str, str]] = None):
+        self.fps = fps
+        self.frame_number = frame_number                 # int32[n]
+        self.face_count = face_count                     # int8[n]
+        self.pose = pose                                 # float64[n, 3] pitch, yaw, roll; NaN without a face
+        self.detection_frame = detection_frame           # int32[m], row into the frame arrays
+        self.detection_class = detection_class           # int16[m]
+        self.detection_confidence = detection_confidence # float32[m]
+        self.detection_bbox = detection_bbox             # float32[m, 4] xyxy
+        self.metadata = dict(metadata or {})
+
+        # Where each frame's detections start and end (detections are grouped by frame)
+        self._detection_bounds = np.searchsorted(detection_frame, np.arange(len(frame_number) + 1))
+
+    def __len__(self) -> int:
+        return len(self.frame_number)
+
+    def frame_detections(self, row: int) -> slice:
+        return slice(int(self._detection_bounds[row]), int(self._detection_bounds[row + 1]))
+
+    def select_frames(self, first: int, stop: Optional[int] = None) -> 'FrameFeatures':
+        """The frames numbered first <= n < stop, with their detections"""
+        start_row = int(np.searchsorted(self.frame_number, first))
+        stop_row = len(self) if stop is None else max(start_row, int(np.searchsorted(self.frame_number, stop)))
+        detections = slice(int(self._detection_bounds[start_row]), int(self._detection_bounds[stop_row]))
+        return FrameFeatures(
+            fps=self.fps,
+            frame_number=self.frame_number[start_row:stop_row],
+            face_count=self.face_count[start_row:stop_row],
+            pose=self.pose[start_row:stop_row],
+            detection_frame=self.detection_frame[detections] - start_row,
+            detection_class=self.detection_class[detections],
+            detection_confidence=self.detection_confidence[detections],
+            detection_bbox=self.detection_bbox[detections],
+            metadata=self.metadata,
+        )
+
+    def class_summary(self, class_id: int, min_confidence: float = 0.5):
+        """Per-frame (count above min_confidence, max confidence) of one detection class"""
+        selected = self.detection_class == class_id
+        frames = self.detection_frame[selected]
+        confidences = self.detection_confidence[selected]
+        counts = np.bincount(frames[confidences > min_confidence], minlength=len(self))
+        max_confidence = np.zeros(len(self), dtype=np.float32)
+        np.maximum.at(max_confidence, frames, confidences)
+        return counts, max_confidence
+
+    def write(self, f):
+        """Write as a compressed .npz to a binary file object"""
+        person_count, max_person_confidence = self.class_summary(PERSON_CLASS_ID)
+        phone_count, max_phone_confidence = self.class_summary(PHONE_CLASS_ID)
+        np.savez_compressed(
+            f,
+            version=np.int32(FEATURES_VERSION),
+            fps=np.float64(self.fps),
+            metadata_keys=np.array(list(self.metadata), dtype=np.str_),
+            metadata_values=np.array(list(self.metadata.values()), dtype=np.str_),
+            frame_number=self.frame_number,
+            face_count=self.face_count,
+            pose=self.pose,
+            # Summaries at the default thresholds, for quick inspection
+            person_count=person_count.astype(np.int16),
+            phone_count=phone_count.astype(np.int16),
+            max_person_confidence=max_person_confidence,
+            max_phone_confidence=max_phone_confidence,
+            detection_frame=self.detection_frame,
+            detection_class=self.detection_class,
+            detection_confidence=self.detection_confidence,
+            detection_bbox=self.detection_bbox,
+        )
+
+    def save(self, path: str):
+        """Write as a compressed .npz file, atomically"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.npz.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                self.write(f)
+            os.replace(temp_path, path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        self.write(buffer)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'FrameFeatures':
+        return cls.load(io.BytesIO(data))
+
+    @classmethod
+    def load(cls, path) -> 'FrameFeatures':
+        """Read from an .npz path or binary file object"""
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version']) != FEATURES_VERSION:
+                raise ValueError(f"Unsupported frame features version {int(data['version'])} in {path}")
+            return cls(
+                fps=float(data['fps']),
+                frame_number=data['frame_number'],
+                face_count=data['face_count'],
+                pose=data['pose'],
+                detection_frame=data['detection_frame'],
+                detection_class=data['detection_class'],
+                detection_confidence=data['detection_confidence'],
+                detection_bbox=data['detection_bbox'],
+                metadata=dict(zip(data['metadata_keys'].tolist(), data['metadata_values'].tolist())),
+            )
+
+
+class FrameFeatureWriter:
+    """Collects features frame by frame while a video is analyzed"""
+
+    def __init__(self, fps: float):
+        self.fps = fps
+        self._frame_number: List[int] = []
+        self._face_count: List[int] = []
+        self._pose: List[Sequence[float]] = []
+        self._detection_frame: List[int] = []
+        self._detection_class: List[int] = []
+        self._detection_confidence: List[float] = []
+        self._detection_bbox: List[Sequence[float]] = []
+
+    @classmethod
+    def from_features(cls, features: FrameFeatures) -> 'FrameFeatureWriter':
+        """Writer that continues after the frames of `features`, e.g. from a checkpoint"""
+        writer = cls(features.fps)
+        writer.extend(features)
+        return writer
+
+    def extend(self, features: FrameFeatures):
+        """Append all frames of `features`, which must follow the frames recorded so far"""
+        row_offset = len(self._frame_number)
+        self._frame_number.extend(features.frame_number.tolist())
+        self._face_count.extend(features.face_count.tolist())
+        self._pose.extend(features.pose.tolist())
+        self._detection_frame.extend((features.detection_frame + row_offset).tolist())
+        self._detection_class.extend(features.detection_class.tolist())
+        self._detection_confidence.extend(features.detection_confidence.tolist())
+        self._detection_bbox.extend(features.detection_bbox.tolist())
+
+    @property
+    def last_frame_number(self) -> int:
+        return self._frame_number[-1] if self._frame_number else 0
+
+    @property
+    def last_face_count(self) -> Optional[int]:
+        return self._face_count[-1] if self._face_count else None
+
+    def add_frame(self, frame_number: int, face_count: int = 0, pose: Optional[Sequence[float]] = None,
+                  detections: Sequence[tuple] = ()):
+        """Record one frame; detections are (class_id, confidence, xyxy) in model output order"""
+        row = len(self._frame_number)
+        self._frame_number.append(frame_number)
+        self._face_count.append(face_count)
+        self._pose.append(pose if pose is not None else (np.nan, np.nan, np.nan))
+        for class_id, confidence, bbox in detections:
+            self._detection_frame.append(row)
+            self._detection_class.append(class_id)
+            self._detection_confidence.append(confidence)
+            self._detection_bbox.append(bbox)
+
+    def build(self, metadata: Optional[Dict[str, str]] = None) -> FrameFeatures:
+        return FrameFeatures(
+            fps=self.fps,
+            frame_number=np.array(self._frame_number, dtype=np.int32),
+            face_count=np.array(self._face_count, dtype=np.int8),
+            pose=np.array(self._pose, dtype=np.float64).reshape(-1, 3),
+            detection_frame=np.array(self._detection_frame, dtype=np.int32),
+            detection_class=np.array(self._detection_class, dtype=np.int16),
+            detection_confidence=np.array(self._detection_confidence, dtype=np.float32),
+            detection_bbox=np.array(self._detection_bbox, dtype=np.float32).reshape(-1, 4),
+            metadata=metadata,
+        )
+
+
+def slice_stitch_frame(previous: FrameFeatures, following: FrameFeatures) -> Optional[int]:
+    """
+    Frame number after which `following` can take over from `previous` with
+    the results of one continuous run, or None when there is no such frame.
+    Both are face tracker runs over consecutive frames of one recording, and
+    `following` started from a fresh tracker. FaceMesh starts over from face
+    detection after a frame without a face, so the runs agree after the frame
+    before `following` started, if `previous` found no face there, or after
+    any frame where neither found one.
+    """
+    if not len(following):
+        return None
+    first = int(following.frame_number[0])
+    candidates = previous.frame_number[(previous.face_count == 0) & (previous.frame_number >= first - 1)]
+    for number in candidates.tolist():
+        if number == first - 1:
+            return number
+        row = int(np.searchsorted(following.frame_number, number))
+        if row < len(following) and following.frame_number[row] == number and following.face_count[row] == 0:
+            return number
+    return None
+
+
+class SliceStitcher:
+    """
+    Joins the features of consecutive time slices into those of one serial
+    run, appending them to `features`. Each slice must start from a fresh
+    face tracker and run on until a frame without a face, or the end of the
+    recording; it takes over from the previous slice at the frame given by
+    slice_stitch_frame. Slices without such a frame are re-analyzed by
+    `reanalyze(frame_number)`, a fresh run from the frame after
+    `frame_number`, which is exact since the previous slice ended on a
+    frame without a face.
+    """
+
+    def __init__(self, features: FrameFeatureWriter):
+        self.features = features
+        self._pending: Optional[FrameFeatures] = None  # Latest slice past its stitch frame, not yet appended
+
+    def add(self, slice_features: FrameFeatures, reanalyze: Callable[[int], FrameFeatures]) -> bool:
+        """Stitch on the next slice; False when it had to be re-analyzed"""
+        pending = self._pending
+        if pending is None:
+            self._pending = slice_features
+            return True
+        if not len(pending):
+            raise ValueError("Cannot stitch onto a slice without frames")
+        last_number = int(pending.frame_number[-1])
+        if not len(slice_features) or slice_features.frame_number[-1] <= last_number:
+            # The previous slice ran past all of this one
+            return True
+        stitched = True
+        stitch_number = slice_stitch_frame(pending, slice_features)
+        if stitch_number is None:
+            slice_features = reanalyze(last_number)
+            stitch_number = last_number
+            stitched = False
+        self.features.extend(pending.select_frames(0, stitch_number + 1))
+        self._pending = slice_features.select_frames(stitch_number + 1)
+        return stitched
+
+    def finish(self):
+        if self._pending is not None:
+            self.features.extend(self._pending)
+            self._pending = None
+
+
+def derive_frame_events(features: FrameFeatures, thresholds: FrameEventThresholds = FrameEventThresholds(),
+                        events: Optional[EventBatch] = None) -> EventBatch:
+    """
+    Proctoring events of VideoAnalyzer.analyze_frame for every frame, from
+    stored features: LOOK_AWAY per face beyond the yaw threshold, one
+    PHONE_DETECTED per confident phone box, and MULTIPLE_PEOPLE once a
+    confident person is reached in a frame with more than one (detections
+    after it in that frame are not reported).
+    """
+    if events is None:
+        events = EventBatch()
+
+    is_person = features.detection_class == PERSON_CLASS_ID
+    confident_people = np.bincount(
+        features.detection_frame[is_person & (features.detection_confidence > thresholds.person_confidence)],
+        minlength=len(features),
+    )
+
+    for row in range(len(features)):
+        frame_number = int(features.frame_number[row])
+        timestamp = frame_number / features.fps
+
+        if features.face_count[row]:
+            pitch, yaw, roll = (float(value) for value in features.pose[row])
+            if abs(yaw) > thresholds.look_away_yaw:
+                events.append('LOOK_AWAY', timestamp, {
+                    'yaw': yaw,
+                    'pitch': pitch,
+                    'roll': roll,
+                    'frame_number': frame_number
+                })
+
+        detections = features.frame_detections(row)
+        for index in range(detections.start, detections.stop):
+            class_id = int(features.detection_class[index])
+            confidence = float(features.detection_confidence[index])
+            if class_id == PHONE_CLASS_ID and confidence > thresholds.phone_confidence:
+                events.append('PHONE_DETECTED', timestamp, {
+                    'confidence': confidence,
+                    'frame_number': frame_number,
+                    'bbox': features.detection_bbox[index].tolist()
+                })
+            elif class_id == PERSON_CLASS_ID and confidence > thresholds.person_confidence:
+                person_count = int(confident_people[row])
+                if person_count > 1:
+                    events.append('MULTIPLE_PEOPLE', timestamp, {
+                        'person_count': person_count,
+                        'frame_number': frame_number
+                    })
+                    break
+
+    return events
+
+
+def feature_store_path(asset_id: str, store_dir: Optional[str] = None) -> Optional[str]:
+    """Location of an asset's features, or None when FEATURE_STORE_DIR is not configured"""
+    store_dir = store_dir or os.getenv('FEATURE_STORE_DIR')
+    if not store_dir:
+        return None
+    return os.path.join(store_dir, f"{asset_id}.npz")
@@ -0,0 +1,236 @@
+import bisect
+import logging
+from typing import List, Dict, Any, Optional
+
+from .risk_calculator import (
+    ImprovedRiskCalculator,
+    CLUSTER_EVENTS,
+    COPY_EVENTS,
+    COPY_FOLLOW_UP_EVENTS,
+    TAB_SWITCH_EVENTS,
+    _window_timestamp,
+)
+
+logger = logging.getLogger(__name__)
+
+# Timeline flags
+_COPY = 1
+_FOLLOW_UP = 2
+
+# Number of events a copy looks ahead for tab activity (see _calculate_violation_patterns)
+_COPY_LOOKAHEAD = 9
+
+STATE_VERSION = 2
+
+
+class IncrementalRiskScorer:
+    """
+    Keeps the running state of ImprovedRiskCalculator for one attempt so that
+    appended events update the breakdown without rescoring the whole history.
+
+    The state is per-type counts and context multipliers, a timestamp-ordered
+    timeline for the copy-then-tab lookahead and tab-burst checks, and the
+    high-risk counts of each 60-second window. Events may arrive out of
+    timestamp order; the breakdown always equals calculate_risk_score over
+    all events appended so far, in arrival order.
+
+    Updating costs O(log n) per new event plus a bounded rescan around its
+    insertion point; only event types whose counts changed are re-scored.
+
+    The scorer is tied to the risk rules version it was created with. When
+    the rules change, update() raises ValueError and the attempt has to be
+    rescored from its full event list.
+    """
+
+    def __init__(self, test_duration_minutes: int = 60, total_questions: int = 30,
+                 calculator: Optional[ImprovedRiskCalculator] = None):
+        self.calculator = calculator or ImprovedRiskCalculator()
+        self.rules = self.calculator.refresh_rules()
+        self.test_duration_minutes = test_duration_minutes
+        self.total_questions = total_questions
+
+        self._num_events = 0
+        # Per-type state, in first-seen order
+        self._counts: Dict[str, int] = {}
+        self._multipliers: Dict[str, List[float]] = {}   # Non-unit per-event context multipliers
+        self._context_totals: Dict[str, float] = {}      # Running totals for total-based context rules
+        self._type_scores: Dict[str, Optional[float]] = {}
+        # Timestamp-ordered (timestamp, arrival, flags) for pattern checks
+        self._timeline: List[tuple] = []
+        self._matched_copies = set()                      # Arrival numbers of copies followed by tab activity
+        self._tab_switches: List[tuple] = []              # (timestamp, arrival) of tab switches, ordered
+        self._rapid_tab_switching = False
+        # High-risk event counts per 60-second window
+        self._window_counts: Dict[int, int] = {}
+        self._temporal_score = 0.0
+
+    def update(self, events: List[Dict]) -> Dict[str, Any]:
+        """Append new events and return the updated risk breakdown"""
+        rules = self.calculator.refresh_rules()
+        if rules.version != self.rules.version:
+            raise ValueError(
+                f"Risk rules changed from version {self.rules.version} to {rules.version}; rescore from all events"
+            )
+
+        changed_types = set()
+        for event in events:
+            changed_types.add(self._append(event))
+
+        for event_type in changed_types:
+            self._type_scores[event_type] = self._score_type(event_type)
+
+        return self.breakdown()
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Risk breakdown for all events appended so far"""
+        calculator = self.calculator
+
+        base_score = 0.0
+        for event_type in self._counts:
+            event_score = self._type_scores[event_type]
+            if event_score is not None:
+                base_score += event_score
+
+        pattern_score = calculator._pattern_score(
+            len(self._matched_copies), len(self._tab_switches), self._rapid_tab_switching, self.total_questions
+        )
+        context_adjustment = calculator._calculate_context_adjustments(
+            self._counts, self.test_duration_minutes, self.total_questions
+        )
+        return calculator._assemble_breakdown(
+            dict(self._counts), base_score, pattern_score, self._temporal_score, context_adjustment, self.total_questions
+        )
+
+    def _append(self, event: Dict) -> str:
+        calculator = self.calculator
+        event_type = event.get('type', 'UNKNOWN')
+        timestamp = event.get('timestamp', 0)
+        arrival = self._num_events
+        self._num_events += 1
+
+        # Per-type counts and context
+        self._counts[event_type] = self._counts.get(event_type, 0) + 1
+        context = self.rules.rule_for(event_type).context
+        if context is not None:
+            value = context.value(event.get('extra', {}))
+            if context.total:
+                self._context_totals[event_type] = self._context_totals.get(event_type, 0) + value
+            else:
+                multiplier = context.multiplier(value)
+                if multiplier != 1.0:
+                    self._multipliers.setdefault(event_type, []).append(multiplier)
+
+        # Timeline insertion (ties keep arrival order, like a stable sort)
+        flags = (_COPY if event_type in COPY_EVENTS else 0) | (_FOLLOW_UP if event_type in COPY_FOLLOW_UP_EVENTS else 0)
+        entry = (timestamp, arrival, flags)
+        position = bisect.bisect_left(self._timeline, entry)
+        self._timeline.insert(position, entry)
+
+        # Only copies within the lookahead distance before the new event can change
+        for i in range(max(0, position - _COPY_LOOKAHEAD), position + 1):
+            if self._timeline[i][2] & _COPY:
+                self._rematch_copy(i)
+
+        if event_type in TAB_SWITCH_EVENTS:
+            self._insert_tab_switch(timestamp, arrival)
+
+        # Temporal clustering
+        if event_type in CLUSTER_EVENTS:
+            window = int(_window_timestamp(event) // 60)
+            old_count = self._window_counts.get(window, 0)
+            self._window_counts[window] = old_count + 1
+            self._temporal_score += (
+                calculator._temporal_score([old_count + 1]) - calculator._temporal_score([old_count])
+            )
+
+        return event_type
+
+    def _rematch_copy(self, i: int):
+        """Re-evaluate whether the copy at timeline index i is followed by tab activity"""
+        timestamp, arrival, _ = self._timeline[i]
+        matched = False
+        for j in range(i + 1, min(i + 1 + _COPY_LOOKAHEAD, len(self._timeline))):
+            next_timestamp, _, next_flags = self._timeline[j]
+            if next_timestamp - timestamp > 30:
+                break
+            if next_flags & _FOLLOW_UP:
+                matched = True
+                break
+        if matched:
+            self._matched_copies.add(arrival)
+        else:
+            self._matched_copies.discard(arrival)
+
+    def _insert_tab_switch(self, timestamp: float, arrival: int):
+        # Keys include the arrival number so that ties are ordered like the timeline
+        keys = self._tab_switches
+        position = bisect.bisect_left(keys, (timestamp, arrival))
+        keys.insert(position, (timestamp, arrival))
+
+        # A burst can only be created by a window containing the new switch, and
+        # inserting a switch never breaks an existing burst
+        if not self._rapid_tab_switching:
+            for first in range(max(0, position - 2), min(position, len(keys) - 3) + 1):
+                if keys[first + 2][0] - keys[first][0] <= 120:
+                    self._rapid_tab_switching = True
+                    break
+
+    def _score_type(self, event_type: str) -> Optional[float]:
+        calculator = self.calculator
+        question_factor = calculator._get_question_normalization_factor(self.total_questions)
+        event_score = calculator._event_type_score(
+            event_type, self._counts[event_type], self.total_questions, question_factor
+        )
+        if event_score is None:
+            return None
+        context = self.rules.rule_for(event_type).context
+        if context is not None and context.total:
+            event_score *= context.multiplier(self._context_totals[event_type])
+        else:
+            for multiplier in self._multipliers.get(event_type, ()):
+                event_score *= multiplier
+        return event_score
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable state, for persisting between updates"""
+        return {
+            'version': STATE_VERSION,
+            'rule_version': self.rules.version,
+            'test_duration_minutes': self.test_duration_minutes,
+            'total_questions': self.total_questions,
+            'num_events': self._num_events,
+            'counts': list(self._counts.items()),
+            'multipliers': self._multipliers,
+            'context_totals': self._context_totals,
+            'timeline': [list(entry) for entry in self._timeline],
+            'matched_copies': sorted(self._matched_copies),
+            'tab_switches': [list(key) for key in self._tab_switches],
+            'rapid_tab_switching': self._rapid_tab_switching,
+            'window_counts': list(self._window_counts.items()),
+            'temporal_score': self._temporal_score,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any], calculator: Optional[ImprovedRiskCalculator] = None) -> 'IncrementalRiskScorer':
+        """Restore a scorer saved with to_dict()"""
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"Unsupported incremental scorer state version: {state.get('version')}")
+
+        scorer = cls(state['test_duration_minutes'], state['total_questions'], calculator)
+        if state['rule_version'] != scorer.rules.version:
+            raise ValueError(
+                f"Scorer state uses risk rules version {state['rule_version']}, current is {scorer.rules.version}"
+            )
+        scorer._num_events = state['num_events']
+        scorer._counts = dict(state['counts'])
+        scorer._multipliers = {event_type: list(values) for event_type, values in state['multipliers'].items()}
+        scorer._context_totals = dict(state['context_totals'])
+        scorer._timeline = [tuple(entry) for entry in state['timeline']]
+        scorer._matched_copies = set(state['matched_copies'])
+        scorer._tab_switches = [tuple(key) for key in state['tab_switches']]
+        scorer._rapid_tab_switching = state['rapid_tab_switching']
+        scorer._window_counts = dict(state['window_counts'])
+        scorer._temporal_score = state['temporal_score']
+        for event_type in scorer._counts:
+            scorer._type_scores[event_type] = scorer._score_type(event_type)
+        return scorer
@@ -0,0 +1,74 @@
+import logging
+from typing import Dict, Any, List, Optional, NamedTuple
+import ffmpeg
+
+logger = logging.getLogger(__name__)
+
+
+class MediaProbe(NamedTuple):
+    """Container metadata read by ffprobe, without decoding any frames"""
+    size_bytes: int
+    duration: Optional[float]   # Seconds; MediaRecorder webm files often carry none
+    has_video: bool
+    has_audio: bool
+
+    def rejection_reason(self) -> Optional[str]:
+        """Why this media cannot be analyzed, or None when it can"""
+        if self.size_bytes <= 0:
+            return 'empty media'
+        if not self.has_video:
+            return 'no video stream'
+        if self.duration is not None and self.duration <= 0:
+            return 'zero-length media'
+        return None
+
+    def estimated_frames(self, fps: float) -> Optional[int]:
+        """Frames the video analyzer will sample, when the duration is known"""
+        if self.duration is None:
+            return None
+        return int(self.duration * fps)
+
+
+def header_duration(probe: Dict[str, Any]) -> Optional[float]:
+    """Duration in ffprobe's JSON output: the container's, else the longest stream's"""
+    duration = probe.get('format', {}).get('duration')
+    if duration is None:
+        stream_durations = [float(s['duration']) for s in probe.get('streams', []) if s.get('duration')]
+        duration = max(stream_durations) if stream_durations else None
+    return float(duration) if duration is not None else None
+
+
+def packet_end_time(packets: List[Dict[str, Any]]) -> Optional[float]:
+    """End of the last packet in ffprobe's packet list, in seconds, or None when untimed"""
+    ends = [
+        float(packet['pts_time']) + float(packet.get('duration_time') or 0)
+        for packet in packets
+        if packet.get('pts_time') not in (None, 'N/A')
+    ]
+    return max(ends) if ends else None
+
+
+def summarize_probe(probe: Dict[str, Any], size_bytes: int) -> MediaProbe:
+    """Reduce ffprobe's JSON output to what scheduling and pre-flight checks need"""
+    streams = probe.get('streams', [])
+    return MediaProbe(
+        size_bytes=size_bytes,
+        duration=header_duration(probe),
+        has_video=any(s.get('codec_type') == 'video' for s in streams),
+        has_audio=any(s.get('codec_type') == 'audio' for s in streams),
+    )
+
+
+def probe_media(path: str, size_bytes: int) -> MediaProbe:
+    """ffprobe `path`. Raises ffmpeg.Error when the container cannot be read."""
+    return summarize_probe(ffmpeg.probe(path), size_bytes)
+
+
+def probe_stream_end(path: str, stream: str = 'v:0') -> Optional[float]:
+    """
+    End time of `stream` in seconds, from its packet timestamps, for
+    recordings whose header has no duration. Reads the whole container but
+    decodes nothing. Raises ffmpeg.Error when the container cannot be read.
+    """
+    probe = ffmpeg.probe(path, select_streams=stream, show_entries='packet=pts_time,duration_time')
+    return packet_end_time(probe.get('packets', []))
@@ -0,0 +1,265 @@
+import time
+import json
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Any
+
+from .tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers per-frame model calls up to hour-long stages
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _label_text(names: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic total, optionally split by label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def drain(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Tuple[str, ...], float]):
+        with self._lock:
+            for key, amount in values.items():
+                self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}" for key, value in values]
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observations, optionally split by label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: [count per bucket (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: Tuple[str, ...]) -> List[Any]:
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        return series
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._get(key)
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return sum(series[0]) if series else 0
+
+    def total(self, **labels) -> float:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return series[1] if series else 0.0
+
+    def drain(self) -> Dict[Tuple[str, ...], List[Any]]:
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series: Dict[Tuple[str, ...], List[Any]]):
+        with self._lock:
+            for key, (counts, total) in series.items():
+                target = self._get(key)
+                target[0] = [a + b for a, b in zip(target[0], counts)]
+                target[1] += total
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                bucket_labels = _label_text(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The worker's metrics, rendered in the Prometheus text format. Metrics
+    recorded in other processes (video slice workers) are shipped back with
+    drain() and added here with merge().
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets))
+
+    def drain(self) -> Dict[str, Any]:
+        """Take and reset everything recorded so far"""
+        return {name: metric.drain() for name, metric in self._metrics.items()}
+
+    def merge(self, drained: Dict[str, Any]):
+        for name, values in drained.items():
+            if name in self._metrics:
+                self._metrics[name].merge(values)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'proctor_stage_duration_seconds', 'Time spent in each pipeline stage (face and detect are per frame)', ['stage']
+)
+QUEUE_CLAIM_SECONDS = REGISTRY.histogram(
+    'proctor_queue_claim_duration_seconds', 'Latency of queue claim requests', ['result']
+)
+JOBS = REGISTRY.counter('proctor_jobs_total', 'Jobs finished, by outcome', ['outcome'])
+FRAMES_PROCESSED = REGISTRY.counter('proctor_frames_processed_total', 'Video frames run through the models')
+EVENTS_EMITTED = REGISTRY.counter('proctor_events_emitted_total', 'Events produced by analysis', ['analyzer'])
+BYTES_READ = REGISTRY.counter('proctor_bytes_read_total', 'Media bytes read from the database')
+RISK_CACHE_LOOKUPS = REGISTRY.counter(
+    'proctor_risk_cache_lookups_total', 'Risk score cache lookups, by result (hit, store_hit or miss)', ['result']
+)
+ANALYSIS_CACHE_LOOKUPS = REGISTRY.counter(
+    'proctor_analysis_cache_lookups_total', 'Analysis result cache lookups, by result (hit or miss)', ['result']
+)
+STARTUP_SECONDS = REGISTRY.histogram(
+    'proctor_startup_duration_seconds', 'Time spent in each phase of worker startup', ['phase']
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Record the duration of the enclosed block as `stage`, also when it
+    raises, and trace it as a span of that name
+    """
+    start = time.perf_counter()
+    try:
+        with TRACER.span(stage):
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+@contextmanager
+def startup_timer(phase: str):
+    """Record and log the duration of one phase of worker startup"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STARTUP_SECONDS.observe(elapsed, phase=phase)
+        logger.info(f"Startup phase {phase} took {elapsed:.2f}s")
+
+
+class MetricsServer:
+    """
+    Serves /metrics (Prometheus text format), /healthz and, given a
+    `readiness_check`, /readyz from a daemon thread. Each check returns
+    (ok, details); its endpoint answers 200 or 503 with the details as JSON.
+    """
+
+    def __init__(self, port: int, health_check: Callable[[], Tuple[bool, Dict[str, Any]]],
+                 host: str = '0.0.0.0', registry: MetricsRegistry = REGISTRY,
+                 readiness_check: Optional[Callable[[], Tuple[bool, Dict[str, Any]]]] = None):
+        registry_ref = registry
+        checks = {'/healthz': (health_check, 'unhealthy')}
+        if readiness_check is not None:
+            checks['/readyz'] = (readiness_check, 'not ready')
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    status, content_type = 200, 'text/plain; version=0.0.4'
+                    body = registry_ref.render().encode()
+                elif self.path in checks:
+                    check, failed_status = checks[self.path]
+                    try:
+                        ok, details = check()
+                    except Exception as e:
+                        ok, details = False, {'error': str(e)}
+                    status, content_type = (200 if ok else 503), 'application/json'
+                    body = json.dumps({'status': 'ok' if ok else failed_status, **details}).encode()
+                else:
+                    status, content_type, body = 404, 'text/plain', b'not found\n'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        self._paths = ['/metrics', *checks]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True)
+        self._thread.start()
+        logger.info(f"Serving {', '.join(self._paths)} on port {self.port}")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,130 @@
+import os
+import io
+import json
+import time
+import random
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+
+class JobProfiler:
+    """
+    Opt-in profiling of whole jobs: cProfile for CPU time and tracemalloc
+    for peak Python memory. A job is profiled when its data sets
+    `profile: true` or, otherwise, with probability `sample_rate`.
+
+    cProfile only sees the thread that enabled it, so work handed to other
+    threads is profiled with thread_profile() and merged into the job's
+    profile. Per job, `<job id>.prof` (pstats; snakeviz, `python -m pstats`)
+    and `<job id>.json` (summary) are written to `directory`.
+    """
+
+    def __init__(self, directory: Optional[str], sample_rate: float = 0.0, top_functions: int = 30):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.top_functions = top_functions
+        self._active_job: Optional[str] = None
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def should_profile(self, job_data: Dict[str, Any]) -> bool:
+        if not self.directory:
+            return False
+        if (job_data.get('data') or {}).get('profile'):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def profile_job(self, job_id: str, enabled: bool = True):
+        """Profile the enclosed block, and thread_profile() blocks run meanwhile, as job `job_id`"""
+        if not enabled:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        with self._lock:
+            self._active_job = job_id
+            self._thread_profiles = []
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            wall_seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.process_time() - cpu_start
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            with self._lock:
+                self._active_job = None
+                thread_profiles, self._thread_profiles = self._thread_profiles, []
+            try:
+                self._write(job_id, [profiler] + thread_profiles, wall_seconds, cpu_seconds, peak_bytes)
+            except Exception as e:
+                logger.warning(f"Failed to write profile for job {job_id}: {e}")
+
+    @contextmanager
+    def thread_profile(self):
+        """Profile the enclosed block into the active job's profile, if there is one"""
+        with self._lock:
+            active = self._active_job is not None
+        if not active:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._lock:
+                if self._active_job is not None:
+                    self._thread_profiles.append(profiler)
+
+    def _write(self, job_id: str, profiles: List[cProfile.Profile], wall_seconds: float,
+               cpu_seconds: float, peak_bytes: int):
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        prof_path = os.path.join(self.directory, f"{job_id}.prof")
+        stats.dump_stats(prof_path)
+
+        top = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in sorted(
+            stats.stats.items(), key=lambda item: item[1][3], reverse=True
+        )[:self.top_functions]:
+            top.append({
+                'function': f"{filename}:{line}({function})",
+                'calls': calls,
+                'total_seconds': round(total, 6),
+                'cumulative_seconds': round(cumulative, 6),
+            })
+        summary = {
+            'job_id': job_id,
+            'wall_seconds': round(wall_seconds, 3),
+            'cpu_seconds': round(cpu_seconds, 3),
+            'peak_traced_memory_bytes': peak_bytes,
+            'profiled_threads': len(profiles),
+            'top_cumulative': top,
+        }
+        with open(os.path.join(self.directory, f"{job_id}.json"), 'w') as f:
+            json.dump(summary, f, indent=2)
+        logger.info(
+            f"Profiled job {job_id}: {wall_seconds:.1f}s wall, {cpu_seconds:.1f}s CPU, "
+            f"peak traced memory {peak_bytes / 1e6:.1f} MB -> {prof_path}"
+        )
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+import logging
+from typing import Optional, NamedTuple
+
+from .event_batch import EventBatch
+from .frame_features import FEATURES_VERSION
+from .metrics import ANALYSIS_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever analyzer logic changes the events or features for the same input
+ANALYSIS_PIPELINE_VERSION = 1
+
+
+def configured_model_path() -> str:
+    """YOLO weights VideoAnalyzer loads: MODEL_PATH, or the ultralytics default"""
+    return os.getenv('MODEL_PATH', 'yolov8n.pt')
+
+
+def analyzer_version(model_path: str) -> str:
+    """
+    Identifies everything besides the asset bytes that determines analysis
+    output: the pipeline version, the feature format and the model weights
+    """
+    digest = hashlib.sha256(f"pipeline-{ANALYSIS_PIPELINE_VERSION}:features-{FEATURES_VERSION}".encode())
+    if os.path.isfile(model_path):
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    else:
+        digest.update(model_path.encode())
+    return digest.hexdigest()[:32]
+
+
+class CachedAnalysis(NamedTuple):
+    events: EventBatch          # Timestamps in seconds into the recording
+    features: Optional[bytes]   # FrameFeatures.to_bytes(), when available
+
+
+class AnalysisResultCache:
+    """
+    Analysis results keyed by (SHA-256 of the asset bytes, analyzer version),
+    in the worker-owned proctor_worker.analysis_result_cache table (see
+    prisma/migrations). Redelivered
+    jobs and duplicate uploads of the same recording reuse the stored events
+    and frame features instead of decoding and running the models again.
+    """
+
+    def __init__(self, db_connection, analyzer_version: str):
+        self.db_connection = db_connection
+        self.analyzer_version = analyzer_version
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, content_hash: str) -> Optional[CachedAnalysis]:
+        try:
+            with self.db_connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT events, features FROM proctor_worker.analysis_result_cache
+                    WHERE content_hash = %s AND analyzer_version = %s
+                """, (content_hash, self.analyzer_version))
+                row = cursor.fetchone()
+            self.db_connection.commit()
+        except Exception as e:
+            logger.warning(f"Analysis cache lookup failed: {e}")
+            self.db_connection.rollback()
+            return None
+
+        if row is None:
+            self.misses += 1
+            ANALYSIS_CACHE_LOOKUPS.inc(result='miss')
+            return None
+        self.hits += 1
+        ANALYSIS_CACHE_LOOKUPS.inc(result='hit')
+        events = EventBatch()
+        for event_type, timestamp, extra in row[0]:
+            events.append(event_type, timestamp, extra)
+        return CachedAnalysis(events, bytes(row[1]) if row[1] is not None else None)
+
+    def put(self, content_hash: str, events: EventBatch, features: Optional[bytes] = None):
+        rows = [[event['type'], event['timestamp'], event['extra']] for event in events]
+        try:
+            with self.db_connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO proctor_worker.analysis_result_cache (content_hash, analyzer_version, events, features)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (content_hash, analyzer_version) DO NOTHING
+                """, (content_hash, self.analyzer_version, json.dumps(rows), features))
+            self.db_connection.commit()
+        except Exception as e:
+            logger.warning(f"Analysis cache write failed: {e}")
+            self.db_connection.rollback()
@@ -0,0 +1,142 @@
+import copy
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Union
+
+from .event_batch import EventBatch
+from .metrics import RISK_CACHE_LOOKUPS
+from .risk_calculator import ImprovedRiskCalculator
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_VERSION = 1
+
+
+def event_fingerprint(events: Union[List[Dict], EventBatch]) -> str:
+    """
+    Stable hash of an event sequence. Order is part of the fingerprint, since
+    it can affect the score (first-seen order and ties in timestamp order).
+    """
+    digest = hashlib.blake2b(digest_size=20)
+
+    if isinstance(events, EventBatch):
+        digest.update(b'batch')
+        events.update_digest(digest)
+    else:
+        digest.update(b'dicts')
+        for event in events:
+            digest.update(json.dumps(event, sort_keys=True, default=str).encode())
+            digest.update(b'\n')
+
+    return digest.hexdigest()
+
+
+class PostgresRiskResultStore:
+    """
+    Cross-worker store of risk results, in the worker-owned
+    proctor_worker.risk_score_cache table (see prisma/migrations)
+    """
+
+    def __init__(self, db_connection):
+        self.db_connection = db_connection
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self.db_connection.cursor() as cursor:
+                cursor.execute("SELECT result FROM proctor_worker.risk_score_cache WHERE key = %s", (key,))
+                row = cursor.fetchone()
+            self.db_connection.commit()
+        except Exception as e:
+            logger.warning(f"Risk result store lookup failed: {e}")
+            self.db_connection.rollback()
+            return None
+        if not row:
+            return None
+        return row[0] if isinstance(row[0], dict) else json.loads(row[0])
+
+    def put(self, key: str, result: Dict[str, Any]):
+        try:
+            with self.db_connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO proctor_worker.risk_score_cache (key, result)
+                    VALUES (%s, %s)
+                    ON CONFLICT (key) DO NOTHING
+                """, (key, json.dumps(result)))
+            self.db_connection.commit()
+        except Exception as e:
+            logger.warning(f"Risk result store write failed: {e}")
+            self.db_connection.rollback()
+
+
+class MemoizedRiskCalculator:
+    """
+    Memoizes calculate_risk_score on (event fingerprint, test duration,
+    question count, rules version), in a bounded in-process LRU and,
+    optionally, a persistent store shared between workers.
+    """
+
+    def __init__(self, calculator: Optional[ImprovedRiskCalculator] = None, max_entries: int = 1024,
+                 store: Optional[PostgresRiskResultStore] = None):
+        self.calculator = calculator or ImprovedRiskCalculator()
+        self.max_entries = max_entries
+        self.store = store
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def cache_key(self, events, test_duration_minutes, total_questions) -> str:
+        rules = self.calculator.refresh_rules()
+        return ':'.join([
+            f"v{FINGERPRINT_VERSION}",
+            event_fingerprint(events),
+            str(test_duration_minutes),
+            str(total_questions),
+            str(rules.version),
+        ])
+
+    def calculate_risk_score(self, events: Union[List[Dict], EventBatch], test_duration_minutes: int = 60,
+                             total_questions: int = 30) -> Dict[str, Any]:
+        key = self.cache_key(events, test_duration_minutes, total_questions)
+
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                RISK_CACHE_LOOKUPS.inc(result='hit')
+                return copy.deepcopy(result)
+
+        result = self.store.get(key) if self.store is not None else None
+        if result is not None:
+            self.store_hits += 1
+            RISK_CACHE_LOOKUPS.inc(result='store_hit')
+        else:
+            self.misses += 1
+            RISK_CACHE_LOOKUPS.inc(result='miss')
+            result = self.calculator.calculate_risk_score(events, test_duration_minutes, total_questions)
+            if self.store is not None:
+                self.store.put(key, result)
+
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return copy.deepcopy(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit counts and rates since start"""
+        lookups = self.hits + self.store_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'store_hits': self.store_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.store_hits) / lookups if lookups else 0.0,
+        }
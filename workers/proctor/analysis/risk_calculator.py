@@ -1,9 +1,89 @@
+import os
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, FrozenSet, Optional, Union
 import json
 
+from .event_batch import EventBatch
+from .risk_rules import DEFAULT_RULES_PATH, CompiledRiskRules, ContextRule, RiskRulesSource
+
 logger = logging.getLogger(__name__)
 
+# Event type groups shared by the scoring helpers
+HIGH_RISK_NAVIGATION_EVENTS = ('COPY_DETECTED', 'TAB_HIDDEN', 'TAB_SWITCH', 'NEW_TAB_OPENED')
+CLUSTER_EVENTS = ('COPY_DETECTED', 'TAB_HIDDEN', 'TAB_SWITCH', 'PHONE_DETECTED', 'MULTIPLE_PEOPLE')
+COPY_EVENTS = ('COPY_DETECTED',)
+COPY_FOLLOW_UP_EVENTS = ('TAB_HIDDEN', 'TAB_SWITCH', 'WINDOW_BLUR')
+TAB_SWITCH_EVENTS = ('TAB_SWITCH', 'TAB_HIDDEN')
+
+
+def _window_timestamp(event: Dict) -> float:
+    """Timestamp used for temporal clustering: the stored `ts` datetime when present"""
+    ts = event.get('ts')
+    return ts.timestamp() if hasattr(ts, 'timestamp') else event.get('timestamp', 0)
+
+
+class _EventTimeline:
+    """
+    Index over the events of one scoring call, built in a single pass:
+    event types interned to integer codes (in first-seen order), the
+    positions of each type, and the timestamp-sorted order of all events.
+    Accepts event dicts or an EventBatch.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self._type_codes: Dict[str, int] = {}
+
+        if isinstance(events, EventBatch):
+            self.type_names, self.codes, self.type_positions = events.group_by_type()
+            self._type_codes = {name: code for code, name in enumerate(self.type_names)}
+            order = events.time_order()
+            self.sorted_timestamps = events.timestamps[order].tolist()
+            self.sorted_codes = [self.codes[i] for i in order.tolist()]
+            return
+
+        self.type_names: List[str] = []
+        self.type_positions: List[List[int]] = []
+        self.codes: List[int] = []
+
+        timestamps = []
+        for position, event in enumerate(events):
+            event_type = event.get('type', 'UNKNOWN')
+            code = self._type_codes.get(event_type)
+            if code is None:
+                code = self._type_codes[event_type] = len(self.type_names)
+                self.type_names.append(event_type)
+                self.type_positions.append([])
+            self.codes.append(code)
+            self.type_positions[code].append(position)
+            timestamps.append(event.get('timestamp', 0))
+
+        # Stable sort, so events with equal timestamps keep their input order
+        order = sorted(range(len(events)), key=timestamps.__getitem__)
+        self.sorted_timestamps = [timestamps[i] for i in order]
+        self.sorted_codes = [self.codes[i] for i in order]
+
+    def codes_of(self, event_types: Iterable[str]) -> FrozenSet[int]:
+        """Codes of the given event types that occur in this timeline"""
+        return frozenset(self._type_codes[t] for t in event_types if t in self._type_codes)
+
+    def context_values(self, code: int, context: ContextRule) -> List[float]:
+        """Values of a context rule's `extra` field for the events of one type, in input order"""
+        positions = self.type_positions[code]
+        if isinstance(self.events, EventBatch):
+            return [context.adjust(self.events.extra_value(p, context.field, context.default)) for p in positions]
+        return [context.value(self.events[p].get('extra', {})) for p in positions]
+
+    def window_timestamp(self, position: int) -> float:
+        """Timestamp of one event for temporal clustering"""
+        if isinstance(self.events, EventBatch):
+            return self.events.timestamp(position)
+        return _window_timestamp(self.events[position])
+
+    def event_counts(self) -> Dict[str, int]:
+        """Occurrences per event type, in first-seen order"""
+        return {name: len(positions) for name, positions in zip(self.type_names, self.type_positions)}
+
 
 class ImprovedRiskCalculator:
     """
@@ -11,163 +91,92 @@ class ImprovedRiskCalculator:
     proctoring events, test duration, and question count.
     """
 
-    def __init__(self):
-        # Revised risk weights based on actual exam behavior patterns
-        self.risk_weights = {
-            # Browser Navigation Events (High Priority - indicates external resource usage)
-            'TAB_HIDDEN': 8.0,           # Major red flag - student left exam tab
-            'WINDOW_BLUR': 6.0,          # High concern - focus moved away from exam
-            'TAB_SWITCH': 10.0,          # Critical - actively switching between tabs
-            'NEW_TAB_OPENED': 12.0,      # Critical - opening new resources
-            'MOUSE_LEFT_WINDOW': 4.0,    # Moderate - could be accidental or intentional
-
-            # Copy/Paste Behavior (Copy is the main concern)
-            'COPY_DETECTED': 8.0,        # High - copying questions to search elsewhere
-            'PASTE_DETECTED': 3.0,       # Lower - rare in MCQs, but still suspicious
-            'SELECT_ALL_DETECTED': 6.0,  # Moderate-High - often precedes copying
-
-            # Developer Tools (Tracked but not scored)
-            'DEVTOOLS_DETECTED': 0.0,
-            'DEVTOOLS_SHORTCUT': 0.0,
-            'F12_PRESSED': 0.0,
-            'CONTEXT_MENU_DETECTED': 2.0, # Low - often accidental right-clicks
-
-            # Keyboard Shortcuts (Context-dependent)
-            'CTRL_C': 8.0,               # High - explicit copy command
-            'CTRL_V': 3.0,               # Low - paste less relevant for MCQs
-            'CTRL_A': 5.0,               # Moderate - select all before copy
-            'CTRL_TAB': 9.0,             # Very High - tab switching shortcut
-            'ALT_TAB': 7.0,              # High - application switching
-            'KEYBOARD_SHORTCUT': 2.0,    # Generic shortcuts, lower priority
-
-            # Video Analysis Events (Physical behavior)
-            'LOOK_AWAY': 3.0,            # Moderate - could be natural or suspicious
-            'PHONE_DETECTED': 12.0,      # Critical - clear violation
-            'MULTIPLE_PEOPLE': 15.0,     # Critical - clear violation
-            'EYES_NOT_ON_SCREEN': 4.0,   # Moderate - natural movement vs suspicious
-
-            # Audio Analysis Events
-            'MULTIPLE_SPEAKERS_DETECTED': 10.0,  # High - collaboration
-            'SUSPICIOUS_SILENCE': 1.0,           # Low - could be concentration
-            'POSSIBLE_SPEAKER_CHANGE': 2.0,      # Low-Moderate
-            'BACKGROUND_NOISE': 0.5,             # Very Low - environmental
-
-            # Inactivity (Context-dependent)
-            'INACTIVITY_DETECTED': 1.0,  # Low base - adjusted by duration
-        }
+    def __init__(self, rules_path: Optional[str] = None):
+        # Weights, event definitions, thresholds and context rules live in a
+        # versioned rules file, compiled per event type and reloaded on change
+        self.rules_source = RiskRulesSource(rules_path or os.getenv('RISK_RULES_PATH', DEFAULT_RULES_PATH))
+        self.rules = self.rules_source.current()
+        logger.info(f"ImprovedRiskCalculator initialized (rules version {self.rules.version})")
 
-        # Centralized event definitions
-        self.event_definitions = {
-            # Browser Navigation
-            'TAB_HIDDEN': {'category': 'BROWSER', 'criticality': 'HIGH'},
-            'WINDOW_BLUR': {'category': 'BROWSER', 'criticality': 'HIGH'},
-            'TAB_SWITCH': {'category': 'BROWSER', 'criticality': 'CRITICAL'},
-            'NEW_TAB_OPENED': {'category': 'BROWSER', 'criticality': 'CRITICAL'},
-            'MOUSE_LEFT_WINDOW': {'category': 'BROWSER', 'criticality': 'MEDIUM'},
-            # Copy/Paste
-            'COPY_DETECTED': {'category': 'COPY_PASTE', 'criticality': 'CRITICAL'},
-            'PASTE_DETECTED': {'category': 'COPY_PASTE', 'criticality': 'LOW'},
-            'SELECT_ALL_DETECTED': {'category': 'COPY_PASTE', 'criticality': 'MEDIUM'},
-            # Developer Tools (Tracked but not scored)
-            'DEVTOOLS_DETECTED': {'category': 'DEV_TOOLS', 'criticality': 'NONE'},
-            'DEVTOOLS_SHORTCUT': {'category': 'DEV_TOOLS', 'criticality': 'NONE'},
-            'F12_PRESSED': {'category': 'DEV_TOOLS', 'criticality': 'NONE'},
-            'CONTEXT_MENU_DETECTED': {'category': 'BROWSER', 'criticality': 'LOW'},
-            # Keyboard Shortcuts
-            'CTRL_C': {'category': 'KEYBOARD', 'criticality': 'CRITICAL'},
-            'CTRL_V': {'category': 'KEYBOARD', 'criticality': 'LOW'},
-            'CTRL_A': {'category': 'KEYBOARD', 'criticality': 'MEDIUM'},
-            'CTRL_TAB': {'category': 'KEYBOARD', 'criticality': 'CRITICAL'},
-            'ALT_TAB': {'category': 'KEYBOARD', 'criticality': 'HIGH'},
-            'KEYBOARD_SHORTCUT': {'category': 'KEYBOARD', 'criticality': 'LOW'},
-            # Video Analysis
-            'LOOK_AWAY': {'category': 'PHYSICAL', 'criticality': 'MEDIUM'},
-            'PHONE_DETECTED': {'category': 'PHYSICAL', 'criticality': 'CRITICAL'},
-            'MULTIPLE_PEOPLE': {'category': 'PHYSICAL', 'criticality': 'CRITICAL'},
-            'EYES_NOT_ON_SCREEN': {'category': 'PHYSICAL', 'criticality': 'MEDIUM'},
-            # Audio Analysis
-            'MULTIPLE_SPEAKERS_DETECTED': {'category': 'AUDIO', 'criticality': 'HIGH'},
-            'SUSPICIOUS_SILENCE': {'category': 'AUDIO', 'criticality': 'LOW'},
-            'POSSIBLE_SPEAKER_CHANGE': {'category': 'AUDIO', 'criticality': 'MEDIUM'},
-            'BACKGROUND_NOISE': {'category': 'AUDIO', 'criticality': 'VERY_LOW'},
-            # Inactivity
-            'INACTIVITY_DETECTED': {'category': 'INACTIVITY', 'criticality': 'LOW'},
-        }
+    def refresh_rules(self) -> CompiledRiskRules:
+        """Pick up a changed rules file; called once at the start of every scoring run"""
+        self.rules = self.rules_source.current()
+        return self.rules
 
-        # Risk thresholds
-        self.risk_thresholds = {
-            'LOW': 0,
-            'MEDIUM': 15,     # Raised threshold - focus on clear violations
-            'HIGH': 35,       # Raised threshold
-            'CRITICAL': 60    # Raised threshold
-        }
+    @property
+    def risk_weights(self) -> Dict[str, float]:
+        return self.rules.risk_weights
 
-        # Suspicious event combinations that amplify risk
-        self.violation_patterns = {
-            'COPY_SEARCH_PATTERN': ['COPY_DETECTED', 'TAB_HIDDEN', 'TAB_SWITCH'],
-            'EXTERNAL_HELP_PATTERN': ['TAB_HIDDEN', 'WINDOW_BLUR', 'MOUSE_LEFT_WINDOW'],
-            'COLLABORATION_PATTERN': ['MULTIPLE_PEOPLE', 'MULTIPLE_SPEAKERS_DETECTED'],
-            'RESOURCE_ACCESS_PATTERN': ['NEW_TAB_OPENED', 'CTRL_TAB', 'TAB_SWITCH']
-        }
-        logger.info("ImprovedRiskCalculator initialized")
+    @property
+    def event_definitions(self) -> Dict[str, Dict[str, str]]:
+        return self.rules.event_definitions
+
+    @property
+    def risk_thresholds(self) -> Dict[str, float]:
+        return self.rules.risk_thresholds
 
+    @property
+    def violation_patterns(self) -> Dict[str, List[str]]:
+        return self.rules.violation_patterns
 
-    def calculate_risk_score(self, events: List[Dict], test_duration_minutes: int = 60, total_questions: int = 30) -> Dict[str, Any]:
+    def calculate_risk_score(self, events: Union[List[Dict], EventBatch], test_duration_minutes: int = 60, total_questions: int = 30) -> Dict[str, Any]:
         """
         Calculate improved risk score with better context awareness
         Args:
-            events: List of proctoring events
+            events: List of proctoring events, or an EventBatch
             test_duration_minutes: Total test duration
             total_questions: Total number of questions in the test
         """
-        # Group events by type for analysis
-        event_counts = {}
-        event_details: Dict[str, List[Dict]] = {}
-
-        for event in events:
-            event_type = event.get('type', 'UNKNOWN')
-            if event_type not in event_counts:
-                event_counts[event_type] = 0
-                event_details[event_type] = []
+        self.refresh_rules()
 
-            event_counts[event_type] += 1
-            event_details[event_type].append(event)
+        # Index events once: type codes, per-type positions and timestamp order
+        timeline = _EventTimeline(events)
+        event_counts = timeline.event_counts()
 
         # Calculate question-normalized base score
-        base_score = self._calculate_enhanced_base_score(event_counts, event_details, total_questions)
+        base_score = self._calculate_enhanced_base_score(timeline, total_questions)
 
         # Calculate pattern-based violations
-        pattern_score = self._calculate_violation_patterns(events, total_questions)
+        pattern_score = self._calculate_violation_patterns(timeline, total_questions)
 
         # Calculate temporal clustering penalties
-        temporal_score = self._calculate_temporal_violations(events)
+        temporal_score = self._calculate_temporal_violations(timeline)
 
         # Apply context-based adjustments
         context_adjustment = self._calculate_context_adjustments(
-            event_counts, event_details, test_duration_minutes, total_questions
+            event_counts, test_duration_minutes, total_questions
+        )
+
+        return self._assemble_breakdown(
+            event_counts, base_score, pattern_score, temporal_score, context_adjustment, total_questions
         )
 
+    def _assemble_breakdown(self, event_counts: Dict[str, int], base_score: float, pattern_score: float,
+                            temporal_score: float, context_adjustment: float, total_questions: int) -> Dict[str, Any]:
+        """
+        Combine the component scores into the stored risk breakdown
+        """
         # Calculate final score
         total_score = base_score + pattern_score + temporal_score + context_adjustment
 
         # Cap at 100
         final_score = min(total_score, 100.0)
         
-        high_risk_event_types = ['COPY_DETECTED', 'TAB_HIDDEN', 'TAB_SWITCH', 'NEW_TAB_OPENED']
         high_risk_per_question = sum(
             event_counts.get(event_type, 0)
-            for event_type in high_risk_event_types
+            for event_type in HIGH_RISK_NAVIGATION_EVENTS
         ) / max(total_questions, 1)
 
 
         return {
             'total_score': final_score,
+            'rule_version': self.rules.version,
             'base_score': base_score,
             'pattern_score': pattern_score,
             'temporal_score': temporal_score,
             'context_adjustment': context_adjustment,
             'risk_category': self._get_risk_category(final_score),
-            'violation_details': self._get_violation_summary(event_counts, event_details),
+            'violation_details': self._get_violation_summary(event_counts),
             'question_context': {
                 'total_questions': total_questions,
                 'violations_per_question': round(sum(event_counts.values()) / max(total_questions, 1), 3),
@@ -175,7 +184,7 @@ class ImprovedRiskCalculator:
             }
         }
 
-    def _calculate_enhanced_base_score(self, event_counts: Dict, event_details: Dict, total_questions: int) -> float:
+    def _calculate_enhanced_base_score(self, timeline: '_EventTimeline', total_questions: int) -> float:
         """
         Calculate base score with progressive penalties and question normalization
         """
@@ -184,117 +193,109 @@ class ImprovedRiskCalculator:
         # Question-based normalization factors
         question_factor = self._get_question_normalization_factor(total_questions)
 
-        for event_type, count in event_counts.items():
-            base_weight = self.risk_weights.get(event_type, 1.0)
-            event_def = self.event_definitions.get(event_type, {})
-            criticality = event_def.get('criticality')
-            category = event_def.get('category')
-            
-            if base_weight == 0.0 or criticality == 'NONE':
+        for code, event_type in enumerate(timeline.type_names):
+            count = len(timeline.type_positions[code])
+            event_score = self._event_type_score(event_type, count, total_questions, question_factor)
+            if event_score is None:
                 continue
 
-            # Calculate violation rate per question
-            violation_rate = count / max(total_questions, 1)
-            
-            question_multiplier = 1.0
-
-            # Apply question-based multiplier for critical events
-            if criticality in ['CRITICAL', 'HIGH']:
-                # These events are particularly concerning relative to question count
-                if violation_rate >= 0.5:  # 50%+ of questions involved violations
-                    question_multiplier = 3.0
-                elif violation_rate >= 0.3:  # 30%+ of questions
-                    question_multiplier = 2.5
-                elif violation_rate >= 0.1:  # 10%+ of questions
-                    question_multiplier = 2.0
-                elif violation_rate >= 0.05:  # 5%+ of questions
-                    question_multiplier = 1.5
-
-                # For very small tests, single violations are more significant
-                if total_questions <= 5 and count >= 1:
-                    question_multiplier = max(question_multiplier, 2.0)
-                elif total_questions <= 10 and count >= 2:
-                    question_multiplier = max(question_multiplier, 1.8)
-
-            elif category == 'PHYSICAL':
-                # Critical violations - less dependent on question count but still matters
-                question_multiplier = 1.0 + (violation_rate * 2.0)
-
-            else:
-                # Other events - standard question normalization
-                question_multiplier = 1.0 + (violation_rate * 1.0)
-
-            # Progressive penalty system with question context
-            frequency_multiplier = 1.0
-            if criticality == 'CRITICAL':
-                # Severe penalties for repeated navigation/copying
-                if count == 1:
-                    frequency_multiplier = 1.0
-                elif count <= 3:
-                    frequency_multiplier = 1.0 + (count - 1) * 0.8
-                else:
-                    frequency_multiplier = 1.0 + 2 * 0.8 + (count - 3) * 1.2
-            elif category == 'PHYSICAL' and criticality == 'CRITICAL':
-                # Critical violations - severe even on first occurrence
-                frequency_multiplier = min(count * 1.5, 4.0)
-            else:
-                # Standard progression for other events
-                frequency_multiplier = min(1.0 + (count - 1) * 0.4, 2.5)
-
-            # Calculate final event score
-            event_score = base_weight * frequency_multiplier * question_multiplier * question_factor
-
             # Apply event-specific context
-            event_score = self._apply_enhanced_context(event_type, event_details.get(event_type, []), event_score)
+            context = self.rules.rule_for(event_type).context
+            if context is not None:
+                event_score = self._apply_context(context, timeline.context_values(code, context), event_score)
 
             total_score += event_score
 
         return total_score
 
+    def _event_type_score(self, event_type: str, count: int, total_questions: int, question_factor: float) -> Optional[float]:
+        """
+        Score all occurrences of one event type before event-specific context.
+        Returns None for event types that are tracked but not scored.
+        """
+        rule = self.rules.rule_for(event_type)
+        if not rule.scored:
+            return None
+        base_weight = rule.weight
+        criticality = rule.criticality
+        category = rule.category
+
+        # Calculate violation rate per question
+        violation_rate = count / max(total_questions, 1)
+        
+        question_multiplier = 1.0
+
+        # Apply question-based multiplier for critical events
+        if criticality in ('CRITICAL', 'HIGH'):
+            # These events are particularly concerning relative to question count
+            if violation_rate >= 0.5:  # 50%+ of questions involved violations
+                question_multiplier = 3.0
+            elif violation_rate >= 0.3:  # 30%+ of questions
+                question_multiplier = 2.5
+            elif violation_rate >= 0.1:  # 10%+ of questions
+                question_multiplier = 2.0
+            elif violation_rate >= 0.05:  # 5%+ of questions
+                question_multiplier = 1.5
+
+            # For very small tests, single violations are more significant
+            if total_questions <= 5 and count >= 1:
+                question_multiplier = max(question_multiplier, 2.0)
+            elif total_questions <= 10 and count >= 2:
+                question_multiplier = max(question_multiplier, 1.8)
+
+        elif category == 'PHYSICAL':
+            # Critical violations - less dependent on question count but still matters
+            question_multiplier = 1.0 + (violation_rate * 2.0)
+
+        else:
+            # Other events - standard question normalization
+            question_multiplier = 1.0 + (violation_rate * 1.0)
+
+        # Progressive penalty system with question context
+        frequency_multiplier = 1.0
+        if criticality == 'CRITICAL':
+            # Severe penalties for repeated navigation/copying
+            if count == 1:
+                frequency_multiplier = 1.0
+            elif count <= 3:
+                frequency_multiplier = 1.0 + (count - 1) * 0.8
+            else:
+                frequency_multiplier = 1.0 + 2 * 0.8 + (count - 3) * 1.2
+        elif category == 'PHYSICAL' and criticality == 'CRITICAL':
+            # Critical violations - severe even on first occurrence
+            frequency_multiplier = min(count * 1.5, 4.0)
+        else:
+            # Standard progression for other events
+            frequency_multiplier = min(1.0 + (count - 1) * 0.4, 2.5)
+
+        # Calculate final event score
+        return base_weight * frequency_multiplier * question_multiplier * question_factor
+
     def _apply_enhanced_context(self, event_type: str, event_list: List, base_score: float) -> float:
         """
-        Apply enhanced contextual adjustments
+        Apply enhanced contextual adjustments (the event type's context rule)
         """
-        if not event_list:
+        context = self.rules.rule_for(event_type).context
+        if context is None:
             return base_score
+        return self._apply_context(context, [context.value(event.get('extra', {})) for event in event_list], base_score)
 
-        adjusted_score = base_score
-
-        # Enhanced context for specific events
-        if event_type == 'COPY_DETECTED':
-            # Higher penalty if copying large amounts of text
-            for event in event_list:
-                text_length = event.get('extra', {}).get('text_length', 0)
-                if text_length > 100:  # Likely copying full questions
-                    adjusted_score *= 1.5
-                elif text_length > 50:
-                    adjusted_score *= 1.2
-
-        elif event_type == 'TAB_HIDDEN':
-            # Longer duration away = higher penalty
-            total_duration = sum(event.get('extra', {}).get('duration_seconds', 5) for event in event_list)
-            if total_duration > 60:  # More than 1 minute total
-                adjusted_score *= 2.0
-            elif total_duration > 30:
-                adjusted_score *= 1.5
+    def _apply_context(self, context: ContextRule, values: List[float], base_score: float) -> float:
+        """
+        Apply a context rule to the `extra` values of one event type's events
+        """
+        if not values:
+            return base_score
 
-        elif event_type == 'LOOK_AWAY':
-            # Significant head movements are more suspicious
-            for event in event_list:
-                yaw = abs(event.get('extra', {}).get('yaw', 0))
-                if yaw > 70:  # Looking away significantly
-                    adjusted_score *= 1.8
-                elif yaw > 45:
-                    adjusted_score *= 1.3
+        adjusted_score = base_score
 
-        elif event_type == 'INACTIVITY_DETECTED':
-            # Very long inactivity periods are suspicious
-            for event in event_list:
-                duration = event.get('extra', {}).get('inactiveSeconds', 60)
-                if duration > 600:  # 10+ minutes
-                    adjusted_score *= 3.0
-                elif duration > 300:  # 5+ minutes
-                    adjusted_score *= 2.0
+        if context.total:
+            # Rule applies to the total over all events, e.g. time away from the exam tab
+            adjusted_score *= context.multiplier(sum(values))
+        else:
+            # Per-event adjustments compound
+            for value in values:
+                adjusted_score *= context.multiplier(value)
 
         return adjusted_score
 
@@ -317,14 +318,48 @@ class ImprovedRiskCalculator:
         else:
             return 0.8  # Very long test
 
-    def _calculate_violation_patterns(self, events: List[Dict], total_questions: int) -> float:
+    def _calculate_violation_patterns(self, timeline: '_EventTimeline', total_questions: int) -> float:
         """
         Detect and penalize suspicious patterns of behavior with question context
         """
-        pattern_score = 0.0
+        # Timeline of events, already sorted by timestamp
+        timestamps = timeline.sorted_timestamps
+        codes = timeline.sorted_codes
+
+        # Check for copy-search patterns (copy followed by tab activity within 30 seconds,
+        # looking at most 9 events ahead). Walking backwards keeps track of the next
+        # tab activity, so each copy is resolved in O(1).
+        copy_codes = timeline.codes_of(COPY_EVENTS)
+        follow_up_codes = timeline.codes_of(COPY_FOLLOW_UP_EVENTS)
+        copy_search_patterns = 0
+        if copy_codes and follow_up_codes:
+            num_events = len(codes)
+            next_follow_up = num_events
+            for i in range(num_events - 1, -1, -1):
+                code = codes[i]
+                if code in copy_codes:
+                    j = next_follow_up
+                    if j < num_events and j < i + 10 and timestamps[j] - timestamps[i] <= 30:
+                        copy_search_patterns += 1
+                elif code in follow_up_codes:
+                    next_follow_up = i
+
+        # Check for rapid tab switching (3+ switches within 2 minutes)
+        tab_codes = timeline.codes_of(TAB_SWITCH_EVENTS)
+        tab_switch_times = [t for t, code in zip(timestamps, codes) if code in tab_codes]
+        rapid_tab_switching = any(
+            tab_switch_times[i + 2] - tab_switch_times[i] <= 120
+            for i in range(len(tab_switch_times) - 2)
+        )
+
+        return self._pattern_score(copy_search_patterns, len(tab_switch_times), rapid_tab_switching, total_questions)
 
-        # Create timeline of events
-        timeline = sorted(events, key=lambda x: x.get('timestamp', 0))
+    def _pattern_score(self, copy_search_patterns: int, tab_switch_count: int,
+                       rapid_tab_switching: bool, total_questions: int) -> float:
+        """
+        Score detected behaviour patterns with question context
+        """
+        pattern_score = 0.0
 
         # Question context for pattern severity
         question_severity_factor = 1.0
@@ -335,20 +370,6 @@ class ImprovedRiskCalculator:
         elif total_questions >= 50:
             question_severity_factor = 0.7
 
-        # Check for copy-search patterns (copy followed by tab switch within short time)
-        copy_search_patterns = 0
-        for i, event in enumerate(timeline):
-            if event.get('type') == 'COPY_DETECTED':
-                # Look for tab activities within next 30 seconds
-                event_time = event.get('timestamp', 0)
-                for j in range(i + 1, min(i + 10, len(timeline))):
-                    next_event = timeline[j]
-                    if next_event.get('timestamp', 0) - event_time > 30:
-                        break
-                    if next_event.get('type') in ['TAB_HIDDEN', 'TAB_SWITCH', 'WINDOW_BLUR']:
-                        copy_search_patterns += 1
-                        break
-
         # Apply question-based penalty for copy-search patterns
         if copy_search_patterns > 0:
             # Calculate violation rate vs questions
@@ -363,57 +384,44 @@ class ImprovedRiskCalculator:
             else:
                 pattern_score += copy_search_patterns * 10.0 * question_severity_factor
 
-        # Check for rapid tab switching with question context
-        tab_switches = [e for e in timeline if e.get('type') in ['TAB_SWITCH', 'TAB_HIDDEN']]
-        if len(tab_switches) >= 3:
-            switch_rate = len(tab_switches) / max(total_questions, 1)
-
-            # Check if 3+ switches happened within 2 minutes
-            for i in range(len(tab_switches) - 2):
-                if (tab_switches[i + 2].get('timestamp', 0) -
-                    tab_switches[i].get('timestamp', 0)) <= 120:
-
-                    # Penalty based on switching rate relative to questions
-                    if switch_rate >= 0.3:  # Switching on 30%+ of questions
-                        pattern_score += 30.0 * question_severity_factor
-                    elif switch_rate >= 0.1:  # Switching on 10%+ of questions
-                        pattern_score += 20.0 * question_severity_factor
-                    else:
-                        pattern_score += 15.0 * question_severity_factor
-                    break
+        # Penalty for rapid tab switching, based on switching rate relative to questions
+        if tab_switch_count >= 3 and rapid_tab_switching:
+            switch_rate = tab_switch_count / max(total_questions, 1)
+
+            if switch_rate >= 0.3:  # Switching on 30%+ of questions
+                pattern_score += 30.0 * question_severity_factor
+            elif switch_rate >= 0.1:  # Switching on 10%+ of questions
+                pattern_score += 20.0 * question_severity_factor
+            else:
+                pattern_score += 15.0 * question_severity_factor
 
         return pattern_score
 
-    def _calculate_temporal_violations(self, events: List[Dict]) -> float:
+    def _calculate_temporal_violations(self, timeline: '_EventTimeline') -> float:
         """
         Calculate penalties for temporal clustering of violations
         """
-        temporal_score = 0.0
-
-        # Group events by 60-second windows
-        time_windows: Dict[int, List] = {}
-        for event in events:
-            # Assuming timestamp is a float (epoch time)
-            timestamp = event.get('ts').timestamp() if hasattr(event.get('ts'), 'timestamp') else event.get('timestamp', 0)
-            window = int(timestamp // 60) # 60-second windows
-
-            if window not in time_windows:
-                time_windows[window] = []
-            time_windows[window].append(event)
+        # Count high-risk events per 60-second window
+        window_counts: Dict[int, int] = {}
+        for code in timeline.codes_of(CLUSTER_EVENTS):
+            for position in timeline.type_positions[code]:
+                window = int(timeline.window_timestamp(position) // 60)
+                window_counts[window] = window_counts.get(window, 0) + 1
 
-        # Penalize windows with multiple high-risk events
-        high_risk_events = ['COPY_DETECTED', 'TAB_HIDDEN', 'TAB_SWITCH', 'PHONE_DETECTED', 'MULTIPLE_PEOPLE']
-
-        for window_events in time_windows.values():
-            high_risk_count = sum(1 for e in window_events
-                                if e.get('type') in high_risk_events)
+        return self._temporal_score(window_counts.values())
 
+    def _temporal_score(self, window_counts: Iterable[int]) -> float:
+        """
+        Penalize 60-second windows with multiple high-risk events
+        """
+        temporal_score = 0.0
+        for high_risk_count in window_counts:
             if high_risk_count >= 3:
                 temporal_score += high_risk_count * 8.0  # Clustering penalty
 
         return temporal_score
 
-    def _calculate_context_adjustments(self, event_counts: Dict, event_details: Dict, test_duration: int, total_questions: int) -> float:
+    def _calculate_context_adjustments(self, event_counts: Dict, test_duration: int, total_questions: int) -> float:
         """
         Apply context-based adjustments for test duration and overall behavior
         """
@@ -430,7 +438,7 @@ class ImprovedRiskCalculator:
         # Question-based violation frequency assessment
         total_high_risk_events = sum(
             event_counts.get(event_type, 0)
-            for event_type in ['COPY_DETECTED', 'TAB_HIDDEN', 'TAB_SWITCH', 'NEW_TAB_OPENED']
+            for event_type in HIGH_RISK_NAVIGATION_EVENTS
         )
 
         # Calculate violation-to-question ratio
@@ -475,7 +483,7 @@ class ImprovedRiskCalculator:
         else:
             return 'LOW'
 
-    def _get_violation_summary(self, event_counts: Dict, event_details: Dict) -> Dict:
+    def _get_violation_summary(self, event_counts: Dict) -> Dict:
         """
         Generate summary of key violations for review
         """
@@ -486,8 +494,7 @@ class ImprovedRiskCalculator:
         }
 
         # Highlight high-risk events
-        high_risk_events = ['COPY_DETECTED', 'TAB_HIDDEN', 'TAB_SWITCH', 'PHONE_DETECTED', 'MULTIPLE_PEOPLE']
-        for event_type in high_risk_events:
+        for event_type in CLUSTER_EVENTS:
             if event_type in event_counts:
                 summary['high_risk_violations'][event_type] = event_counts[event_type]
 
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'risk_rules.json')
+
+
+class EventTypeRegistry:
+    """Interns event type names to small integer ids, shared process-wide"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lock = threading.Lock()
+
+    def id_of(self, event_type: str) -> int:
+        type_id = self._ids.get(event_type)
+        if type_id is None:
+            with self._lock:
+                type_id = self._ids.get(event_type)
+                if type_id is None:
+                    type_id = len(self._names)
+                    self._names.append(event_type)
+                    self._ids[event_type] = type_id
+        return type_id
+
+    def name_of(self, type_id: int) -> str:
+        return self._names[type_id]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+EVENT_TYPE_IDS = EventTypeRegistry()
+
+
+class ContextRule(NamedTuple):
+    """Step multiplier applied from an `extra` field: the first step whose threshold the value exceeds"""
+    field: str
+    default: float
+    absolute: bool
+    total: bool                             # Applied once to the sum over events instead of per event
+    steps: Tuple[Tuple[float, float], ...]  # (threshold, multiplier), checked in order
+
+    def value(self, extra: Dict) -> float:
+        return self.adjust(extra.get(self.field, self.default))
+
+    def adjust(self, value: float) -> float:
+        return abs(value) if self.absolute else value
+
+    def multiplier(self, value: float) -> float:
+        for threshold, multiplier in self.steps:
+            if value > threshold:
+                return multiplier
+        return 1.0
+
+
+class TypeRule(NamedTuple):
+    """Everything the scorer needs to know about one event type"""
+    weight: float
+    category: Optional[str]
+    criticality: Optional[str]
+    scored: bool
+    context: Optional[ContextRule]
+
+
+class CompiledRiskRules:
+    """
+    Risk rules compiled into a dense table indexed by interned event type id.
+    Types first seen after compilation are added on lookup with default rules.
+    """
+
+    def __init__(self, config: Dict[str, Any], source: str = '<memory>'):
+        self.version = config['version']
+        self.source = source
+        # Rules with the same version must have the same content: score caches key on the version
+        self.config = config
+        self.risk_weights: Dict[str, float] = dict(config['risk_weights'])
+        self.event_definitions: Dict[str, Dict[str, str]] = dict(config['event_definitions'])
+        self.risk_thresholds: Dict[str, float] = dict(config['risk_thresholds'])
+        self.violation_patterns: Dict[str, List[str]] = dict(config.get('violation_patterns', {}))
+
+        self.context_rules: Dict[str, ContextRule] = {}
+        for event_type, rule in config.get('context_rules', {}).items():
+            aggregate = rule.get('aggregate', 'per_event')
+            if aggregate not in ('per_event', 'total'):
+                raise ValueError(f"Unknown context aggregate for {event_type}: {aggregate}")
+            self.context_rules[event_type] = ContextRule(
+                field=rule['field'],
+                default=rule.get('default', 0),
+                absolute=bool(rule.get('absolute', False)),
+                total=aggregate == 'total',
+                steps=tuple((threshold, multiplier) for threshold, multiplier in rule['steps']),
+            )
+        self.context_event_types = tuple(self.context_rules)
+
+        for level in ('MEDIUM', 'HIGH', 'CRITICAL'):
+            if level not in self.risk_thresholds:
+                raise ValueError(f"Missing risk threshold: {level}")
+
+        # Dense per-type table; also compile every type named in the config up front
+        self._table: List[TypeRule] = []
+        self._table_lock = threading.Lock()
+        for event_type in (*self.risk_weights, *self.event_definitions, *self.context_rules):
+            EVENT_TYPE_IDS.id_of(event_type)
+        self._extend(len(EVENT_TYPE_IDS))
+
+    def _compile_type(self, event_type: str) -> TypeRule:
+        weight = self.risk_weights.get(event_type, 1.0)
+        definition = self.event_definitions.get(event_type, {})
+        criticality = definition.get('criticality')
+        return TypeRule(
+            weight=weight,
+            category=definition.get('category'),
+            criticality=criticality,
+            scored=not (weight == 0.0 or criticality == 'NONE'),
+            context=self.context_rules.get(event_type),
+        )
+
+    def _extend(self, size: int):
+        with self._table_lock:
+            table = self._table
+            while len(table) < size:
+                table.append(self._compile_type(EVENT_TYPE_IDS.name_of(len(table))))
+
+    def rule_by_id(self, type_id: int) -> TypeRule:
+        if type_id >= len(self._table):
+            self._extend(type_id + 1)
+        return self._table[type_id]
+
+    def rule_for(self, event_type: str) -> TypeRule:
+        return self.rule_by_id(EVENT_TYPE_IDS.id_of(event_type))
+
+
+def load_risk_rules(path: str) -> CompiledRiskRules:
+    """Load and compile a risk rules file"""
+    with open(path, 'r') as f:
+        config = json.load(f)
+    return CompiledRiskRules(config, source=path)
+
+
+class RiskRulesSource:
+    """
+    Serves the compiled rules for a file and recompiles them when the file
+    changes (checked at most every `check_interval` seconds). A file that
+    fails to load, or whose rules changed without a version bump, keeps the
+    previous rules in service.
+    """
+
+    def __init__(self, path: str = DEFAULT_RULES_PATH, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._mtime = os.stat(path).st_mtime_ns
+        self._rules = load_risk_rules(path)
+        self._last_check = time.monotonic()
+        self._lock = threading.Lock()
+        logger.info(f"Loaded risk rules version {self._rules.version} from {path}")
+
+    def current(self) -> CompiledRiskRules:
+        now = time.monotonic()
+        if now - self._last_check >= self.check_interval:
+            with self._lock:
+                if now - self._last_check >= self.check_interval:
+                    self._last_check = now
+                    self._reload_if_changed()
+        return self._rules
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            rules = load_risk_rules(self.path)
+        except Exception as e:
+            logger.error(f"Failed to reload risk rules from {self.path}, keeping version {self._rules.version}: {e}")
+            return
+
+        self._mtime = mtime
+        if rules.version == self._rules.version:
+            if rules.config != self._rules.config:
+                # Cached and incremental scores are keyed on the version; swapping
+                # the rules in would mix scores from both under one version
+                logger.error(
+                    f"Risk rules in {self.path} changed without a version bump, "
+                    f"keeping the rules loaded for version {rules.version}"
+                )
+            return
+        logger.info(f"Reloaded risk rules: version {self._rules.version} -> {rules.version}")
+        self._rules = rules
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Fields bound with log_context(), e.g. job_id / attempt_id / asset_id
+_log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar('log_context', default={})
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('current_span', default=None)
+
+# OTLP span status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach `fields` to every log record emitted in the enclosed block (and tasks started from it)"""
+    token = _log_context.set({**_log_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def current_span() -> Optional['Span']:
+    return _current_span.get()
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line, with the bound log context and the current trace and span ids"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **_log_context.get(),
+        }
+        span = current_span()
+        if span is not None:
+            entry['trace_id'] = span.trace_id
+            entry['span_id'] = span.span_id
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(json_format: bool, level: int = logging.INFO):
+    """Root logging setup: JSON lines, or the existing text format"""
+    if json_format:
+        handler = logging.StreamHandler()
+        formatter = JsonLogFormatter()
+        formatter.converter = time.gmtime
+        handler.setFormatter(formatter)
+        logging.basicConfig(level=level, handlers=[handler])
+    else:
+        logging.basicConfig(level=level, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class Span:
+    """A timed operation within a trace. Use Tracer.span() to create one."""
+
+    def __init__(self, name: str, trace_id: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status_code = STATUS_OK
+        self.status_message = ''
+        self.discarded = False
+
+    def set_attributes(self, **attributes):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def discard(self):
+        """Drop this span's trace instead of exporting it, e.g. a poll that claimed nothing"""
+        self.discarded = True
+
+    @property
+    def duration_seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in self.attributes.items()],
+            'status': {'code': self.status_code},
+        }
+        if self.parent is not None:
+            span['parentSpanId'] = self.parent.span_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        return span
+
+
+def otlp_traces_document(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """An OTLP/JSON ExportTraceServiceRequest holding `spans`"""
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]},
+            'scopeSpans': [{
+                'scope': {'name': 'proctor-worker'},
+                'spans': [span.to_otlp() for span in spans],
+            }],
+        }],
+    }
+
+
+class FileSpanExporter:
+    """
+    Appends each finished trace as one line of OTLP/JSON: the format of the
+    OpenTelemetry Collector file exporter, readable by its otlpjsonfile
+    receiver or with jq
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, document: Dict[str, Any]):
+        line = json.dumps(document, separators=(',', ':'))
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+class OtlpHttpSpanExporter:
+    """Posts each finished trace to an OTLP/HTTP collector with JSON encoding"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.timeout = timeout
+
+    def export(self, document: Dict[str, Any]):
+        response = requests.post(self.url, json=document, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class Tracer:
+    """
+    Nested timing spans for the worker's jobs. The current span follows the
+    context (contextvars), so spans opened in tasks started with a copied
+    context nest under the span that started them. A trace is exported
+    when its root span ends, unless discarded. Without exporters, spans
+    are still created so logs carry trace and span ids.
+    """
+
+    def __init__(self, service_name: str = 'proctor-worker'):
+        self.service_name = service_name
+        self.exporters: List[Any] = []
+        self._pending: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, exporters: List[Any], service_name: Optional[str] = None):
+        self.exporters = list(exporters)
+        if service_name:
+            self.service_name = service_name
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parent = current_span()
+        trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        span = Span(name, trace_id, parent, {k: v for k, v in attributes.items() if v is not None})
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status_code = STATUS_ERROR
+            span.status_message = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        with self._lock:
+            spans = self._pending.setdefault(span.trace_id, [])
+            spans.append(span)
+            if span.parent is not None:
+                return
+            del self._pending[span.trace_id]
+        if span.discarded or not self.exporters:
+            return
+        document = otlp_traces_document(spans, self.service_name)
+        for exporter in self.exporters:
+            try:
+                exporter.export(document)
+            except Exception as e:
+                logger.warning(f"Failed to export trace {span.trace_id} via {type(exporter).__name__}: {e}")
+
+
+TRACER = Tracer()
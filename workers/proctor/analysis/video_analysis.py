@@ -1,48 +1,122 @@
 import os
+import re
+import math
+import time
+import shutil
+import logging
+import functools
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import mediapipe as mp
 import numpy as np
 import ffmpeg
-import logging
-from typing import List, Dict, Tuple
-from ultralytics import YOLO
+from typing import List, Dict, Tuple, Optional
+
+from .event_batch import EventBatch
+from .checkpoints import AnalysisCheckpointer
+from .metrics import REGISTRY, FRAMES_PROCESSED, STAGE_SECONDS, stage_timer
+from .tracing import current_span
+from .errors import AnalysisIncomplete
+from .result_cache import configured_model_path
+from .cpu_budget import configure_native_threads, configured_cpu_budget
+from .media_probe import header_duration, probe_stream_end
+from .frame_features import (
+    ANALYSIS_FPS,
+    FrameEventThresholds,
+    FrameFeatures,
+    FrameFeatureWriter,
+    PERSON_CLASS_ID,
+    PHONE_CLASS_ID,
+    SliceStitcher,
+    derive_frame_events,
+)
 
 logger = logging.getLogger(__name__)
 
+# Frames decoded before a time slice starts, then dropped unanalyzed: covers
+# the first tick after an ffmpeg seek
+SLICE_SEEK_MARGIN_TICKS = 2
+# Extra frames decoded after a range ends, then dropped
+SLICE_TAIL_TICKS = 2
+# Frames decoded at a time past a slice's end while waiting for the face
+# tracker to reset (a frame without a face)
+SLICE_OVERRUN_TICKS = 60
+
+_FRAME_NUMBER = re.compile(r'(\d+)\.jpg$')
+
+
+def _frame_files(frames_dir: str) -> List[Tuple[int, str]]:
+    """(number, file name) of extracted frames, in numeric order"""
+    frames = []
+    for name in os.listdir(frames_dir):
+        match = _FRAME_NUMBER.search(name)
+        if match:
+            frames.append((int(match.group(1)), name))
+    frames.sort()
+    return frames
+
+
 class VideoAnalyzer:
     """Analyzes video for proctoring violations using computer vision"""
     
     def __init__(self):
         # Initialize MediaPipe Face Mesh for head pose detection
         self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
+        self.face_mesh = self._create_face_mesh()
+        
+        # Initialize YOLO for object detection. ultralytics imports torch, which
+        # takes seconds, so it is imported only when a model is built.
+        from ultralytics import YOLO
+        self.model_path = configured_model_path()
+        self.yolo_model = YOLO(self.model_path)
+        
+        # Phone detection class ID in COCO (cell phone = 67)
+        self.phone_class_id = PHONE_CLASS_ID
+        
+        # Frames analyzed per second of video
+        self.fps = ANALYSIS_FPS
+        
+        # Long recordings are split into time slices analyzed by separate
+        # processes when VIDEO_SLICE_WORKERS > 1
+        self.slice_workers = int(os.getenv('VIDEO_SLICE_WORKERS', '1'))
+        self.slice_seconds = float(os.getenv('VIDEO_SLICE_SECONDS', '300'))
+        self._slice_executor = None
+        
+        logger.info("VideoAnalyzer initialized")
+    
+    def _create_face_mesh(self):
+        return self.mp_face_mesh.FaceMesh(
             static_image_mode=False,
             max_num_faces=1,
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
-        
-        # Initialize YOLO for object detection
-        model_path = os.getenv('MODEL_PATH', 'yolov8n.pt')
-        self.yolo_model = YOLO(model_path)
-        
-        # Phone detection class ID in COCO (cell phone = 67)
-        self.phone_class_id = 67
-        
-        logger.info("VideoAnalyzer initialized")
+    
+    def warm_up(self, width: int = 640, height: int = 480):
+        """
+        Run both models once on a blank frame, so the first frame of the first
+        job does not pay for graph setup and allocator warm-up. Nothing is
+        recorded in the frame metrics.
+        """
+        image = np.full((height, width, 3), 128, dtype=np.uint8)
+        self.face_mesh.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        self.yolo_model(image, verbose=False)
     
     def extract_frames(self, video_path: str, frames_dir: str, fps: int = 2) -> bool:
         """Extract frames from video at specified FPS"""
         try:
-            (
-                ffmpeg
-                .input(video_path)
-                .filter('fps', fps=fps)
-                .output(f"{frames_dir}/frame_%04d.jpg")
-                .overwrite_output()
-                .run(quiet=True)
-            )
+            with stage_timer('extract'):
+                (
+                    ffmpeg
+                    .input(video_path)
+                    .filter('fps', fps=fps)
+                    .output(f"{frames_dir}/frame_%04d.jpg")
+                    .overwrite_output()
+                    .run(quiet=True)
+                )
             
             frame_count = len(os.listdir(frames_dir))
             logger.info(f"Extracted {frame_count} frames at {fps} FPS")
@@ -122,108 +196,308 @@ class VideoAnalyzer:
         
         return 0.0, 0.0, 0.0
     
-    def analyze_frame(self, frame_path: str, frame_number: int) -> List[Dict]:
-        """Analyze a single frame for violations"""
-        events = []
+    def extract_frame_features(self, frame_path: str, frame_number: int, features: FrameFeatureWriter):
+        """Run the face and object models on one frame and record its features"""
+        face_count = 0
+        pose = None
+        detections = []
         
         try:
             # Load frame
             image = cv2.imread(frame_path)
             if image is None:
-                return events
+                return
             
             rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             height, width = image.shape[:2]
             
             # Face detection and pose analysis
+            start = time.perf_counter()
             results = self.face_mesh.process(rgb_image)
             
             if results.multi_face_landmarks:
-                for face_landmarks in results.multi_face_landmarks:
-                    # Convert landmarks to pixel coordinates
-                    landmarks = []
-                    for landmark in face_landmarks.landmark:
-                        landmarks.append([
-                            int(landmark.x * width),
-                            int(landmark.y * height)
-                        ])
-                    
-                    # Calculate head pose
-                    pitch, yaw, roll = self.calculate_head_pose(landmarks)
-                    
-                    # Check for looking away (yaw > 30 degrees)
-                    if abs(yaw) > 30:
-                        events.append({
-                            'type': 'LOOK_AWAY',
-                            'timestamp': frame_number * 0.5,  # Assuming 2 FPS
-                            'extra': {
-                                'yaw': yaw,
-                                'pitch': pitch,
-                                'roll': roll,
-                                'frame_number': frame_number
-                            }
-                        })
-            
-            # Object detection with YOLO
+                face_count = len(results.multi_face_landmarks)
+                face_landmarks = results.multi_face_landmarks[0]  # max_num_faces=1
+                
+                # Convert landmarks to pixel coordinates
+                landmarks = []
+                for landmark in face_landmarks.landmark:
+                    landmarks.append([
+                        int(landmark.x * width),
+                        int(landmark.y * height)
+                    ])
+                
+                # Calculate head pose
+                pose = self.calculate_head_pose(landmarks)
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage='face')
+            
+            # Object detection with YOLO; keep person and phone boxes in output order
+            start = time.perf_counter()
             yolo_results = self.yolo_model(image, verbose=False)
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage='detect')
             
             for result in yolo_results:
                 boxes = result.boxes
                 if boxes is not None:
                     for box in boxes:
                         class_id = int(box.cls[0])
-                        confidence = float(box.conf[0])
-                        
-                        # Check for phone detection
-                        if class_id == self.phone_class_id and confidence > 0.5:
-                            events.append({
-                                'type': 'PHONE_DETECTED',
-                                'timestamp': frame_number * 0.5,
-                                'extra': {
-                                    'confidence': confidence,
-                                    'frame_number': frame_number,
-                                    'bbox': box.xyxy[0].tolist()
-                                }
-                            })
-                        
-                        # Check for multiple people (person class = 0)
-                        elif class_id == 0 and confidence > 0.5:
-                            # Count persons in frame
-                            person_count = sum(1 for b in boxes if int(b.cls[0]) == 0 and float(b.conf[0]) > 0.5)
-                            if person_count > 1:
-                                events.append({
-                                    'type': 'MULTIPLE_PEOPLE',
-                                    'timestamp': frame_number * 0.5,
-                                    'extra': {
-                                        'person_count': person_count,
-                                        'frame_number': frame_number
-                                    }
-                                })
-                                break  # Only report once per frame
+                        if class_id in (PERSON_CLASS_ID, self.phone_class_id):
+                            detections.append((class_id, float(box.conf[0]), box.xyxy[0].tolist()))
             
         except Exception as e:
             logger.error(f"Error analyzing frame {frame_path}: {e}")
         
-        return events
+        features.add_frame(frame_number, face_count, pose, detections)
+        FRAMES_PROCESSED.inc()
+    
+    def analyze_frame(self, frame_path: str, frame_number: int, events: Optional[EventBatch] = None,
+                      thresholds: FrameEventThresholds = FrameEventThresholds()) -> EventBatch:
+        """Analyze a single frame for violations, appending to `events` when given"""
+        features = FrameFeatureWriter(fps=self.fps)
+        self.extract_frame_features(frame_path, frame_number, features)
+        return derive_frame_events(features.build(), thresholds, events)
     
-    def analyze_video(self, video_path: str, frames_dir: str) -> List[Dict]:
-        """Main video analysis pipeline"""
+    def probe_timing(self, video_path: str) -> Optional[Tuple[float, float]]:
+        """(start time, duration) of a recording in seconds, or None when unknown"""
+        try:
+            probe = ffmpeg.probe(video_path)
+            start_time = float(probe.get('format', {}).get('start_time') or 0)
+            duration = header_duration(probe)
+            if duration is None:
+                # MediaRecorder webm files often carry no duration; their packets are still timed
+                end_time = probe_stream_end(video_path)
+                duration = end_time - start_time if end_time is not None else None
+        except Exception as e:
+            logger.warning(f"Could not probe {video_path} for time slicing: {e}")
+            return None
+        if duration is None:
+            return None
+        return start_time, duration
+    
+    def plan_slices(self, video_path: str, done_frames: int = 0) -> Optional[Tuple[int, List[Tuple[int, Optional[int]]]]]:
+        """
+        Split the frames after `done_frames` into time slices for parallel
+        analysis. Returns (tick of frame 1, [(first index, end index or None)]),
+        with frame index i at absolute tick origin + i of the fps grid, or
+        None when the recording should be analyzed serially.
+        """
+        if self.slice_workers <= 1:
+            return None
+        timing = self.probe_timing(video_path)
+        if timing is None:
+            return None
+        start_time, duration = timing
+        
+        origin_tick = round(start_time * self.fps)
+        total_frames = math.ceil(duration * self.fps)
+        slice_frames = max(1, int(self.slice_seconds * self.fps))
+        starts = list(range(done_frames, total_frames, slice_frames))
+        if len(starts) < 2:
+            return None
+        # The last slice runs to the end of the recording, whatever its real length
+        ends = starts[1:] + [None]
+        return origin_tick, list(zip(starts, ends))
+    
+    def _reset_face_tracking(self):
+        """Start the next frame from face detection, as at the start of a recording"""
+        self.face_mesh.close()
+        self.face_mesh = self._create_face_mesh()
+    
+    def extract_frame_range(self, video_path: str, frames_dir: str, first_tick: int, stop_tick: Optional[int]):
+        """
+        Extract frames at absolute fps-grid ticks [first_tick, stop_tick) with
+        an input seek. Files are named by tick, and original timestamps are
+        kept, so the grid matches that of a full extract_frames run.
+        """
+        input_args = {'ss': first_tick / self.fps}
+        if stop_tick is not None:
+            input_args['t'] = (stop_tick - first_tick) / self.fps
+        with stage_timer('extract'):
+            (
+                ffmpeg
+                .input(video_path, **input_args)
+                .filter('fps', fps=self.fps)
+                .output(f"{frames_dir}/frame_%08d.jpg", frame_pts=1)
+                .global_args('-copyts')
+                .overwrite_output()
+                .run(quiet=True)
+            )
+    
+    def analyze_frame_range(self, video_path: str, origin_tick: int, start: int, end: Optional[int]) -> FrameFeatures:
+        """
+        Features of frame indexes from `start` (frame numbers start + 1 ...),
+        starting from a fresh face tracker. Analysis continues past `end`
+        until a frame without a face, or the end of the recording: the
+        tracker starts over after such a frame, so any run that also reaches
+        it agrees from there on (see slice_stitch_frame).
+        """
+        self._reset_face_tracking()
+        features = FrameFeatureWriter(fps=self.fps)
+        first = start
+        while True:
+            stop = None if end is None else max(end, first) + SLICE_OVERRUN_TICKS
+            seek = max(0, first - SLICE_SEEK_MARGIN_TICKS)
+            frames_dir = tempfile.mkdtemp(prefix='proctor_slice_')
+            try:
+                self.extract_frame_range(
+                    video_path, frames_dir, origin_tick + seek,
+                    None if stop is None else origin_tick + stop + SLICE_TAIL_TICKS,
+                )
+                reached_stop = False
+                for tick, frame_file in _frame_files(frames_dir):
+                    index = tick - origin_tick
+                    if index < first:
+                        continue
+                    if stop is not None and index >= stop:
+                        reached_stop = True
+                        break
+                    self.extract_frame_features(os.path.join(frames_dir, frame_file), index + 1, features)
+                    if end is not None and index >= end - 1 and features.last_face_count == 0:
+                        return features.build()
+            finally:
+                shutil.rmtree(frames_dir, ignore_errors=True)
+            if not reached_stop:
+                # The end of the recording
+                return features.build()
+            first = stop
+    
+    def _get_slice_executor(self) -> ProcessPoolExecutor:
+        # Spawned, not forked: the parent holds model and thread-pool state.
+        # Each process loads its own models once and keeps them across jobs.
+        if self._slice_executor is None:
+            self._slice_executor = ProcessPoolExecutor(
+                max_workers=self.slice_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_slice_worker,
+            )
+        return self._slice_executor
+    
+    def _analyze_slices(self, video_path: str, origin_tick: int, slices: List[Tuple[int, Optional[int]]],
+                        features: FrameFeatureWriter, features_metadata: Optional[Dict[str, str]],
+                        checkpoint: Optional[AnalysisCheckpointer]):
+        """
+        Analyze slices in parallel, appending their features to `features` in
+        order, with the features of a serial run (see SliceStitcher). A slice
+        that cannot be stitched on is analyzed again here.
+        """
+        executor = self._get_slice_executor()
+        futures = [
+            executor.submit(_analyze_slice, video_path, origin_tick, start, end)
+            for start, end in slices
+        ]
+        stitcher = SliceStitcher(features)
+        try:
+            for (start, end), future in zip(slices, futures):
+                slice_features, slice_metrics = future.result()
+                REGISTRY.merge(slice_metrics)
+                reanalyze = functools.partial(self.analyze_frame_range, video_path, origin_tick, end=end)
+                if not stitcher.add(slice_features, reanalyze):
+                    logger.info(f"No face tracker reset shared with the slice at frame {start + 1}; re-analyzed it")
+                if checkpoint and checkpoint.due('video'):
+                    checkpoint.save('video', features.build(features_metadata).to_bytes())
+            stitcher.finish()
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    def close(self):
+        if self._slice_executor is not None:
+            self._slice_executor.shutdown(wait=False, cancel_futures=True)
+            self._slice_executor = None
+    
+    def analyze_video(self, video_path: str, frames_dir: str, features_path: Optional[str] = None,
+                      features_metadata: Optional[Dict[str, str]] = None,
+                      checkpoint: Optional[AnalysisCheckpointer] = None) -> EventBatch:
+        """
+        Main video analysis pipeline. With `features_path`, the per-frame
+        features (tagged with `features_metadata`) are also saved there so
+        events can be re-derived later. With `checkpoint`, the features
+        collected so far are saved periodically and a retried job resumes
+        after the last checkpointed frame.
+        
+        Long recordings are analyzed as parallel time slices when
+        VIDEO_SLICE_WORKERS > 1, with the same features and events as in
+        serial mode.
+        
+        Raises AnalysisIncomplete when no frames can be extracted.
+        """
         logger.info(f"Starting video analysis: {video_path}")
+        # Per-frame model time is too fine-grained for spans; it is summed
+        # onto the enclosing span instead
+        frames_before = FRAMES_PROCESSED.value()
+        face_before = STAGE_SECONDS.total(stage='face')
+        detect_before = STAGE_SECONDS.total(stage='detect')
         
-        all_events = []
+        features = FrameFeatureWriter(fps=self.fps)
+        saved = checkpoint.load('video') if checkpoint else None
+        if saved is not None:
+            features = FrameFeatureWriter.from_features(FrameFeatures.from_bytes(saved))
+            logger.info(f"Resuming video analysis after frame {features.last_frame_number}")
         
-        # Extract frames
-        if not self.extract_frames(video_path, frames_dir):
-            logger.error("Failed to extract frames")
-            return all_events
+        plan = self.plan_slices(video_path, features.last_frame_number)
+        if plan is not None:
+            origin_tick, slices = plan
+            logger.info(f"Analyzing video in {len(slices)} time slices on {self.slice_workers} processes")
+            try:
+                self._analyze_slices(video_path, origin_tick, slices, features, features_metadata, checkpoint)
+            except Exception as e:
+                # Completed slices are kept; the rest is analyzed serially
+                logger.error(f"Sliced video analysis failed after frame {features.last_frame_number}: {e}")
+                plan = None
         
-        # Analyze each frame
-        frame_files = sorted([f for f in os.listdir(frames_dir) if f.endswith('.jpg')])
+        if plan is None:
+            # Extract frames
+            if not self.extract_frames(video_path, frames_dir, fps=self.fps):
+                raise AnalysisIncomplete("Failed to extract frames")
+            
+            # Analyze each frame (numeric order: names outgrow the zero padding)
+            frame_files = [name for _, name in _frame_files(frames_dir)]
+            if not frame_files:
+                raise AnalysisIncomplete("No frames extracted")
+            
+            # Every job, and every resumed one, starts from face detection
+            self._reset_face_tracking()
+            for i, frame_file in enumerate(frame_files):
+                if i + 1 <= features.last_frame_number:
+                    continue
+                frame_path = os.path.join(frames_dir, frame_file)
+                self.extract_frame_features(frame_path, i + 1, features)
+                if checkpoint and checkpoint.due('video'):
+                    checkpoint.save('video', features.build(features_metadata).to_bytes())
         
-        for i, frame_file in enumerate(frame_files):
-            frame_path = os.path.join(frames_dir, frame_file)
-            frame_events = self.analyze_frame(frame_path, i + 1)
-            all_events.extend(frame_events)
+        frame_features = features.build(features_metadata)
+        if features_path:
+            try:
+                frame_features.save(features_path)
+            except Exception as e:
+                logger.warning(f"Failed to save frame features to {features_path}: {e}")
         
+        all_events = derive_frame_events(frame_features)
         logger.info(f"Video analysis complete. Found {len(all_events)} events")
-        return all_events 
\ No newline at end of file
+        span = current_span()
+        if span is not None:
+            span.set_attributes(
+                frames_processed=int(FRAMES_PROCESSED.value() - frames_before),
+                face_seconds=round(STAGE_SECONDS.total(stage='face') - face_before, 3),
+                detect_seconds=round(STAGE_SECONDS.total(stage='detect') - detect_before, 3),
+            )
+        return all_events
+
+
+# Time-slice worker processes
+
+_slice_analyzer: Optional[VideoAnalyzer] = None
+
+
+def _init_slice_worker():
+    global _slice_analyzer
+    _slice_analyzer = VideoAnalyzer()
+    # Slice processes run side by side, so each gets an equal share of the
+    # worker's CPU budget; pinning and BLAS sizing come from the parent
+    configure_native_threads(configured_cpu_budget().share(_slice_analyzer.slice_workers))
+
+
+def _analyze_slice(video_path: str, origin_tick: int, start: int, end: Optional[int]):
+    """The slice's features, plus the metrics recorded for it in this process"""
+    features = _slice_analyzer.analyze_frame_range(video_path, origin_tick, start, end)
+    return features, REGISTRY.drain()
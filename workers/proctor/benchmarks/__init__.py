@@ -0,0 +1,22 @@
+"""
+Performance benchmarks for the proctoring worker.
+
+Synthetic recordings are generated offline with ffmpeg (see corpus.py), the
+analyzers and the risk calculator are timed against them, and the results
+are written to a JSON file that later runs compare against:
+
+    python -m benchmarks.run --output baseline.json
+    python -m benchmarks.run --baseline baseline.json
+
+The risk calculators also have a scaling benchmark (scaling.py) and golden
+outputs that every scoring path must reproduce exactly (golden.py):
+
+    python -m benchmarks.scaling --max-events 1000000
+    python -m benchmarks.golden [--update]
+
+End-to-end queue throughput is measured by running worker processes against
+a disposable local Postgres database and, optionally, a fake internal queue
+API (load.py, local_db.py, fake_queue.py):
+
+    python -m benchmarks.load --queue api --workers 4 --jobs 200
+"""
@@ -0,0 +1,108 @@
+"""
+Synthetic recording corpus.
+
+Recordings are rendered from ffmpeg's lavfi test sources and encoded like
+browser MediaRecorder output (VP8 + Opus in webm), so no sample footage is
+needed and every machine benchmarks the same inputs. The scenes exercise
+decoding and model cost, not detection accuracy: the models see test
+patterns, not people.
+"""
+
+import os
+import logging
+from typing import List, NamedTuple
+import ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# Bump when the rendering below changes, so cached recordings are regenerated
+CORPUS_VERSION = 1
+
+
+class RecordingSpec(NamedTuple):
+    name: str
+    duration: int      # Seconds
+    width: int
+    height: int
+    scene: str         # 'static' | 'motion' | 'two_people'
+    audio: str         # 'silence' | 'tone' | 'noise' | 'tone_noise'
+
+    @property
+    def file_name(self) -> str:
+        return f"{self.name}.v{CORPUS_VERSION}.webm"
+
+
+DEFAULT_CORPUS: List[RecordingSpec] = [
+    RecordingSpec('static_60s_640x480', 60, 640, 480, 'static', 'silence'),
+    RecordingSpec('motion_120s_640x480', 120, 640, 480, 'motion', 'tone'),
+    RecordingSpec('two_people_120s_1280x720', 120, 1280, 720, 'two_people', 'noise'),
+    RecordingSpec('motion_600s_640x480', 600, 640, 480, 'motion', 'tone_noise'),
+]
+
+# Same scenes, short enough for a smoke run
+QUICK_CORPUS: List[RecordingSpec] = [
+    RecordingSpec('static_10s_320x240', 10, 320, 240, 'static', 'silence'),
+    RecordingSpec('motion_10s_320x240', 10, 320, 240, 'motion', 'tone'),
+    RecordingSpec('two_people_10s_640x480', 10, 640, 480, 'two_people', 'noise'),
+]
+
+FRAME_RATE = 30
+SAMPLE_RATE = 48000
+
+
+def _video_source(spec: RecordingSpec):
+    size = f"{spec.width}x{spec.height}"
+    if spec.scene == 'static':
+        return ffmpeg.input(f"color=c=0x808080:s={size}:d={spec.duration}:r={FRAME_RATE}", f='lavfi')
+    video = ffmpeg.input(f"testsrc2=s={size}:d={spec.duration}:r={FRAME_RATE}", f='lavfi')
+    if spec.scene == 'two_people':
+        # Two head-and-shoulders sized blocks in the frame
+        for x in (0.15, 0.6):
+            video = video.drawbox(
+                x=int(spec.width * x), y=int(spec.height * 0.25),
+                width=int(spec.width * 0.25), height=int(spec.height * 0.75),
+                color='0xE0B090', thickness='fill',
+            )
+    return video
+
+
+def _audio_source(spec: RecordingSpec):
+    duration = spec.duration
+    tone = f"sine=frequency=220:sample_rate={SAMPLE_RATE}:duration={duration}"
+    noise = f"anoisesrc=color=pink:amplitude=0.2:seed=1:sample_rate={SAMPLE_RATE}:duration={duration}"
+    if spec.audio == 'silence':
+        return ffmpeg.input(f"anullsrc=r={SAMPLE_RATE}:cl=mono", f='lavfi', t=duration)
+    if spec.audio == 'tone':
+        return ffmpeg.input(tone, f='lavfi')
+    if spec.audio == 'noise':
+        return ffmpeg.input(noise, f='lavfi')
+    return ffmpeg.filter([ffmpeg.input(tone, f='lavfi'), ffmpeg.input(noise, f='lavfi')], 'amix', inputs=2)
+
+
+def render_recording(spec: RecordingSpec, path: str):
+    """Encode `spec` to `path` as VP8/Opus webm"""
+    temp_path = path + '.tmp.webm'
+    (
+        ffmpeg
+        .output(
+            _video_source(spec), _audio_source(spec), temp_path,
+            vcodec='libvpx', acodec='libopus', deadline='realtime', **{'cpu-used': 8, 'b:v': '1M'},
+            t=spec.duration,
+        )
+        .overwrite_output()
+        .run(quiet=True)
+    )
+    os.replace(temp_path, path)
+
+
+def ensure_corpus(specs: List[RecordingSpec], directory: str) -> List[str]:
+    """Paths of the corpus recordings, rendering any that are not cached in `directory`"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for spec in specs:
+        path = os.path.join(directory, spec.file_name)
+        if not os.path.exists(path):
+            logger.info(f"Rendering {spec.name} ({spec.duration}s {spec.width}x{spec.height})")
+            render_recording(spec, path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,82 @@
+"""
+Synthetic proctoring event streams with a realistic type mix and timing.
+
+Browser focus events dominate real attempts and arrive in bursts (a tab
+switch brings TAB_HIDDEN, WINDOW_BLUR and MOUSE_LEFT_WINDOW within a
+second or two); analysis events are spread over the recording. Streams
+are deterministic for a given seed.
+"""
+
+import random
+from typing import Dict, List, Optional, Any, Tuple
+
+from analysis.event_batch import EventBatch
+
+# (event type, relative frequency)
+EVENT_MIX: List[Tuple[str, float]] = [
+    ('TAB_HIDDEN', 14), ('WINDOW_BLUR', 16), ('TAB_SWITCH', 8), ('MOUSE_LEFT_WINDOW', 12),
+    ('NEW_TAB_OPENED', 2), ('COPY_DETECTED', 4), ('PASTE_DETECTED', 2), ('SELECT_ALL_DETECTED', 1),
+    ('CONTEXT_MENU_DETECTED', 2), ('KEYBOARD_SHORTCUT', 3), ('CTRL_C', 3), ('CTRL_V', 2),
+    ('CTRL_TAB', 1), ('ALT_TAB', 2), ('DEVTOOLS_SHORTCUT', 0.3), ('F12_PRESSED', 0.2),
+    ('INACTIVITY_DETECTED', 1),
+    ('LOOK_AWAY', 12), ('PHONE_DETECTED', 2), ('MULTIPLE_PEOPLE', 1.5), ('EYES_NOT_ON_SCREEN', 1),
+    ('SUSPICIOUS_SILENCE', 4), ('POSSIBLE_SPEAKER_CHANGE', 3), ('MULTIPLE_SPEAKERS_DETECTED', 1),
+    ('BACKGROUND_NOISE', 5),
+]
+
+# Types that follow one another within a burst
+BURST_FOLLOWERS = {
+    'TAB_HIDDEN': ['WINDOW_BLUR', 'TAB_SWITCH'],
+    'WINDOW_BLUR': ['MOUSE_LEFT_WINDOW', 'TAB_HIDDEN'],
+    'COPY_DETECTED': ['TAB_HIDDEN', 'TAB_SWITCH'],
+    'NEW_TAB_OPENED': ['CTRL_TAB', 'TAB_SWITCH'],
+    'MULTIPLE_PEOPLE': ['MULTIPLE_SPEAKERS_DETECTED'],
+}
+
+
+def _extra(event_type: str, rng: random.Random, frame_seconds: float) -> Optional[Dict[str, Any]]:
+    if event_type == 'LOOK_AWAY':
+        return {'yaw': rng.uniform(30, 90) * rng.choice((-1, 1)), 'pitch': rng.uniform(-20, 20),
+                'roll': rng.uniform(-10, 10), 'frame_number': int(frame_seconds * 2)}
+    if event_type == 'PHONE_DETECTED':
+        return {'confidence': rng.uniform(0.5, 0.95), 'frame_number': int(frame_seconds * 2)}
+    if event_type == 'MULTIPLE_PEOPLE':
+        return {'person_count': rng.choice((2, 2, 2, 3)), 'frame_number': int(frame_seconds * 2)}
+    if event_type == 'TAB_HIDDEN':
+        return {'duration_seconds': rng.expovariate(1 / 12)}
+    if event_type == 'COPY_DETECTED':
+        return {'text_length': int(rng.expovariate(1 / 60))}
+    if event_type == 'INACTIVITY_DETECTED':
+        return {'inactiveSeconds': int(60 + rng.expovariate(1 / 180))}
+    if event_type == 'BACKGROUND_NOISE':
+        return {'duration_seconds': rng.uniform(1, 10)}
+    return None
+
+
+def synthetic_events(count: int, duration_seconds: float = 3600.0, seed: int = 0,
+                     start: float = 1_700_000_000.0) -> EventBatch:
+    """
+    `count` events over `duration_seconds` from `start` (epoch seconds), in
+    timestamp order. About 60% arrive in bursts started by a burst leader.
+    """
+    rng = random.Random(seed)
+    types = [event_type for event_type, _ in EVENT_MIX]
+    weights = [weight for _, weight in EVENT_MIX]
+
+    rows = []
+    while len(rows) < count:
+        timestamp = rng.uniform(0, duration_seconds)
+        event_type = rng.choices(types, weights)[0]
+        rows.append((timestamp, event_type))
+        followers = BURST_FOLLOWERS.get(event_type)
+        while followers and len(rows) < count and rng.random() < 0.6:
+            timestamp = min(duration_seconds, timestamp + rng.expovariate(1.0))
+            event_type = rng.choice(followers)
+            rows.append((timestamp, event_type))
+            followers = BURST_FOLLOWERS.get(event_type)
+    rows.sort(key=lambda row: row[0])
+
+    events = EventBatch()
+    for timestamp, event_type in rows:
+        events.append(event_type, start + timestamp, _extra(event_type, rng, timestamp))
+    return events
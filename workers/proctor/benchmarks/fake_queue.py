@@ -0,0 +1,257 @@
+"""
+In-memory stand-in for the Next.js internal queue API.
+
+FakeQueueServer answers POST /api/internal/queue/claim|complete|fail|
+heartbeat|release like the routes in src/app/api/internal/queue, checking
+the x-worker-token header, so ProctorWorker can run against it with
+WORKER_API_URL and WORKER_API_TOKEN set and no app or pg-boss behind it.
+Claims follow the pg-boss fetch order of src/lib/queue.ts (jobs past the
+wait limit first, then by asset size per preference, then oldest). Jobs
+keep claim and completion times for latency reporting. Lease expiry is
+not simulated.
+"""
+
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+PROCTOR_ANALYSIS_JOB_NAME = 'proctor.analyse'
+PROCTOR_ANALYSIS_JOB_SCHEMA_VERSION = 1
+MAX_LEASE_SECONDS = 60 * 60
+
+
+class FakeJob:
+    def __init__(self, data: Dict[str, Any], size_bytes: Optional[int] = None, retry_limit: int = 0):
+        self.id = str(uuid.uuid4())
+        self.name = PROCTOR_ANALYSIS_JOB_NAME
+        self.data = data
+        self.size_bytes = size_bytes
+        self.state = 'created'
+        self.retry_count = 0   # Claims so far
+        self.retry_limit = retry_limit
+        self.output: Optional[Dict[str, Any]] = None
+        self.created_on = time.time()
+        self.started_on: Optional[float] = None
+        self.completed_on: Optional[float] = None
+        self.lease_until: Optional[float] = None
+
+
+class FakeQueue:
+    """Thread-safe job store with the claim, complete, fail, release and lease operations of src/lib/queue.ts"""
+
+    def __init__(self, default_lease_seconds: int = 60 * 60):
+        self.default_lease_seconds = default_lease_seconds
+        self._jobs: Dict[str, FakeJob] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def enqueue(self, data: Dict[str, Any], size_bytes: Optional[int] = None, retry_limit: int = 0) -> str:
+        job = FakeJob(data, size_bytes, retry_limit)
+        with self._lock:
+            self._jobs[job.id] = job
+        return job.id
+
+    def claim(self, size_preference: str = 'fifo', min_bytes: Optional[int] = None,
+              max_bytes: Optional[int] = None, max_wait_seconds: int = 1800) -> Optional[FakeJob]:
+        now = time.time()
+
+        def order(job: FakeJob):
+            aged = job.created_on < now - max_wait_seconds
+            if size_preference == 'small':
+                size_key = (job.size_bytes is not None, job.size_bytes or 0)
+            elif size_preference == 'large':
+                size_key = (job.size_bytes is not None, -(job.size_bytes or 0))
+            else:
+                size_key = (False, 0)
+            return not aged, size_key, job.created_on
+
+        with self._lock:
+            candidates = [
+                job for job in self._jobs.values()
+                if job.state in ('created', 'retry')
+                and (min_bytes is None or (job.size_bytes or 0) >= min_bytes)
+                and (max_bytes is None or (job.size_bytes or 0) <= max_bytes)
+            ]
+            if not candidates:
+                return None
+            job = min(candidates, key=order)
+            job.state = 'active'
+            job.started_on = now
+            job.lease_until = now + self.default_lease_seconds
+            job.retry_count += 1
+            return job
+
+    def _finish(self, job_id: str, state: str, output: Optional[Dict[str, Any]]) -> bool:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != 'active':
+                return False
+            job.state = state
+            job.output = output
+            job.completed_on = time.time()
+            self._changed.notify_all()
+            return True
+
+    def complete(self, job_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+        return self._finish(job_id, 'completed', result)
+
+    def fail(self, job_id: str, error: Optional[Dict[str, Any]] = None, retry: bool = True) -> bool:
+        """Fail an active job; like pg-boss, it is retried until its retry limit unless `retry` is False"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            retries_left = job is not None and job.retry_count <= job.retry_limit
+        return self._finish(job_id, 'retry' if retry and retries_left else 'failed', error)
+
+    def release(self, job_id: str) -> bool:
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != 'active':
+                return False
+            job.state = 'created'
+            job.started_on = None
+            job.lease_until = None
+            job.retry_count = max(job.retry_count - 1, 0)
+            self._changed.notify_all()
+            return True
+
+    def extend_leases(self, job_ids: List[str], lease_seconds: int) -> int:
+        now = time.time()
+        extended = 0
+        with self._lock:
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if job is not None and job.state == 'active':
+                    job.lease_until = max(job.lease_until, now + lease_seconds)
+                    extended += 1
+        return extended
+
+    def jobs(self) -> List[FakeJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def unfinished(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.state in ('created', 'retry', 'active'))
+
+    def wait_until_done(self, timeout: Optional[float] = None) -> bool:
+        """Block until no job is queued or active; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while any(job.state in ('created', 'retry', 'active') for job in self._jobs.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining if remaining is None else min(remaining, 1.0))
+            return True
+
+
+class FakeQueueServer:
+    """
+    Serves a FakeQueue as the internal queue API from a daemon thread.
+    Port 0 picks a free port; `url` is what WORKER_API_URL should be.
+    """
+
+    def __init__(self, queue: FakeQueue, token: str, port: int = 0, host: str = '127.0.0.1'):
+        queue_ref, token_ref = queue, token
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, status: int, payload: Dict[str, Any]):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if self.headers.get('x-worker-token') != token_ref:
+                    return self._respond(401, {'error': 'Unauthorized'})
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {}
+                body = body if isinstance(body, dict) else {}
+
+                prefix = '/api/internal/queue/'
+                action = self.path[len(prefix):] if self.path.startswith(prefix) else None
+                if action == 'claim':
+                    return self._claim(body)
+                if action in ('complete', 'fail', 'release'):
+                    job_id = body.get('jobId')
+                    if not job_id:
+                        return self._respond(400, {'error': 'jobId is required'})
+                    if action == 'complete':
+                        result = body.get('result')
+                        if result is not None and not isinstance(result, dict):
+                            return self._respond(400, {'error': 'result must be an object if provided'})
+                        queue_ref.complete(job_id, result)
+                        return self._respond(200, {'success': True})
+                    if action == 'fail':
+                        retry = body.get('retry', True)
+                        if not isinstance(retry, bool):
+                            return self._respond(400, {'error': 'retry must be a boolean if provided'})
+                        queue_ref.fail(job_id, body.get('error'), retry)
+                        return self._respond(200, {'success': True})
+                    return self._respond(200, {'success': True, 'released': queue_ref.release(job_id)})
+                if action == 'heartbeat':
+                    job_ids, lease_seconds = body.get('jobIds'), body.get('leaseSeconds')
+                    if not isinstance(job_ids, list) or not job_ids or not all(isinstance(i, str) for i in job_ids):
+                        return self._respond(400, {'error': 'jobIds must be a non-empty array of strings'})
+                    if not isinstance(lease_seconds, (int, float)) or not 0 < lease_seconds <= MAX_LEASE_SECONDS:
+                        return self._respond(400, {'error': f"leaseSeconds must be between 1 and {MAX_LEASE_SECONDS}"})
+                    return self._respond(200, {'success': True, 'extended': queue_ref.extend_leases(job_ids, lease_seconds)})
+                return self._respond(404, {'error': 'not found'})
+
+            def _claim(self, body: Dict[str, Any]):
+                size_preference = body.get('sizePreference')
+                if size_preference is not None and size_preference not in ('fifo', 'small', 'large'):
+                    return self._respond(400, {'error': 'sizePreference must be fifo, small or large'})
+                for name in ('minBytes', 'maxBytes', 'maxWaitSeconds'):
+                    value = body.get(name)
+                    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                              or not math.isfinite(value) or value < 0):
+                        return self._respond(400, {'error': f"{name} must be a non-negative number"})
+                job = queue_ref.claim(
+                    size_preference or 'fifo', body.get('minBytes'), body.get('maxBytes'),
+                    body.get('maxWaitSeconds') or 1800,
+                )
+                if job is None:
+                    return self._respond(200, {'job': None})
+                if (job.data or {}).get('schemaVersion') != PROCTOR_ANALYSIS_JOB_SCHEMA_VERSION:
+                    queue_ref.fail(job.id, {'error': 'Unsupported job schema version',
+                                            'schemaVersion': (job.data or {}).get('schemaVersion')})
+                    return self._respond(422, {'job': None, 'error': 'Unsupported job schema version'})
+                return self._respond(200, {'job': {'id': job.id, 'name': job.name, 'data': job.data}})
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self._server.server_address[0]}:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-queue', daemon=True)
+        self._thread.start()
+        logger.info(f"Serving the fake internal queue API at {self.url}")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
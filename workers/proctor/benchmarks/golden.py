@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Golden outputs of the risk calculators.
+
+A fixed set of seeded synthetic streams is scored by LegacyRiskCalculator
+and ImprovedRiskCalculator and the results are committed as
+golden/risk_scores.json. Checking re-scores every stream with each scoring
+path (the calculator on dicts and on an EventBatch, BatchRiskScorer and
+IncrementalRiskScorer) and reports any leaf that is not bit-for-bit equal,
+so an optimized path can be verified against the recorded behaviour.
+
+Usage (from workers/proctor):
+    python -m benchmarks.golden            # check, exits 1 on a difference
+    python -m benchmarks.golden --update   # re-record after an intended change
+"""
+
+import os
+import sys
+import json
+import random
+import logging
+import argparse
+from typing import Callable, Dict, List, NamedTuple, Optional, Any
+
+from analysis.event_batch import EventBatch
+from analysis.risk_cache import event_fingerprint
+from analysis.risk_calculator import ImprovedRiskCalculator, LegacyRiskCalculator
+from analysis.batch_scoring import BatchRiskScorer, EventColumns
+from analysis.incremental_scoring import IncrementalRiskScorer
+from benchmarks.events import synthetic_events
+
+logger = logging.getLogger(__name__)
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), 'golden', 'risk_scores.json')
+GOLDEN_SCHEMA = 1
+
+
+class GoldenStream(NamedTuple):
+    name: str
+    count: int
+    duration_seconds: float
+    seed: int
+    test_duration_minutes: int
+    total_questions: int
+    shuffled: bool = False    # Arrival order differs from timestamp order
+
+    def events(self) -> List[Dict[str, Any]]:
+        events = synthetic_events(self.count, self.duration_seconds, seed=self.seed).to_dicts()
+        if self.shuffled:
+            random.Random(self.seed).shuffle(events)
+        return events
+
+
+GOLDEN_STREAMS: List[GoldenStream] = [
+    GoldenStream('empty', 0, 3600, 0, 60, 30),
+    GoldenStream('single', 1, 3600, 1, 60, 30),
+    GoldenStream('sparse_10', 10, 3600, 10, 60, 30),
+    GoldenStream('typical_100', 100, 3600, 100, 60, 30),
+    GoldenStream('short_test_100', 100, 600, 101, 10, 5),
+    GoldenStream('long_test_300', 300, 10800, 300, 180, 120),
+    GoldenStream('busy_1000', 1000, 3600, 1000, 60, 30),
+    GoldenStream('shuffled_1000', 1000, 3600, 1001, 60, 30, shuffled=True),
+    GoldenStream('dense_10000', 10000, 1800, 10000, 30, 20),
+]
+
+# Scoring paths that must reproduce the improved breakdown exactly
+ScoringPath = Callable[[ImprovedRiskCalculator, List[Dict[str, Any]], GoldenStream], Dict[str, Any]]
+
+
+def _calculator_dicts(calculator, events, stream):
+    return calculator.calculate_risk_score(events, stream.test_duration_minutes, stream.total_questions)
+
+
+def _calculator_batch(calculator, events, stream):
+    return calculator.calculate_risk_score(
+        EventBatch.from_dicts(events), stream.test_duration_minutes, stream.total_questions
+    )
+
+
+def _batch_scorer(calculator, events, stream):
+    columns = EventColumns.from_event_lists([stream.name], [events])
+    return BatchRiskScorer(calculator).score(columns, [stream.test_duration_minutes], [stream.total_questions])[0]
+
+
+def _incremental(calculator, events, stream):
+    # Arrives in chunks, as events are appended during an attempt
+    scorer = IncrementalRiskScorer(stream.test_duration_minutes, stream.total_questions, calculator)
+    for start in range(0, len(events), 97):
+        scorer.update(events[start:start + 97])
+    return scorer.breakdown()
+
+
+IMPROVED_PATHS: Dict[str, ScoringPath] = {
+    'calculator_dicts': _calculator_dicts,
+    'calculator_batch': _calculator_batch,
+    'batch_scorer': _batch_scorer,
+    'incremental': _incremental,
+}
+
+
+def _legacy(calculator: LegacyRiskCalculator, events: List[Dict[str, Any]], stream: GoldenStream) -> Dict[str, Any]:
+    return {
+        'score': calculator.calculate_risk_score(events, stream.test_duration_minutes),
+        'breakdown': calculator.get_score_breakdown(events),
+    }
+
+
+def quiet_legacy_logging():
+    """LegacyRiskCalculator logs five INFO lines per score; keep them out of benchmark output"""
+    logging.getLogger('analysis.risk_calculator').setLevel(logging.WARNING)
+
+
+def record_stream(stream: GoldenStream, calculator: Optional[ImprovedRiskCalculator] = None) -> Dict[str, Any]:
+    events = stream.events()
+    return {
+        'stream': stream._asdict(),
+        'fingerprint': event_fingerprint(events),
+        'improved': _calculator_dicts(calculator or ImprovedRiskCalculator(), events, stream),
+        'legacy': _legacy(LegacyRiskCalculator(), events, stream),
+    }
+
+
+def diff_outputs(expected: Any, actual: Any, path: str = '') -> List[str]:
+    """
+    Paths at which `actual` differs from `expected`. Leaves are compared by
+    type and repr, so 0 vs 0.0 and floats one ulp apart both count.
+    """
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        differences = []
+        for key in list(expected) + [key for key in actual if key not in expected]:
+            child = f"{path}.{key}" if path else str(key)
+            if key not in actual:
+                differences.append(f"{child}: missing")
+            elif key not in expected:
+                differences.append(f"{child}: unexpected {actual[key]!r}")
+            else:
+                differences.extend(diff_outputs(expected[key], actual[key], child))
+        return differences
+    if isinstance(expected, (list, tuple)) and isinstance(actual, (list, tuple)) and len(expected) == len(actual):
+        differences = []
+        for i, (old, new) in enumerate(zip(expected, actual)):
+            differences.extend(diff_outputs(old, new, f"{path}[{i}]"))
+        return differences
+    if type(expected) is not type(actual) or repr(expected) != repr(actual):
+        return [f"{path}: expected {expected!r}, got {actual!r}"]
+    return []
+
+
+def load_golden(path: str = GOLDEN_PATH) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_golden(path: str = GOLDEN_PATH, streams: List[GoldenStream] = GOLDEN_STREAMS):
+    calculator = ImprovedRiskCalculator()
+    golden = {
+        'schema': GOLDEN_SCHEMA,
+        'streams': {stream.name: record_stream(stream, calculator) for stream in streams},
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        # Floats are written with repr, so they load back bit-for-bit
+        json.dump(golden, f, indent=1, sort_keys=True)
+        f.write('\n')
+
+
+def check_stream(recorded: Dict[str, Any], calculator: Optional[ImprovedRiskCalculator] = None,
+                 paths: Optional[Dict[str, ScoringPath]] = None) -> List[str]:
+    """Differences between the recorded outputs of one stream and every scoring path now"""
+    calculator = calculator or ImprovedRiskCalculator()
+    stream = GoldenStream(**recorded['stream'])
+    events = stream.events()
+
+    fingerprint = event_fingerprint(events)
+    if fingerprint != recorded['fingerprint']:
+        # The generator changed, so nothing below would be comparable
+        return [f"{stream.name}: event stream changed (fingerprint {fingerprint} != {recorded['fingerprint']})"]
+
+    # Round-trip through JSON so tuples and floats compare as they were recorded
+    differences = []
+    for name, scoring_path in (paths or IMPROVED_PATHS).items():
+        actual = json.loads(json.dumps(scoring_path(calculator, events, stream)))
+        differences.extend(f"{stream.name}/{name}: {d}" for d in diff_outputs(recorded['improved'], actual))
+    actual = json.loads(json.dumps(_legacy(LegacyRiskCalculator(), events, stream)))
+    differences.extend(f"{stream.name}/legacy: {d}" for d in diff_outputs(recorded['legacy'], actual))
+    return differences
+
+
+def check_golden(path: str = GOLDEN_PATH, max_events: Optional[int] = None) -> List[str]:
+    golden = load_golden(path)
+    calculator = ImprovedRiskCalculator()
+    differences = []
+    for recorded in golden['streams'].values():
+        if max_events is not None and recorded['stream']['count'] > max_events:
+            continue
+        differences.extend(check_stream(recorded, calculator))
+    return differences
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check or record golden risk calculator outputs")
+    parser.add_argument('--update', action='store_true', help="Re-record the golden file")
+    parser.add_argument('--path', default=GOLDEN_PATH)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    quiet_legacy_logging()
+
+    if args.update:
+        write_golden(args.path)
+        logger.info(f"Recorded {len(GOLDEN_STREAMS)} streams to {args.path}")
+        return 0
+
+    differences = check_golden(args.path)
+    for difference in differences:
+        logger.error(difference)
+    if differences:
+        return 1
+    logger.info(f"All scoring paths match {args.path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Timing, memory and baseline comparison for the benchmarks.
+
+Each case runs a few warm-up rounds and then timed rounds, in the manner
+of pytest-benchmark, while a sampler thread tracks the peak resident set
+size of the process. Results are plain dicts so they serialize straight
+into the JSON baseline.
+"""
+
+import os
+import gc
+import time
+import platform
+import resource
+import statistics
+import threading
+import subprocess
+from typing import Callable, Dict, List, Optional, Any
+
+BASELINE_SCHEMA = 1
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process now (Linux), else its lifetime peak"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    """Peak resident set size of this process while the block runs, sampled every `interval` seconds"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stopped.is_set():
+            self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+            self._stopped.wait(self.interval)
+
+    def __enter__(self) -> 'RssSampler':
+        self.peak_bytes = current_rss_bytes()
+        self._thread = threading.Thread(target=self._sample, name='rss-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+
+
+def measure(fn: Callable[[], Any], rounds: int = 3, warmup: int = 1) -> Dict[str, Any]:
+    """
+    Time `fn` over `rounds` calls after `warmup` untimed ones. Returns the
+    timing statistics, the peak RSS over the timed rounds and the value of
+    the last call (under 'value', not serialized).
+    """
+    for _ in range(warmup):
+        fn()
+    gc.collect()
+    timings: List[float] = []
+    value = None
+    with RssSampler() as rss:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            value = fn()
+            timings.append(time.perf_counter() - start)
+    return {
+        'seconds': {
+            'rounds': rounds,
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.fmean(timings),
+            'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        },
+        'peak_rss_mb': round(rss.peak_bytes / 2 ** 20, 1),
+        'value': value,
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    """The q-th percentile (0-100) of `values`, interpolating linearly between ranks"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def environment() -> Dict[str, Any]:
+    """Where the numbers came from; results are only comparable on like hardware"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                        tolerance: float = 0.10) -> List[str]:
+    """
+    Regressions of `results` against `baseline` beyond `tolerance`: a
+    throughput (any *_per_second field) lower, or else a median time
+    higher, by more than that fraction. Cases missing from either side
+    are skipped.
+    """
+    regressions = []
+    for case, result in sorted(results.items()):
+        previous = baseline.get(case)
+        if previous is None:
+            continue
+        rates = [key for key in result.get('throughput', {}) if key in previous.get('throughput', {})]
+        for key in rates:
+            old, new = previous['throughput'][key], result['throughput'][key]
+            if old > 0 and new < old * (1 - tolerance):
+                regressions.append(f"{case}: {key} {new:.4g} vs baseline {old:.4g} ({new / old - 1:+.1%})")
+        if not rates:
+            old, new = previous['seconds']['median'], result['seconds']['median']
+            if old > 0 and new > old * (1 + tolerance):
+                regressions.append(f"{case}: median {new:.4g}s vs baseline {old:.4g}s ({new / old - 1:+.1%})")
+    return regressions
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Queue Load Driver
+
+Seeds a disposable local database with synthetic attempts and assets,
+queues one analysis job per asset, runs N ProctorWorker processes until
+the queue drains, and reports jobs per minute and per-job latency
+percentiles (queued -> done, and claimed -> done).
+
+Jobs are claimed from pgboss.job directly (--queue db) or through the fake
+internal queue API (--queue api). With --analysis simulated (the default)
+the assets are random bytes and each job sleeps --analysis-seconds in
+place of the analyzers, so the run measures the queue, download, event,
+scoring and persistence paths; --analysis real renders the quick corpus
+and runs the real analyzers on it.
+
+Usage (from workers/proctor, with a local Postgres 13+):
+    LOADTEST_DATABASE_URL=postgresql://postgres@localhost:5432/postgres \\
+    python -m benchmarks.load [--queue db|api] [--workers 4] [--jobs 200]
+                              [--analysis simulated|real] [--analysis-seconds 0.5]
+                              [--asset-kb 512] [--browser-events 200]
+                              [--async-pipeline [--prefetch-jobs 1]]
+                              [--output load.json] [--baseline load.json]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from typing import Dict, List, Optional, Any
+
+from benchmarks.corpus import QUICK_CORPUS, ensure_corpus
+from benchmarks.fake_queue import FakeQueue, FakeQueueServer
+from benchmarks.harness import BASELINE_SCHEMA, compare_to_baseline, environment, percentile
+from benchmarks.local_db import DisposableDatabase, admin_dsn_from_env, corpus_assets, synthetic_assets
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(__file__), '.corpus')
+
+
+def _simulated_worker_class(analysis_seconds: float):
+    """ProctorWorker with the analyzers replaced by a fixed delay and synthetic analysis events"""
+    from worker import ANALYSIS_EVENT_TYPES, ProctorWorker
+    from benchmarks.events import synthetic_events
+
+    class SimulatedAnalysisWorker(ProctorWorker):
+        def preflight_media(self, asset_id, video_path):
+            # Synthetic assets are random bytes, not media
+            pass
+
+        def run_analyzers(self, video_path, frames_dir, audio_path, features_path=None,
+                          features_metadata=None, checkpoint=None):
+            time.sleep(analysis_seconds)
+            events = synthetic_events(100, duration_seconds=3600, seed=os.path.getsize(video_path), start=0.0)
+            rows = [row for row in range(len(events)) if events.type_name(row) in ANALYSIS_EVENT_TYPES]
+            return events.take(rows), True
+
+    return SimulatedAnalysisWorker
+
+
+def _run_worker(db_params: Dict[str, Any], environ: Dict[str, str], simulated_seconds: Optional[float], stop):
+    """Worker process entry point: run one ProctorWorker until `stop` is set"""
+    os.environ.update(environ)
+    if simulated_seconds is None:
+        from worker import ProctorWorker as worker_class
+    else:
+        worker_class = _simulated_worker_class(simulated_seconds)
+
+    worker = worker_class(db_params)
+
+    def watch_stop():
+        stop.wait()
+        worker.shutdown_requested.set()
+
+    threading.Thread(target=watch_stop, name='load-stop', daemon=True).start()
+    worker.run()
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, Any]:
+    if not seconds:
+        return {'count': 0}
+    return {
+        'count': len(seconds),
+        'p50': percentile(seconds, 50),
+        'p90': percentile(seconds, 90),
+        'p99': percentile(seconds, 99),
+        'max': max(seconds),
+    }
+
+
+def summarize_jobs(jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Throughput and latency from per-job state and created/started/completed times (epoch seconds)"""
+    done = [job for job in jobs if job['completed_on'] is not None]
+    states: Dict[str, int] = {}
+    for job in jobs:
+        states[job['state']] = states.get(job['state'], 0) + 1
+    if not done:
+        return {'jobs': len(jobs), 'states': states}
+
+    first_start = min(job['started_on'] for job in done if job['started_on'] is not None)
+    wall_seconds = max(job['completed_on'] for job in done) - first_start
+    return {
+        'jobs': len(jobs),
+        'states': states,
+        'wall_seconds': wall_seconds,
+        'jobs_per_minute': len(done) / wall_seconds * 60 if wall_seconds > 0 else None,
+        'end_to_end_seconds': latency_summary([job['completed_on'] - job['created_on'] for job in done]),
+        'processing_seconds': latency_summary([
+            job['completed_on'] - job['started_on'] for job in done if job['started_on'] is not None
+        ]),
+    }
+
+
+def fake_queue_times(queue: FakeQueue) -> List[Dict[str, Any]]:
+    return [
+        {'id': job.id, 'state': job.state, 'created_on': job.created_on,
+         'started_on': job.started_on, 'completed_on': job.completed_on}
+        for job in queue.jobs()
+    ]
+
+
+def run_load(args) -> Dict[str, Any]:
+    simulated = args.analysis == 'simulated'
+    if simulated:
+        assets = synthetic_assets(args.jobs, args.asset_kb * 1024, seed=args.seed)
+    else:
+        assets = corpus_assets(args.jobs, ensure_corpus(QUICK_CORPUS, args.corpus_dir))
+
+    with DisposableDatabase(admin_dsn_from_env()) as database, \
+            tempfile.TemporaryDirectory(prefix='proctor_load_') as temp_dir:
+        seeded = database.seed(assets, browser_events=args.browser_events, seed=args.seed)
+
+        queue = server = None
+        environ = {
+            'METRICS_PORT': '0',
+            'ANALYSIS_CACHE': '1' if args.analysis_cache else '0',
+            # Simulated jobs never touch the analyzers, so their models are not loaded
+            'ANALYZER_WARMUP': '0' if simulated else '1',
+            'CHECKPOINT_DIR': os.path.join(temp_dir, 'checkpoints'),
+            'LOG_FORMAT': 'text',
+            'ASYNC_PIPELINE': '1' if args.async_pipeline else '0',
+            'PREFETCH_JOBS': str(args.prefetch_jobs),
+        }
+        if args.queue == 'api':
+            queue = FakeQueue()
+            server = FakeQueueServer(queue, token='load-test-token')
+            server.start()
+            environ.update({'WORKER_API_URL': server.url, 'WORKER_API_TOKEN': 'load-test-token'})
+        else:
+            environ.update({'WORKER_API_URL': '', 'WORKER_API_TOKEN': ''})
+
+        context = multiprocessing.get_context('spawn')
+        stop = context.Event()
+        processes = [
+            context.Process(
+                target=_run_worker, name=f"load-worker-{i}",
+                args=(database.params, environ, args.analysis_seconds if simulated else None, stop),
+            )
+            for i in range(args.workers)
+        ]
+        try:
+            for process in processes:
+                process.start()
+            # Queue only once workers are starting, so queued time is not all startup
+            database.queue_jobs(seeded, queue)
+            logger.info(f"Queued {len(seeded)} jobs for {args.workers} workers ({args.queue} queue)")
+
+            deadline = time.monotonic() + args.timeout
+            while time.monotonic() < deadline:
+                unfinished = queue.unfinished() if queue is not None else database.unfinished_jobs()
+                if not unfinished:
+                    break
+                if not any(process.is_alive() for process in processes):
+                    logger.error("All workers exited with jobs unfinished")
+                    break
+                time.sleep(0.5)
+            else:
+                logger.error(f"Timed out after {args.timeout}s with jobs unfinished")
+        finally:
+            stop.set()
+            for process in processes:
+                process.join(timeout=60)
+                if process.is_alive():
+                    process.terminate()
+            if server is not None:
+                server.stop()
+
+        jobs = fake_queue_times(queue) if queue is not None else database.job_times()
+        return summarize_jobs(jobs)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Drive ProctorWorker processes against a local queue and database")
+    parser.add_argument('--queue', choices=('db', 'api'), default='db')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--analysis', choices=('simulated', 'real'), default='simulated')
+    parser.add_argument('--analysis-seconds', type=float, default=0.5, help="Per-job delay in simulated mode")
+    parser.add_argument('--analysis-cache', action='store_true', help="Keep the worker's analysis result cache on")
+    parser.add_argument('--asset-kb', type=int, default=512, help="Synthetic asset size in simulated mode")
+    parser.add_argument('--browser-events', type=int, default=200, help="Synthetic events generated per attempt")
+    parser.add_argument('--async-pipeline', action='store_true',
+                        help="Run the workers' experimental async job pipeline instead of the one-job-at-a-time loop")
+    parser.add_argument('--prefetch-jobs', type=int, default=1, help="Jobs claimed ahead with --async-pipeline")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=1800)
+    parser.add_argument('--corpus-dir', default=os.getenv('BENCH_CORPUS_DIR', DEFAULT_CORPUS_DIR))
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed regression fraction")
+    args = parser.parse_args(argv)
+
+    summary = run_load(args)
+    logger.info(f"Load summary: {json.dumps(summary, sort_keys=True)}")
+
+    case = f"load/{args.queue}_{args.analysis}_{args.workers}w{'_async' if args.async_pipeline else ''}"
+    results = {}
+    if summary.get('jobs_per_minute'):
+        results[case] = {
+            'seconds': {'median': summary['processing_seconds']['p50']},
+            'throughput': {'jobs_per_minute': round(summary['jobs_per_minute'], 3)},
+            'summary': summary,
+        }
+
+    report = {
+        'schema': BASELINE_SCHEMA,
+        'environment': {
+            **environment(),
+            'workers': args.workers,
+            'jobs': args.jobs,
+            'queue': args.queue,
+            'analysis': args.analysis,
+            'async_pipeline': args.async_pipeline,
+            'prefetch_jobs': args.prefetch_jobs if args.async_pipeline else None,
+            'analysis_seconds': args.analysis_seconds if args.analysis == 'simulated' else None,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        logger.info(f"Wrote load results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline.get('results', {}), args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            return 1
+        logger.info(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+    finished = summary.get('states', {}).get('completed', 0)
+    return 0 if finished == summary['jobs'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+Disposable local database for end-to-end runs of the worker.
+
+DisposableDatabase creates a throwaway database on a local Postgres (13+,
+for gen_random_uuid), with the pg-boss job table and the subset of the
+Prisma schema the worker reads and writes, seeds it with synthetic tests,
+attempts, assets and browser events, and drops it on exit. Worker-owned
+tables (proctor_worker.*) come from their Prisma migration, as in
+production.
+"""
+
+import os
+import json
+import uuid
+import random
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Any
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+from benchmarks.events import synthetic_events
+from benchmarks.fake_queue import PROCTOR_ANALYSIS_JOB_NAME, PROCTOR_ANALYSIS_JOB_SCHEMA_VERSION, FakeQueue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADMIN_DSN = 'postgresql://postgres@localhost:5432/postgres'
+
+# The proctor_worker.* tables, created by this migration rather than mirrored below
+WORKER_TABLES_MIGRATION = os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', 'prisma', 'migrations',
+    '20261019090000_add_proctor_worker_tables', 'migration.sql',
+)
+
+# Column names and types follow prisma/schema.prisma (and pg-boss 9 for
+# pgboss.job); columns the worker never touches are left out
+SCHEMA_SQL = """
+CREATE SCHEMA pgboss;
+CREATE TYPE pgboss.job_state AS ENUM ('created', 'retry', 'active', 'completed', 'expired', 'cancelled', 'failed');
+CREATE TABLE pgboss.job (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    name text NOT NULL,
+    priority integer NOT NULL DEFAULT 0,
+    data jsonb,
+    state pgboss.job_state NOT NULL DEFAULT 'created',
+    retryLimit integer NOT NULL DEFAULT 0,
+    retryCount integer NOT NULL DEFAULT 0,
+    retryDelay integer NOT NULL DEFAULT 0,
+    retryBackoff boolean NOT NULL DEFAULT false,
+    startAfter timestamptz NOT NULL DEFAULT now(),
+    startedOn timestamptz,
+    expireIn interval NOT NULL DEFAULT interval '15 minutes',
+    createdOn timestamptz NOT NULL DEFAULT now(),
+    completedOn timestamptz,
+    keepUntil timestamptz NOT NULL DEFAULT now() + interval '14 days',
+    output jsonb
+);
+CREATE INDEX job_fetch ON pgboss.job (name text_pattern_ops, startAfter) WHERE state < 'active';
+
+CREATE TABLE "Test" (
+    id text PRIMARY KEY,
+    title text NOT NULL
+);
+CREATE TABLE "Question" (
+    id text PRIMARY KEY,
+    "testId" text NOT NULL REFERENCES "Test"(id) ON DELETE CASCADE
+);
+CREATE TABLE "TestAttempt" (
+    id text PRIMARY KEY,
+    "testId" text NOT NULL REFERENCES "Test"(id) ON DELETE CASCADE,
+    "startedAt" timestamp(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "completedAt" timestamp(3),
+    "riskScore" double precision,
+    "riskScoreBreakdown" jsonb,
+    "updatedAt" timestamp(3) NOT NULL
+);
+CREATE TABLE "PublicTestLink" (
+    id text PRIMARY KEY,
+    "testId" text NOT NULL REFERENCES "Test"(id) ON DELETE CASCADE
+);
+CREATE TABLE "PublicTestAttempt" (
+    id text PRIMARY KEY,
+    "publicLinkId" text REFERENCES "PublicTestLink"(id) ON DELETE SET NULL,
+    "startedAt" timestamp(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "completedAt" timestamp(3),
+    "riskScore" double precision,
+    "riskScoreBreakdown" jsonb,
+    "updatedAt" timestamp(3) NOT NULL
+);
+CREATE TABLE "ProctorAsset" (
+    id text PRIMARY KEY,
+    "attemptId" text NOT NULL REFERENCES "TestAttempt"(id) ON DELETE CASCADE,
+    kind text NOT NULL,
+    "fileName" text NOT NULL,
+    "mimeType" text NOT NULL,
+    "fileSize" integer NOT NULL,
+    data bytea NOT NULL,
+    ts timestamp(3) NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE "ProctorEvent" (
+    id text PRIMARY KEY,
+    "attemptId" text NOT NULL REFERENCES "TestAttempt"(id) ON DELETE CASCADE,
+    type text NOT NULL,
+    ts timestamp(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    extra jsonb
+);
+CREATE INDEX "ProctorEvent_attemptId_ts_idx" ON "ProctorEvent"("attemptId", ts);
+CREATE TABLE "PublicProctorEvent" (
+    id text PRIMARY KEY,
+    "attemptId" text NOT NULL REFERENCES "PublicTestAttempt"(id) ON DELETE CASCADE,
+    type text NOT NULL,
+    ts timestamp(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    extra jsonb
+);
+CREATE INDEX "PublicProctorEvent_attemptId_ts_idx" ON "PublicProctorEvent"("attemptId", ts);
+"""
+
+# Types the browser records; the rest of the synthetic mix comes from analysis
+BROWSER_EVENT_TYPES = frozenset({
+    'TAB_HIDDEN', 'WINDOW_BLUR', 'TAB_SWITCH', 'MOUSE_LEFT_WINDOW', 'NEW_TAB_OPENED', 'COPY_DETECTED',
+    'PASTE_DETECTED', 'SELECT_ALL_DETECTED', 'CONTEXT_MENU_DETECTED', 'KEYBOARD_SHORTCUT', 'CTRL_C',
+    'CTRL_V', 'CTRL_TAB', 'ALT_TAB', 'DEVTOOLS_SHORTCUT', 'F12_PRESSED', 'INACTIVITY_DETECTED',
+})
+
+
+class SeededJob(NamedTuple):
+    attempt_id: str
+    asset_id: str
+    size_bytes: int
+    job_id: Optional[str]     # Set once the job is queued
+
+
+class DisposableDatabase:
+    """
+    A fresh database on the server at `admin_dsn`, named proctor_load_<random>.
+    Use as a context manager; `params` are psycopg2.connect keyword arguments,
+    as ProctorWorker takes them.
+    """
+
+    def __init__(self, admin_dsn: str = DEFAULT_ADMIN_DSN):
+        self.admin_dsn = admin_dsn
+        self.name = f"proctor_load_{uuid.uuid4().hex[:12]}"
+        self.params: Dict[str, Any] = {**psycopg2.extensions.parse_dsn(admin_dsn), 'dbname': self.name}
+        self.connection = None
+
+    def _admin_execute(self, sql: str):
+        admin = psycopg2.connect(self.admin_dsn)
+        admin.autocommit = True
+        try:
+            with admin.cursor() as cursor:
+                cursor.execute(sql)
+        finally:
+            admin.close()
+
+    def __enter__(self) -> 'DisposableDatabase':
+        self._admin_execute(f'CREATE DATABASE "{self.name}"')
+        try:
+            self.connection = psycopg2.connect(**self.params)
+            with open(WORKER_TABLES_MIGRATION) as f:
+                worker_tables_sql = f.read()
+            with self.connection.cursor() as cursor:
+                cursor.execute(SCHEMA_SQL)
+                cursor.execute(worker_tables_sql)
+            self.connection.commit()
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        logger.info(f"Created disposable database {self.name}")
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        self._admin_execute(f'DROP DATABASE IF EXISTS "{self.name}" WITH (FORCE)')
+        logger.info(f"Dropped disposable database {self.name}")
+
+    def seed(self, assets: List[bytes], questions: int = 30, browser_events: int = 200,
+             seed: int = 0) -> List[SeededJob]:
+        """
+        One test with `questions` questions, and per asset an attempt that
+        started an hour ago, the asset and `browser_events` synthetic browser
+        events. Jobs are not queued; see queue_jobs.
+        """
+        rng = random.Random(seed)
+        test_id = str(uuid.uuid4())
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        seeded = []
+
+        with self.connection.cursor() as cursor:
+            cursor.execute('INSERT INTO "Test" (id, title) VALUES (%s, %s)', (test_id, 'Load test'))
+            psycopg2.extras.execute_values(
+                cursor, 'INSERT INTO "Question" (id, "testId") VALUES %s',
+                [(str(uuid.uuid4()), test_id) for _ in range(questions)],
+            )
+            for position, data in enumerate(assets):
+                attempt_id, asset_id = str(uuid.uuid4()), str(uuid.uuid4())
+                started_at = now - timedelta(minutes=60 + rng.uniform(0, 30))
+                cursor.execute("""
+                    INSERT INTO "TestAttempt" (id, "testId", "startedAt", "completedAt", "updatedAt")
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (attempt_id, test_id, started_at, started_at + timedelta(minutes=60), now))
+                cursor.execute("""
+                    INSERT INTO "ProctorAsset" (id, "attemptId", kind, "fileName", "mimeType", "fileSize", data)
+                    VALUES (%s, %s, 'video', 'recording.webm', 'video/webm', %s, %s)
+                """, (asset_id, attempt_id, len(data), psycopg2.Binary(data)))
+
+                events = synthetic_events(
+                    browser_events, duration_seconds=3600,
+                    seed=seed * 100_003 + position, start=started_at.replace(tzinfo=timezone.utc).timestamp(),
+                )
+                rows = [
+                    (str(uuid.uuid4()), attempt_id, event['type'],
+                     datetime.fromtimestamp(event['timestamp'], tz=timezone.utc).replace(tzinfo=None),
+                     json.dumps(event['extra']) if event.get('extra') else None)
+                    for event in events if event['type'] in BROWSER_EVENT_TYPES
+                ]
+                psycopg2.extras.execute_values(
+                    cursor, 'INSERT INTO "ProctorEvent" (id, "attemptId", type, ts, extra) VALUES %s', rows,
+                )
+                seeded.append(SeededJob(attempt_id, asset_id, len(data), None))
+        self.connection.commit()
+        logger.info(f"Seeded {len(seeded)} attempts and assets into {self.name}")
+        return seeded
+
+    @staticmethod
+    def job_data(job: SeededJob) -> Dict[str, Any]:
+        return {
+            'schemaVersion': PROCTOR_ANALYSIS_JOB_SCHEMA_VERSION,
+            'assetId': job.asset_id,
+            'attemptId': job.attempt_id,
+            'databaseStored': True,
+        }
+
+    def queue_jobs(self, seeded: List[SeededJob], queue: Optional[FakeQueue] = None) -> List[SeededJob]:
+        """Queue an analysis job per seeded asset, in pgboss.job or, when given, in a FakeQueue"""
+        if queue is not None:
+            return [job._replace(job_id=queue.enqueue(self.job_data(job), job.size_bytes)) for job in seeded]
+
+        queued = []
+        with self.connection.cursor() as cursor:
+            for job in seeded:
+                cursor.execute("""
+                    INSERT INTO pgboss.job (name, data, retryLimit) VALUES (%s, %s, 2) RETURNING id
+                """, (PROCTOR_ANALYSIS_JOB_NAME, json.dumps(self.job_data(job))))
+                queued.append(job._replace(job_id=str(cursor.fetchone()[0])))
+        self.connection.commit()
+        return queued
+
+    def unfinished_jobs(self) -> int:
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM pgboss.job WHERE state IN ('created', 'retry', 'active')")
+            count = cursor.fetchone()[0]
+        self.connection.commit()
+        return count
+
+    def job_times(self) -> List[Dict[str, Any]]:
+        """State and createdOn / startedOn / completedOn (epoch seconds) of every pgboss job"""
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, state::text, EXTRACT(EPOCH FROM createdOn), EXTRACT(EPOCH FROM startedOn),
+                       EXTRACT(EPOCH FROM completedOn)
+                FROM pgboss.job
+            """)
+            rows = cursor.fetchall()
+        self.connection.commit()
+        return [
+            {'id': str(job_id), 'state': state, 'created_on': float(created),
+             'started_on': float(started) if started is not None else None,
+             'completed_on': float(completed) if completed is not None else None}
+            for job_id, state, created, started, completed in rows
+        ]
+
+
+def synthetic_assets(count: int, size_bytes: int, seed: int = 0) -> List[bytes]:
+    """Random payloads: downloadable and hashable, but not decodable media"""
+    rng = random.Random(seed)
+    return [rng.randbytes(size_bytes) for _ in range(count)]
+
+
+def corpus_assets(count: int, paths: List[str]) -> List[bytes]:
+    """`count` assets cycling through rendered corpus recordings"""
+    recordings = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            recordings.append(f.read())
+    return [recordings[i % len(recordings)] for i in range(count)]
+
+
+def admin_dsn_from_env() -> str:
+    return os.getenv('LOADTEST_DATABASE_URL', DEFAULT_ADMIN_DSN)
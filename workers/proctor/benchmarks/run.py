@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark Runner
+
+Times VideoAnalyzer, AudioAnalyzer and ImprovedRiskCalculator on the
+synthetic corpus and writes the results as a JSON baseline, or compares
+them against one.
+
+Usage (from workers/proctor):
+    python -m benchmarks.run [--quick] [--only video,audio,risk]
+                             [--rounds 3] [--warmup 1]
+                             [--output results.json]
+                             [--baseline baseline.json] [--tolerance 0.10]
+
+Exits 1 when a case regressed beyond the tolerance.
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import Dict, List, Optional, Any
+
+from analysis.risk_calculator import ImprovedRiskCalculator
+from benchmarks.corpus import DEFAULT_CORPUS, QUICK_CORPUS, RecordingSpec, ensure_corpus
+from benchmarks.events import synthetic_events
+from benchmarks.harness import BASELINE_SCHEMA, compare_to_baseline, environment, measure
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(__file__), '.corpus')
+RISK_EVENT_COUNTS = (1_000, 10_000, 100_000)
+QUICK_RISK_EVENT_COUNTS = (1_000, 10_000)
+
+
+def _result(measured: Dict[str, Any], throughput: Dict[str, float], **fields) -> Dict[str, Any]:
+    result = {key: value for key, value in measured.items() if key != 'value'}
+    result['throughput'] = {key: round(value, 3) for key, value in throughput.items()}
+    result.update(fields)
+    return result
+
+
+def bench_video(specs: List[RecordingSpec], paths: List[str], rounds: int, warmup: int) -> Dict[str, Any]:
+    from analysis.video_analysis import VideoAnalyzer
+    from analysis.metrics import FRAMES_PROCESSED
+
+    analyzer = VideoAnalyzer()
+    results = {}
+    try:
+        for spec, path in zip(specs, paths):
+            def run():
+                frames_dir = tempfile.mkdtemp(prefix='bench_frames_')
+                frames_before = FRAMES_PROCESSED.value()
+                try:
+                    events = analyzer.analyze_video(path, frames_dir)
+                finally:
+                    shutil.rmtree(frames_dir, ignore_errors=True)
+                return FRAMES_PROCESSED.value() - frames_before, len(events)
+
+            measured = measure(run, rounds, warmup)
+            frames, events = measured['value']
+            median = measured['seconds']['median']
+            results[f"video/{spec.name}"] = _result(
+                measured, {'frames_per_second': frames / median, 'video_seconds_per_second': spec.duration / median},
+                frames=int(frames), events=events,
+            )
+            logger.info(f"video/{spec.name}: {frames / median:.1f} frames/s, median {median:.2f}s")
+    finally:
+        analyzer.close()
+    return results
+
+
+def bench_audio(specs: List[RecordingSpec], paths: List[str], rounds: int, warmup: int) -> Dict[str, Any]:
+    from analysis.audio_analysis import AudioAnalyzer
+
+    analyzer = AudioAnalyzer()
+    results = {}
+    for spec, path in zip(specs, paths):
+        def run():
+            with tempfile.TemporaryDirectory(prefix='bench_audio_') as temp_dir:
+                return len(analyzer.analyze_audio(path, os.path.join(temp_dir, 'audio.wav')))
+
+        measured = measure(run, rounds, warmup)
+        median = measured['seconds']['median']
+        results[f"audio/{spec.name}"] = _result(
+            measured, {'audio_seconds_per_second': spec.duration / median}, events=measured['value'],
+        )
+        logger.info(f"audio/{spec.name}: {spec.duration / median:.1f} audio-s/s, median {median:.2f}s")
+    return results
+
+
+def bench_risk(event_counts: List[int], rounds: int, warmup: int) -> Dict[str, Any]:
+    calculator = ImprovedRiskCalculator()
+    results = {}
+    for count in event_counts:
+        events = synthetic_events(count, duration_seconds=max(3600.0, count / 10), seed=count)
+        measured = measure(lambda: calculator.calculate_risk_score(events, 60, 30), rounds, warmup)
+        median = measured['seconds']['median']
+        results[f"risk/improved_{count}"] = _result(
+            measured, {'events_per_second': count / median}, total_score=measured['value']['total_score'],
+        )
+        logger.info(f"risk/improved_{count}: {count / median:,.0f} events/s, median {median * 1000:.2f}ms")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the proctoring analyzers and risk calculator")
+    parser.add_argument('--quick', action='store_true', help="Short recordings and fewer events (smoke run)")
+    parser.add_argument('--only', default='video,audio,risk', help="Comma-separated stages to run")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--corpus-dir', default=os.getenv('BENCH_CORPUS_DIR', DEFAULT_CORPUS_DIR))
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed regression fraction")
+    args = parser.parse_args(argv)
+
+    stages = {stage.strip() for stage in args.only.split(',') if stage.strip()}
+    specs = QUICK_CORPUS if args.quick else DEFAULT_CORPUS
+    results: Dict[str, Any] = {}
+
+    if stages & {'video', 'audio'}:
+        paths = ensure_corpus(specs, args.corpus_dir)
+        if 'video' in stages:
+            results.update(bench_video(specs, paths, args.rounds, args.warmup))
+        if 'audio' in stages:
+            results.update(bench_audio(specs, paths, args.rounds, args.warmup))
+    if 'risk' in stages:
+        counts = QUICK_RISK_EVENT_COUNTS if args.quick else RISK_EVENT_COUNTS
+        results.update(bench_risk(list(counts), args.rounds, args.warmup))
+
+    report = {
+        'schema': BASELINE_SCHEMA,
+        'environment': {
+            **environment(),
+            'video_slice_workers': os.getenv('VIDEO_SLICE_WORKERS', '1'),
+            'corpus': 'quick' if args.quick else 'default',
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        logger.info(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline.get('results', {}), args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            return 1
+        logger.info(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Risk Calculator Scaling
+
+Scores synthetic streams of 10 to 10^6 events with ImprovedRiskCalculator
+(on an EventBatch and on dicts) and LegacyRiskCalculator, and reports time
+and traced peak memory per size together with the fitted exponent of each
+(time ~ n^k). A linear path shows k close to 1; a scan or sort per event
+shows up as k near 2 before it shows up as a slow job.
+
+Usage (from workers/proctor):
+    python -m benchmarks.scaling [--max-events 1000000] [--only improved_batch,legacy]
+                                 [--output scaling.json]
+                                 [--baseline scaling.json] [--tolerance 0.10]
+
+Results use the benchmarks.run format, so --baseline compares throughput
+per calculator and size in the same way.
+"""
+
+import gc
+import sys
+import json
+import math
+import logging
+import argparse
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Any
+
+from analysis.risk_calculator import ImprovedRiskCalculator, LegacyRiskCalculator
+from benchmarks.events import synthetic_events
+from benchmarks.golden import quiet_legacy_logging
+from benchmarks.harness import BASELINE_SCHEMA, compare_to_baseline, environment, measure
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+EVENT_COUNTS = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+# Below this the fixed per-call cost dominates, so smaller sizes are left out of the fit
+FIT_MIN_EVENTS = 1_000
+# Timed calls per size aim for about this many events in total
+EVENTS_PER_CASE = 200_000
+
+
+def _calculators() -> Dict[str, Callable[[Any, Any], Any]]:
+    improved = ImprovedRiskCalculator()
+    legacy = LegacyRiskCalculator()
+    return {
+        'improved_batch': lambda batch, dicts: improved.calculate_risk_score(batch, 60, 30),
+        'improved_dicts': lambda batch, dicts: improved.calculate_risk_score(dicts, 60, 30),
+        'legacy': lambda batch, dicts: legacy.calculate_risk_score(dicts, 60),
+    }
+
+
+def traced_peak_bytes(fn: Callable[[], Any]) -> int:
+    """Peak Python heap allocated by one call of `fn`, above what was live before it"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def scaling_exponent(counts: List[int], seconds: List[float]) -> Optional[float]:
+    """Least-squares slope of log(seconds) against log(count)"""
+    points = [(math.log(n), math.log(t)) for n, t in zip(counts, seconds) if n >= FIT_MIN_EVENTS and t > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def bench_scaling(event_counts: List[int], calculators: List[str], warmup: int = 1) -> Dict[str, Any]:
+    quiet_legacy_logging()
+    available = _calculators()
+    results: Dict[str, Any] = {}
+    series: Dict[str, Dict[str, list]] = {name: {'counts': [], 'seconds': [], 'peak_bytes': []} for name in calculators}
+
+    for count in event_counts:
+        batch = synthetic_events(count, duration_seconds=max(3600.0, count / 10), seed=count)
+        dicts = batch.to_dicts()
+        rounds = max(3, min(1000, EVENTS_PER_CASE // count))
+
+        for name in calculators:
+            score = available[name]
+            measured = measure(lambda: score(batch, dicts), rounds, warmup)
+            median = measured['seconds']['median']
+            peak_bytes = traced_peak_bytes(lambda: score(batch, dicts))
+
+            series[name]['counts'].append(count)
+            series[name]['seconds'].append(median)
+            series[name]['peak_bytes'].append(peak_bytes)
+            results[f"scaling/{name}_{count}"] = {
+                'seconds': measured['seconds'],
+                'peak_rss_mb': measured['peak_rss_mb'],
+                'traced_peak_kb': round(peak_bytes / 1024, 1),
+                'throughput': {'events_per_second': round(count / median, 3)},
+            }
+            logger.info(
+                f"{name} n={count:,}: {median * 1000:.3f}ms ({count / median:,.0f} events/s), "
+                f"peak {peak_bytes / 1024:,.0f} KiB"
+            )
+
+        del batch, dicts
+
+    fits = {}
+    for name, points in series.items():
+        fits[name] = {
+            'time_exponent': scaling_exponent(points['counts'], points['seconds']),
+            'memory_exponent': scaling_exponent(points['counts'], [float(b) for b in points['peak_bytes']]),
+        }
+        time_exponent = fits[name]['time_exponent']
+        if time_exponent is not None:
+            logger.info(f"{name}: time ~ n^{time_exponent:.2f}, memory ~ n^{fits[name]['memory_exponent']:.2f}")
+    return {'results': results, 'fits': fits}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure how the risk calculators scale with event count")
+    parser.add_argument('--max-events', type=int, default=EVENT_COUNTS[-1])
+    parser.add_argument('--only', default=','.join(_calculators()), help="Comma-separated calculators to run")
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against this JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed regression fraction")
+    args = parser.parse_args(argv)
+
+    calculators = [name.strip() for name in args.only.split(',') if name.strip()]
+    counts = [count for count in EVENT_COUNTS if count <= args.max_events]
+    scaling = bench_scaling(counts, calculators, args.warmup)
+
+    report = {
+        'schema': BASELINE_SCHEMA,
+        'environment': environment(),
+        'results': scaling['results'],
+        'fits': scaling['fits'],
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        logger.info(f"Wrote {len(scaling['results'])} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(scaling['results'], baseline.get('results', {}), args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            return 1
+        logger.info(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Event Re-derivation from Stored Frame Features
+
+Regenerates the video events (LOOK_AWAY, PHONE_DETECTED, MULTIPLE_PEOPLE) of
+analyzed assets from the per-frame features saved by the worker, with new
+thresholds, and re-scores the attempts. No video is decoded and no model is
+run, so each attempt takes a fraction of a second.
+
+For each features file the attempt's stored video events are replaced by the
+re-derived ones and riskScore / riskScoreBreakdown are recomputed from all of
+the attempt's events, in one transaction.
+
+Usage:
+    python rederive_events.py [--features-dir DIR] [--asset ID ...]
+                              [--look-away-yaw 30] [--phone-confidence 0.5]
+                              [--person-confidence 0.5] [--dry-run]
+"""
+
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from analysis.event_batch import ANALYSIS_EVENT_TYPES, EventBatch
+from analysis.frame_features import (
+    FrameEventThresholds,
+    FrameFeatures,
+    FRAME_EVENT_TYPES,
+    derive_frame_events,
+    feature_store_path,
+)
+from analysis.risk_calculator import ImprovedRiskCalculator
+from rescore_attempts import ATTEMPT_TABLES, attempt_context, write_scores
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def fetch_attempt(connection, attempt_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Attempt row with the context the risk calculator needs, plus "isPublic".
+    Like the worker, looks in TestAttempt first and then PublicTestAttempt.
+    """
+    with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+        cursor.execute("""
+            SELECT TA.id, TA."startedAt", TA."completedAt", FALSE as "isPublic",
+                   (SELECT COUNT(*) FROM "Question" WHERE "testId" = TA."testId") as "questionCount"
+            FROM "TestAttempt" TA
+            WHERE TA.id = %s
+        """, (attempt_id,))
+        attempt = cursor.fetchone()
+        if attempt is None:
+            # Public attempts reach their test through the public link
+            cursor.execute("""
+                SELECT TA.id, TA."startedAt", TA."completedAt", TRUE as "isPublic",
+                       (SELECT COUNT(*) FROM "Question" WHERE "testId" = PTL."testId") as "questionCount"
+                FROM "PublicTestAttempt" TA
+                LEFT JOIN "PublicTestLink" PTL ON TA."publicLinkId" = PTL.id
+                WHERE TA.id = %s
+            """, (attempt_id,))
+            attempt = cursor.fetchone()
+        return attempt
+
+
+def load_other_events(connection, attempt_id: str, is_public: bool = False) -> EventBatch:
+    """The attempt's stored events that are not derived from frames, in timestamp order"""
+    _, event_table = ATTEMPT_TABLES[is_public]
+    events = EventBatch()
+    with connection.cursor(name='rederive_events') as cursor:
+        cursor.itersize = 5000
+        cursor.execute(f"""
+            SELECT type, ts, extra
+            FROM {event_table}
+            WHERE "attemptId" = %s AND type <> ALL(%s)
+            ORDER BY ts, id
+        """, (attempt_id, list(FRAME_EVENT_TYPES)))
+        for event_type, ts, extra in cursor:
+            events.append(event_type, ts.replace(tzinfo=timezone.utc).timestamp(),
+                          extra if isinstance(extra, dict) else None)
+    return events
+
+
+def replace_frame_events(connection, attempt_id: str, events: EventBatch, is_public: bool = False):
+    """Swap the attempt's stored frame-derived events for `events`"""
+    _, event_table = ATTEMPT_TABLES[is_public]
+    rows = [
+        (
+            attempt_id,
+            events.type_name(row),
+            datetime.fromtimestamp(events.timestamp(row), tz=timezone.utc).replace(tzinfo=None),
+            events.extra_json(row)
+        )
+        for row in range(len(events))
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            DELETE FROM {event_table}
+            WHERE "attemptId" = %s AND type = ANY(%s)
+        """, (attempt_id, list(FRAME_EVENT_TYPES)))
+        psycopg2.extras.execute_values(cursor, f"""
+            INSERT INTO {event_table} (id, "attemptId", type, ts, extra)
+            VALUES %s
+        """, rows, template="(gen_random_uuid(), %s, %s, %s, %s)", page_size=1000)
+
+
+def rederive_asset(connection, calculator: ImprovedRiskCalculator, features_path: str,
+                   thresholds: FrameEventThresholds, dry_run: bool) -> Optional[Dict[str, Any]]:
+    """Re-derive and re-score one asset's attempt. Returns the new breakdown, or None when skipped."""
+    features = FrameFeatures.load(features_path)
+    attempt_id = features.metadata.get('attemptId')
+    attempt = fetch_attempt(connection, attempt_id) if attempt_id else None
+    if attempt is None:
+        logger.warning(f"Skipping {features_path}: attempt {attempt_id!r} not found")
+        return None
+
+    is_public = attempt['isPublic']
+    other_events = load_other_events(connection, attempt_id, is_public)
+
+    # Same clock as the worker: from the attempt start, or from the first browser event
+    video_events = derive_frame_events(features, thresholds)
+    browser_rows = [row for row in range(len(other_events)) if other_events.type_name(row) not in ANALYSIS_EVENT_TYPES]
+    video_events.shift_to_attempt_clock(attempt['startedAt'], other_events.take(browser_rows))
+
+    merged_events = EventBatch.concat([other_events, video_events])
+    merged_events = merged_events.take(merged_events.time_order())
+
+    duration_minutes, total_questions = attempt_context(attempt)
+    breakdown = calculator.calculate_risk_score(merged_events, duration_minutes, total_questions)
+
+    if dry_run:
+        connection.rollback()
+    else:
+        replace_frame_events(connection, attempt_id, video_events, is_public)
+        write_scores(connection, [attempt_id], [breakdown], is_public)
+        connection.commit()
+
+    logger.info(
+        f"Attempt {attempt_id}: {len(video_events)} video events, risk score {breakdown['total_score']:.2f}"
+    )
+    return breakdown
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = FrameEventThresholds()
+    parser = argparse.ArgumentParser(description="Re-derive video events and risk scores from stored frame features")
+    parser.add_argument('--features-dir', default=os.getenv('FEATURE_STORE_DIR'), help="Frame feature store directory")
+    parser.add_argument('--asset', action='append', default=[], help="Asset id to re-derive (repeatable; default all)")
+    parser.add_argument('--look-away-yaw', type=float, default=defaults.look_away_yaw)
+    parser.add_argument('--phone-confidence', type=float, default=defaults.phone_confidence)
+    parser.add_argument('--person-confidence', type=float, default=defaults.person_confidence)
+    parser.add_argument('--dry-run', action='store_true', help="Score without writing events or results")
+    args = parser.parse_args(argv)
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL is not set")
+        return 1
+    if not args.features_dir:
+        logger.error("FEATURE_STORE_DIR is not set and --features-dir was not given")
+        return 1
+
+    if args.asset:
+        paths = [feature_store_path(asset_id, args.features_dir) for asset_id in args.asset]
+    else:
+        paths = sorted(glob.glob(os.path.join(args.features_dir, '*.npz')))
+    thresholds = FrameEventThresholds(args.look_away_yaw, args.phone_confidence, args.person_confidence)
+
+    calculator = ImprovedRiskCalculator()
+    connection = psycopg2.connect(database_url)
+    started = time.monotonic()
+    done = failed = 0
+    try:
+        for path in paths:
+            try:
+                if rederive_asset(connection, calculator, path, thresholds, args.dry_run) is not None:
+                    done += 1
+            except Exception as e:
+                logger.error(f"Failed to re-derive {path}: {e}")
+                connection.rollback()
+                failed += 1
+    finally:
+        connection.close()
+
+    logger.info(
+        f"Re-derivation complete: {done} attempts in {time.monotonic() - started:.1f}s, {failed} failed"
+        f"{' (dry run)' if args.dry_run else ''}"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Batch Risk Re-scoring
+
+Recomputes riskScore / riskScoreBreakdown for historical test attempts with
+the current ImprovedRiskCalculator rules, e.g. after a weight change.
+Invited attempts (TestAttempt / ProctorEvent) and public-link attempts
+(PublicTestAttempt / PublicProctorEvent) are both re-scored by default.
+
+Attempts are processed in pages (keyset-paginated by id). For each page the
+event rows of all its attempts are streamed in one ordered query,
+scored as a columnar batch, and written back with one bulk UPDATE.
+
+Usage:
+    python rescore_attempts.py [--page-size 500] [--status COMPLETED]
+                               [--attempts all|invited|public] [--dry-run]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple, Any
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from analysis.batch_scoring import BatchRiskScorer, EventColumns
+from analysis.risk_calculator import ImprovedRiskCalculator
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# (attempt table, event table), by whether the attempts are public-link ones
+ATTEMPT_TABLES = {
+    False: ('"TestAttempt"', '"ProctorEvent"'),
+    True: ('"PublicTestAttempt"', '"PublicProctorEvent"'),
+}
+
+
+def fetch_attempt_page(connection, after_id: str, page_size: int, status: Optional[str],
+                       is_public: bool = False) -> List[Dict[str, Any]]:
+    """Fetch the next page of proctored attempts with the context the risk calculator needs"""
+    attempt_table, _ = ATTEMPT_TABLES[is_public]
+    # Public attempts reach their test through the public link
+    test_id = 'PTL."testId"' if is_public else 'TA."testId"'
+    link_join = 'LEFT JOIN "PublicTestLink" PTL ON TA."publicLinkId" = PTL.id' if is_public else ''
+    with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+        cursor.execute(f"""
+            SELECT TA.id, TA."startedAt", TA."completedAt",
+                   (SELECT COUNT(*) FROM "Question" WHERE "testId" = {test_id}) as "questionCount"
+            FROM {attempt_table} TA
+            {link_join}
+            WHERE TA."proctoringEnabled" = TRUE
+            AND (%s IS NULL OR TA.status::text = %s)
+            AND TA.id > %s
+            ORDER BY TA.id ASC
+            LIMIT %s
+        """, (status, status, after_id, page_size))
+        return cursor.fetchall()
+
+
+def attempt_context(attempt) -> Tuple[float, int]:
+    """(duration_minutes, total_questions) with the same defaults as ProctorWorker.get_test_details"""
+    duration_minutes, total_questions = 60, 30
+    if attempt['questionCount'] > 0:
+        total_questions = attempt['questionCount']
+    if attempt['startedAt'] and attempt['completedAt']:
+        duration = attempt['completedAt'] - attempt['startedAt']
+        duration_minutes = max(1, duration.total_seconds() // 60)
+    return duration_minutes, total_questions
+
+
+def stream_events(connection, attempt_ids: List[str], fetch_size: int = 10000, is_public: bool = False):
+    """Stream (attemptId, type, ts, extra) rows for the attempts, grouped by attempt and ordered by time"""
+    _, event_table = ATTEMPT_TABLES[is_public]
+    # Named cursor: rows are fetched from the server in chunks instead of all at once
+    with connection.cursor(name='rescore_events') as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(f"""
+            SELECT "attemptId", type, ts, extra
+            FROM {event_table}
+            WHERE "attemptId" = ANY(%s)
+            ORDER BY "attemptId", ts, id
+        """, (attempt_ids,))
+        for row in cursor:
+            yield row
+
+
+def write_scores(connection, attempt_ids: List[str], breakdowns: List[Dict[str, Any]], is_public: bool = False):
+    """Write risk scores and breakdowns for a page with one UPDATE"""
+    attempt_table, _ = ATTEMPT_TABLES[is_public]
+    values = [
+        (attempt_id, breakdown['total_score'], json.dumps(breakdown))
+        for attempt_id, breakdown in zip(attempt_ids, breakdowns)
+    ]
+    with connection.cursor() as cursor:
+        psycopg2.extras.execute_values(cursor, f"""
+            UPDATE {attempt_table} AS TA
+            SET "riskScore" = V.score, "riskScoreBreakdown" = V.breakdown, "updatedAt" = NOW()
+            FROM (VALUES %s) AS V(id, score, breakdown)
+            WHERE TA.id = V.id
+        """, values, template="(%s, %s::float8, %s::jsonb)", page_size=len(values))
+
+
+def rescore(connection, page_size: int, status: Optional[str], dry_run: bool, is_public: bool = False) -> int:
+    """Re-score all matching attempts of one kind page by page. Returns the number of attempts scored."""
+    scorer = BatchRiskScorer(ImprovedRiskCalculator())
+    kind = 'public' if is_public else 'invited'
+    last_id = ''
+    scored = 0
+    started = time.monotonic()
+
+    while True:
+        attempts = fetch_attempt_page(connection, last_id, page_size, status, is_public)
+        if not attempts:
+            break
+
+        attempt_ids = [attempt['id'] for attempt in attempts]
+        contexts = [attempt_context(attempt) for attempt in attempts]
+        columns = EventColumns.from_rows(attempt_ids, stream_events(connection, attempt_ids, is_public=is_public))
+
+        breakdowns = scorer.score(
+            columns,
+            [duration for duration, _ in contexts],
+            [questions for _, questions in contexts],
+        )
+
+        if dry_run:
+            connection.rollback()
+        else:
+            write_scores(connection, attempt_ids, breakdowns, is_public)
+            connection.commit()
+
+        scored += len(attempt_ids)
+        last_id = attempt_ids[-1]
+        logger.info(
+            f"Scored {scored} {kind} attempts ({len(columns)} events in last page, "
+            f"{scored / max(time.monotonic() - started, 1e-9):.0f} attempts/s)"
+        )
+
+    return scored
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-score proctored test attempts in batches")
+    parser.add_argument('--page-size', type=int, default=500, help="Attempts per query/UPDATE page")
+    parser.add_argument('--status', default='COMPLETED', help="Only attempts with this status ('' for all)")
+    parser.add_argument('--attempts', choices=('all', 'invited', 'public'), default='all',
+                        help="Invited (TestAttempt), public-link (PublicTestAttempt) or both")
+    parser.add_argument('--dry-run', action='store_true', help="Score without writing results")
+    args = parser.parse_args(argv)
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL is not set")
+        return 1
+
+    connection = psycopg2.connect(database_url)
+    try:
+        kinds = {'all': (False, True), 'invited': (False,), 'public': (True,)}[args.attempts]
+        scored = sum(
+            rescore(connection, args.page_size, args.status or None, args.dry_run, is_public)
+            for is_public in kinds
+        )
+        logger.info(f"Re-scoring complete: {scored} attempts{' (dry run)' if args.dry_run else ''}")
+        return 0
+    except Exception as e:
+        logger.error(f"Re-scoring failed: {e}")
+        connection.rollback()
+        return 1
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Tests for the benchmark harness and synthetic event streams.
+"""
+import sys
+import os
+import time
+
+# Add the current directory to the path so we can import the benchmarks package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmarks.events import synthetic_events
+import requests
+
+from benchmarks.harness import compare_to_baseline, measure, percentile
+from benchmarks.fake_queue import FakeQueue, FakeQueueServer
+from benchmarks.load import summarize_jobs
+from benchmarks.golden import check_golden, diff_outputs
+from benchmarks.scaling import scaling_exponent
+
+
+def _case(median, **throughput):
+    return {'seconds': {'median': median}, 'throughput': throughput}
+
+
+class TestBenchmarkHarness:
+    def test_synthetic_events_are_ordered_and_deterministic(self):
+        events = synthetic_events(2000, duration_seconds=600, seed=7)
+
+        assert len(events) == 2000
+        timestamps = [events.timestamp(row) for row in range(len(events))]
+        assert timestamps == sorted(timestamps)
+        assert events.to_dicts() == synthetic_events(2000, duration_seconds=600, seed=7).to_dicts()
+        assert {'TAB_HIDDEN', 'LOOK_AWAY'} <= {event['type'] for event in events}
+
+    def test_measure_reports_rounds_and_value(self):
+        calls = []
+        measured = measure(lambda: calls.append(1) or len(calls), rounds=3, warmup=2)
+
+        assert measured['seconds']['rounds'] == 3
+        assert measured['value'] == 5
+        assert measured['peak_rss_mb'] > 0
+
+    def test_compare_to_baseline(self):
+        baseline = {
+            'video/a': _case(10.0, frames_per_second=100.0),
+            'risk/b': _case(0.5),
+            'risk/gone': _case(0.5),
+        }
+        results = {
+            'video/a': _case(12.0, frames_per_second=85.0),
+            'risk/b': _case(0.54),
+            'risk/new': _case(9.0),
+        }
+
+        assert compare_to_baseline(results, baseline, tolerance=0.10) == [
+            'video/a: frames_per_second 85 vs baseline 100 (-15.0%)',
+        ]
+        assert compare_to_baseline(results, baseline, tolerance=0.05) == [
+            'risk/b: median 0.54s vs baseline 0.5s (+8.0%)',
+            'video/a: frames_per_second 85 vs baseline 100 (-15.0%)',
+        ]
+
+    def test_scaling_exponent_ignores_small_sizes(self):
+        counts = [10, 100, 1000, 10000, 100000]
+        linear = [1e-3, 1e-3, 1e-3, 1e-2, 1e-1]
+        quadratic = [1e-6, 1e-4, 1e-2, 1.0, 100.0]
+
+        assert abs(scaling_exponent(counts, linear) - 1.0) < 1e-9
+        assert abs(scaling_exponent(counts, quadratic) - 2.0) < 1e-9
+        assert scaling_exponent([10, 100, 1000], [1.0, 2.0, 3.0]) is None
+
+
+class TestRiskGolden:
+    """Every scoring path reproduces the recorded calculator outputs bit-for-bit."""
+
+    def test_scoring_paths_match_golden_outputs(self):
+        assert check_golden() == []
+
+    def test_diff_outputs_is_exact(self):
+        expected = {'total_score': 12.5, 'counts': {'TAB_HIDDEN': 3}, 'scores': [1.0, 2.0]}
+
+        assert diff_outputs(expected, {'total_score': 12.5, 'counts': {'TAB_HIDDEN': 3}, 'scores': [1.0, 2.0]}) == []
+        assert diff_outputs(expected, {
+            'total_score': 12.500000000000002,
+            'counts': {'TAB_HIDDEN': 3.0, 'LOOK_AWAY': 1},
+            'scores': [1.0],
+        }) == [
+            'total_score: expected 12.5, got 12.500000000000002',
+            'counts.TAB_HIDDEN: expected 3, got 3.0',
+            'counts.LOOK_AWAY: unexpected 1',
+            'scores: expected [1.0, 2.0], got [1.0]',
+        ]
+
+
+class TestFakeQueue:
+    """The fake internal queue API behaves like the Next.js routes."""
+
+    def setup_method(self):
+        self.queue = FakeQueue()
+        self.server = FakeQueueServer(self.queue, token='secret')
+        self.server.start()
+
+    def teardown_method(self):
+        self.server.stop()
+
+    def _post(self, action, body=None, token='secret'):
+        return requests.post(
+            f"{self.server.url}/api/internal/queue/{action}", headers={'x-worker-token': token}, json=body, timeout=5,
+        )
+
+    def test_claim_order_and_completion(self):
+        small = self.queue.enqueue({'schemaVersion': 1, 'assetId': 'small'}, size_bytes=100)
+        large = self.queue.enqueue({'schemaVersion': 1, 'assetId': 'large'}, size_bytes=10_000)
+
+        assert self._post('claim', token='wrong').status_code == 401
+        claimed = self._post('claim', {'sizePreference': 'large'}).json()['job']
+        assert claimed['id'] == large and claimed['data']['assetId'] == 'large'
+        assert self._post('claim', {'sizePreference': 'large', 'minBytes': 1000}).json() == {'job': None}
+        assert self._post('claim', {'minBytes': -1}).status_code == 400
+        assert self._post('claim', {'maxWaitSeconds': 'soon'}).status_code == 400
+
+        assert self._post('release', {'jobId': large}).json() == {'success': True, 'released': True}
+        assert self._post('claim', {'sizePreference': 'small'}).json()['job']['id'] == small
+        assert self._post('heartbeat', {'jobIds': [small], 'leaseSeconds': 60}).json()['extended'] == 1
+        assert self._post('complete', {'jobId': small}).json() == {'success': True}
+        assert self._post('claim').json()['job']['id'] == large
+        assert self._post('fail', {'jobId': large, 'retry': 'no'}).status_code == 400
+        assert self._post('fail', {'jobId': large, 'error': {'error': 'boom'}}).json() == {'success': True}
+
+        assert self.queue.wait_until_done(timeout=1)
+        states = {job.id: (job.state, job.retry_count, job.output) for job in self.queue.jobs()}
+        assert states == {small: ('completed', 1, None), large: ('failed', 1, {'error': 'boom'})}
+
+    def test_heartbeat_never_shortens_the_lease(self):
+        job_id = self.queue.enqueue({'schemaVersion': 1, 'assetId': 'a'})
+        job = self.queue.claim()
+        claimed_until = job.lease_until
+
+        assert self._post('heartbeat', {'jobIds': [job_id], 'leaseSeconds': 60}).json()['extended'] == 1
+        assert job.lease_until == claimed_until
+        time.sleep(0.01)
+        assert self._post('heartbeat', {'jobIds': [job_id], 'leaseSeconds': 60 * 60}).json()['extended'] == 1
+        assert job.lease_until > claimed_until
+
+    def test_rejects_unsupported_schema_version(self):
+        job_id = self.queue.enqueue({'schemaVersion': 2, 'assetId': 'a'})
+
+        response = self._post('claim')
+
+        assert response.status_code == 422
+        assert [job.state for job in self.queue.jobs() if job.id == job_id] == ['failed']
+        assert self._post('complete', {}).status_code == 400
+
+    def test_summarize_jobs(self):
+        jobs = [
+            {'id': str(i), 'state': 'completed', 'created_on': 0.0, 'started_on': float(i), 'completed_on': i + 2.0}
+            for i in range(4)
+        ] + [{'id': 'x', 'state': 'failed', 'created_on': 0.0, 'started_on': 1.0, 'completed_on': 1.5}]
+
+        summary = summarize_jobs(jobs)
+
+        assert summary['states'] == {'completed': 4, 'failed': 1}
+        assert summary['wall_seconds'] == 5.0
+        assert summary['jobs_per_minute'] == 60.0
+        assert summary['processing_seconds']['p50'] == 2.0
+        assert summary['end_to_end_seconds']['max'] == 5.0
+        assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
@@ -0,0 +1,112 @@
+"""
+Tests for the analysis checkpoint stores.
+"""
+import sys
+import os
+import time
+
+import psycopg2
+import psycopg2.errors
+
+# Add the current directory to the path so we can import the analysis package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from analysis.checkpoints import AnalysisCheckpointer, FileCheckpointStore
+
+
+class TestFileCheckpointStore:
+    def test_prune_deletes_stale_checkpoints(self, tmp_path):
+        store = FileCheckpointStore(str(tmp_path))
+        store.save('job-1.v1', 'video', b'stale')
+        store.save('job-2.v1', 'video', b'fresh')
+        stale = time.time() - 2 * 3600
+        os.utime(tmp_path / 'job-1.v1.video.ckpt', (stale, stale))
+
+        assert store.prune(3600) == 1
+        assert store.load('job-1.v1', 'video') is None
+        assert store.load('job-2.v1', 'video') == b'fresh'
+
+
+class FakeCheckpointConnection:
+    """A psycopg2-like connection that aborts its transaction on a failed statement, like Postgres"""
+
+    def __init__(self):
+        self.closed = 0
+        self.aborted = False
+        self.fail_next = None
+        self.close_on_failure = False
+        self.rows = {}
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=()):
+                if connection.aborted:
+                    raise psycopg2.errors.InFailedSqlTransaction("current transaction is aborted")
+                if connection.fail_next is not None:
+                    error, connection.fail_next = connection.fail_next, None
+                    connection.aborted = True
+                    if connection.close_on_failure:
+                        connection.closed = 2
+                    raise error
+                self._row = None
+                if sql.lstrip().startswith('INSERT'):
+                    connection.rows[params[:2]] = params[2]
+                elif sql.lstrip().startswith('SELECT'):
+                    data = connection.rows.get(params)
+                    self._row = (data,) if data is not None else None
+
+            def fetchone(self):
+                return self._row
+
+        return Cursor()
+
+    def commit(self):
+        if self.aborted:
+            raise psycopg2.errors.InFailedSqlTransaction("current transaction is aborted")
+
+    def rollback(self):
+        self.aborted = False
+
+
+class TestPostgresCheckpointStore:
+    def _store(self, monkeypatch):
+        from analysis import checkpoints
+        connections = []
+
+        def connect(**params):
+            connections.append(FakeCheckpointConnection())
+            return connections[-1]
+
+        monkeypatch.setattr(checkpoints.psycopg2, 'connect', connect)
+        return checkpoints.PostgresCheckpointStore({'dbname': 'test'}), connections
+
+    def test_failed_statement_is_rolled_back(self, monkeypatch):
+        store, connections = self._store(monkeypatch)
+        connections[0].fail_next = psycopg2.errors.DiskFull("could not extend file")
+        checkpointer = AnalysisCheckpointer(store, 'job-1', interval_seconds=0)
+
+        checkpointer.save('video', b'first')     # Logged and dropped
+        checkpointer.save('video', b'second')
+
+        assert store.load('job-1', 'video') == b'second'
+        assert len(connections) == 1
+
+    def test_lost_connection_is_reopened(self, monkeypatch):
+        store, connections = self._store(monkeypatch)
+        connections[0].fail_next = psycopg2.OperationalError("server closed the connection unexpectedly")
+        connections[0].close_on_failure = True
+        checkpointer = AnalysisCheckpointer(store, 'job-1', interval_seconds=0)
+
+        checkpointer.save('video', b'first')
+        checkpointer.save('video', b'second')
+
+        assert store.load('job-1', 'video') == b'second'
+        assert len(connections) == 2
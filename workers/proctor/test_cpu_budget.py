@@ -0,0 +1,67 @@
+"""
+Tests for the worker CPU budget and native thread settings.
+"""
+import sys
+import os
+
+import pytest
+
+# Add the current directory to the path so we can import the analysis package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from analysis.cpu_budget import (
+    BLAS_THREAD_VARS, CpuBudget, apply_process_budget, configured_cpu_budget, parse_cpu_list, thread_report,
+)
+
+
+class TestCpuBudget:
+    def test_parse_cpu_list(self):
+        assert parse_cpu_list('0-3,8, 10-11') == {0, 1, 2, 3, 8, 10, 11}
+        assert parse_cpu_list('5') == {5}
+        with pytest.raises(ValueError):
+            parse_cpu_list('3-1')
+        with pytest.raises(ValueError):
+            parse_cpu_list(' , ')
+
+    def test_budget_from_environment(self, monkeypatch):
+        monkeypatch.delenv('WORKER_CPU_BUDGET', raising=False)
+        monkeypatch.delenv('WORKER_CPUS', raising=False)
+        assert configured_cpu_budget() == CpuBudget(None, None)
+
+        monkeypatch.setenv('WORKER_CPUS', '2-5')
+        assert configured_cpu_budget() == CpuBudget(4, frozenset({2, 3, 4, 5}))
+
+        monkeypatch.setenv('WORKER_CPU_BUDGET', '2')
+        assert configured_cpu_budget().threads == 2
+
+        monkeypatch.setenv('WORKER_CPU_BUDGET', '0')
+        with pytest.raises(ValueError):
+            configured_cpu_budget()
+
+    def test_share_splits_budget_between_processes(self):
+        assert CpuBudget(8, None).share(3) == 2
+        assert CpuBudget(2, None).share(4) == 1
+        assert CpuBudget(None, None).share(4) is None
+
+    def test_apply_keeps_explicit_blas_settings(self, monkeypatch):
+        for name in BLAS_THREAD_VARS:
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setenv('MKL_NUM_THREADS', '7')
+
+        apply_process_budget(CpuBudget(3, None), blas_threads=3)
+
+        assert os.environ['OMP_NUM_THREADS'] == '3'
+        assert os.environ['OPENBLAS_NUM_THREADS'] == '3'
+        assert os.environ['MKL_NUM_THREADS'] == '7'
+        assert thread_report()['OMP_NUM_THREADS'] == '3'
+
+    @pytest.mark.skipif(not hasattr(os, 'sched_setaffinity'), reason="CPU affinity not supported")
+    def test_apply_pins_to_cpus(self):
+        original = os.sched_getaffinity(0)
+        pinned = frozenset({min(original)})
+        try:
+            apply_process_budget(CpuBudget(1, pinned), blas_threads=None)
+            assert os.sched_getaffinity(0) == pinned
+            assert thread_report()['cpus'] == sorted(pinned)
+        finally:
+            os.sched_setaffinity(0, original)
@@ -0,0 +1,273 @@
+"""
+Tests for the per-frame feature store.
+"""
+import sys
+import os
+import shutil
+from datetime import datetime, timezone
+
+import ffmpeg
+import numpy as np
+import pytest
+
+# Add the current directory to the path so we can import the analysis package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from analysis.checkpoints import AnalysisCheckpointer, FileCheckpointStore
+from analysis.frame_features import (
+    FrameEventThresholds,
+    FrameFeatures,
+    FrameFeatureWriter,
+    PERSON_CLASS_ID,
+    PHONE_CLASS_ID,
+    SliceStitcher,
+    derive_frame_events,
+    slice_stitch_frame,
+)
+
+
+def _features():
+    writer = FrameFeatureWriter(fps=2)
+    writer.add_frame(1, 1, (2.0, 45.0, 1.0), [(PHONE_CLASS_ID, 0.75, [1.0, 2.0, 3.0, 4.0])])
+    writer.add_frame(2, 0, None, [
+        (PERSON_CLASS_ID, 0.875, [0.0, 0.0, 5.0, 5.0]),
+        (PERSON_CLASS_ID, 0.625, [5.0, 0.0, 9.0, 5.0]),
+        (PHONE_CLASS_ID, 0.875, [1.0, 1.0, 2.0, 2.0]),
+    ])
+    writer.add_frame(3, 1, (0.0, -20.0, 0.0), [(PERSON_CLASS_ID, 0.375, [0.0, 0.0, 1.0, 1.0])])
+    return writer.build({'assetId': 'asset-1', 'attemptId': 'attempt-1'})
+
+
+class TestFrameFeatures:
+    def test_default_thresholds_match_analyze_frame_rules(self):
+        events = derive_frame_events(_features()).to_dicts()
+
+        assert [(event['type'], event['timestamp']) for event in events] == [
+            ('LOOK_AWAY', 0.5), ('PHONE_DETECTED', 0.5), ('MULTIPLE_PEOPLE', 1.0),
+        ]
+        assert events[0]['extra'] == {'yaw': 45.0, 'pitch': 2.0, 'roll': 1.0, 'frame_number': 1}
+        assert events[1]['extra'] == {'confidence': 0.75, 'frame_number': 1, 'bbox': [1.0, 2.0, 3.0, 4.0]}
+        # The phone after the confident person in frame 2 is not reported
+        assert events[2]['extra'] == {'person_count': 2, 'frame_number': 2}
+
+    def test_round_trip_and_rederive_with_new_thresholds(self, tmp_path):
+        path = str(tmp_path / 'asset-1.npz')
+        _features().save(path)
+        features = FrameFeatures.load(path)
+
+        assert features.metadata == {'assetId': 'asset-1', 'attemptId': 'attempt-1'}
+        assert derive_frame_events(features).to_dicts() == derive_frame_events(_features()).to_dicts()
+
+        events = derive_frame_events(features, FrameEventThresholds(look_away_yaw=15.0, person_confidence=0.7))
+        assert [(event['type'], event['timestamp']) for event in events] == [
+            ('LOOK_AWAY', 0.5), ('PHONE_DETECTED', 0.5), ('PHONE_DETECTED', 1.0), ('LOOK_AWAY', 1.5),
+        ]
+
+    def test_resume_from_checkpoint(self, tmp_path):
+        checkpointer = AnalysisCheckpointer(FileCheckpointStore(str(tmp_path)), 'job-1', interval_seconds=0)
+        complete = _features()
+
+        partial = FrameFeatureWriter(fps=2)
+        partial.add_frame(1, 1, (2.0, 45.0, 1.0), [(PHONE_CLASS_ID, 0.75, [1.0, 2.0, 3.0, 4.0])])
+        assert checkpointer.due('video')
+        checkpointer.save('video', partial.build().to_bytes())
+
+        resumed = FrameFeatureWriter.from_features(FrameFeatures.from_bytes(checkpointer.load('video')))
+        assert resumed.last_frame_number == 1
+        resumed.add_frame(2, 0, None, [
+            (PERSON_CLASS_ID, 0.875, [0.0, 0.0, 5.0, 5.0]),
+            (PERSON_CLASS_ID, 0.625, [5.0, 0.0, 9.0, 5.0]),
+            (PHONE_CLASS_ID, 0.875, [1.0, 1.0, 2.0, 2.0]),
+        ])
+        resumed.add_frame(3, 1, (0.0, -20.0, 0.0), [(PERSON_CLASS_ID, 0.375, [0.0, 0.0, 1.0, 1.0])])
+        assert derive_frame_events(resumed.build()).to_dicts() == derive_frame_events(complete).to_dicts()
+
+        checkpointer.clear()
+        assert checkpointer.load('video') is None
+
+
+class FakeRederiveConnection:
+    """A psycopg2-like connection answering fetch_attempt lookups in turn and streaming `events`"""
+
+    def __init__(self, attempts, events):
+        self.attempts = list(attempts)
+        self.events = events
+        self.statements = []
+
+    def cursor(self, cursor_factory=None, name=None):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=()):
+                connection.statements.append(' '.join(sql.split()))
+
+            def fetchone(self):
+                return connection.attempts.pop(0)
+
+            def __iter__(self):
+                return iter(connection.events)
+
+        return Cursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class TestRederiveEvents:
+    def test_public_attempt_without_start_time(self, tmp_path, monkeypatch):
+        import rederive_events
+        from analysis.risk_calculator import ImprovedRiskCalculator
+
+        path = str(tmp_path / 'asset-1.npz')
+        _features().save(path)
+        attempt = {'id': 'attempt-1', 'startedAt': None, 'completedAt': None, 'isPublic': True, 'questionCount': 10}
+        connection = FakeRederiveConnection([None, attempt], [
+            # An audio event from an earlier run comes before the first browser event
+            ('SUSPICIOUS_SILENCE', datetime(2026, 10, 1, 9, 59, 0), None),
+            ('TAB_HIDDEN', datetime(2026, 10, 1, 10, 0, 0), {'duration_seconds': 5.0}),
+        ])
+        written = {}
+        monkeypatch.setattr(rederive_events, 'replace_frame_events',
+                            lambda connection, attempt_id, events, is_public: written.update(events=events, is_public=is_public))
+        monkeypatch.setattr(rederive_events, 'write_scores',
+                            lambda connection, attempt_ids, breakdowns, is_public: written.update(scores_public=is_public))
+
+        rederive_events.rederive_asset(connection, ImprovedRiskCalculator(), path, FrameEventThresholds(), dry_run=False)
+
+        assert any('FROM "PublicTestAttempt"' in sql for sql in connection.statements)
+        assert any('FROM "PublicProctorEvent"' in sql for sql in connection.statements)
+        assert written['is_public'] and written['scores_public']
+        # Shifted to the first browser event, like the worker
+        start = datetime(2026, 10, 1, 10, 0, 0, tzinfo=timezone.utc).timestamp()
+        expected = derive_frame_events(_features())
+        expected.shift_timestamps(start)
+        assert written['events'].to_dicts() == expected.to_dicts()
+
+
+class ToyFaceTracker:
+    """
+    Stands in for FaceMesh's tracking: a clear face (2) is detected from
+    scratch, a faint one (1) only while already tracked and until the
+    tracker has drifted, and the pose depends on how long the face has been
+    tracked.
+    """
+
+    def __init__(self):
+        self.tracked = 0
+
+    def process(self, visibility):
+        keeps_faint_face = 0 < self.tracked < 4
+        self.tracked = self.tracked + 1 if visibility >= 2 or (keeps_faint_face and visibility >= 1) else 0
+        return self.tracked
+
+
+def _toy_run(visibility, start, end=None):
+    """Like VideoAnalyzer.analyze_frame_range: a fresh tracker from `start`, past `end` until a frame without a face"""
+    tracker = ToyFaceTracker()
+    writer = FrameFeatureWriter(fps=2)
+    for index in range(start, len(visibility)):
+        tracked = tracker.process(visibility[index])
+        detections = [(PHONE_CLASS_ID, 0.75, [1.0, 2.0, 3.0, 4.0])] if index % 7 == 0 else []
+        writer.add_frame(index + 1, 1 if tracked else 0, (0.0, float(tracked), 0.0) if tracked else None, detections)
+        if end is not None and index >= end - 1 and not tracked:
+            break
+    return writer.build()
+
+
+def _assert_same_features(actual, expected):
+    np.testing.assert_array_equal(actual.frame_number, expected.frame_number)
+    np.testing.assert_array_equal(actual.face_count, expected.face_count)
+    np.testing.assert_array_equal(actual.pose, expected.pose)
+    np.testing.assert_array_equal(actual.detection_frame, expected.detection_frame)
+    np.testing.assert_array_equal(actual.detection_class, expected.detection_class)
+    np.testing.assert_array_equal(actual.detection_confidence, expected.detection_confidence)
+    np.testing.assert_array_equal(actual.detection_bbox, expected.detection_bbox)
+    assert derive_frame_events(actual).to_dicts() == derive_frame_events(expected).to_dicts()
+
+
+class TestSliceStitching:
+    def test_select_frames(self):
+        selected = _features().select_frames(2, 3)
+
+        assert selected.frame_number.tolist() == [2]
+        assert selected.detection_frame.tolist() == [0, 0, 0]
+        assert selected.detection_class.tolist() == [PERSON_CLASS_ID, PERSON_CLASS_ID, PHONE_CLASS_ID]
+        assert len(_features().select_frames(4)) == 0
+
+    def test_stitch_frame(self):
+        #            frames 1  2  3  4  5  6
+        previous = _toy_run([2, 2, 0, 2, 1, 0], 0, 3)
+        assert previous.frame_number.tolist() == [1, 2, 3]
+
+        # The previous run found no face on the frame before the next one starts
+        assert slice_stitch_frame(previous, _toy_run([2, 2, 0, 2, 1, 0], 3)) == 3
+        # Both runs find no face on frame 3
+        assert slice_stitch_frame(previous, _toy_run([2, 2, 0, 2, 1, 0], 1)) == 3
+        # The next run still tracks a face where the previous one has none
+        assert slice_stitch_frame(previous, _toy_run([2, 2, 1, 2, 1, 0], 1)) is None
+
+    def test_stitched_slices_match_serial_run(self):
+        rng = np.random.default_rng(3)
+        reanalyzed = 0
+        for _ in range(200):
+            visibility = rng.choice([0, 1, 2], size=60, p=[0.25, 0.35, 0.4]).tolist()
+            slices = [(0, 12), (12, 24), (24, 36), (36, 48), (48, None)]
+
+            writer = FrameFeatureWriter(fps=2)
+            stitcher = SliceStitcher(writer)
+            for start, end in slices:
+                stitched = stitcher.add(
+                    _toy_run(visibility, start, end), lambda last_number, end=end: _toy_run(visibility, last_number, end)
+                )
+                reanalyzed += not stitched
+            stitcher.finish()
+
+            _assert_same_features(writer.build(), _toy_run(visibility, 0))
+        assert reanalyzed > 0
+
+
+class TestSlicedVideoAnalysis:
+    def test_sliced_analysis_matches_serial(self, tmp_path):
+        pytest.importorskip('cv2')
+        pytest.importorskip('mediapipe')
+        pytest.importorskip('ultralytics')
+        if shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None:
+            pytest.skip("ffmpeg is not installed")
+        from analysis.video_analysis import VideoAnalyzer
+        from benchmarks.corpus import QUICK_CORPUS, ensure_corpus
+
+        spec = next(spec for spec in QUICK_CORPUS if spec.scene == 'two_people')
+        recording, = ensure_corpus([spec], str(tmp_path))
+        # Remuxed to a pipe, like MediaRecorder output, so the header has no duration
+        streamed_path = str(tmp_path / 'streamed.webm')
+        data, _ = ffmpeg.input(recording).output('pipe:', c='copy', f='webm').run(capture_stdout=True, quiet=True)
+        with open(streamed_path, 'wb') as f:
+            f.write(data)
+
+        analyzer = VideoAnalyzer()
+        try:
+            results = {}
+            for mode, slice_workers in (('serial', 1), ('sliced', 2)):
+                analyzer.slice_workers = slice_workers
+                analyzer.slice_seconds = 3
+                if mode == 'sliced':
+                    assert len(analyzer.plan_slices(streamed_path)[1]) == 4
+                frames_dir = tmp_path / f"{mode}_frames"
+                frames_dir.mkdir()
+                features_path = str(tmp_path / f"{mode}.features")
+                events = analyzer.analyze_video(streamed_path, str(frames_dir), features_path=features_path)
+                results[mode] = (FrameFeatures.load(features_path), events.to_dicts())
+        finally:
+            analyzer.close()
+
+        _assert_same_features(results['sliced'][0], results['serial'][0])
+        assert results['sliced'][1] == results['serial'][1]
@@ -0,0 +1,54 @@
+"""
+Tests for the pre-flight media probe.
+"""
+import sys
+import os
+
+import pytest
+
+# Add the current directory to the path so we can import the analysis package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from analysis.media_probe import packet_end_time, summarize_probe
+
+
+def _probe(duration=None, stream_duration=None, codec_types=('video', 'audio')):
+    streams = [{'codec_type': codec_type} for codec_type in codec_types]
+    if stream_duration is not None:
+        streams[0]['duration'] = stream_duration
+    media_format = {'duration': duration} if duration is not None else {}
+    return {'streams': streams, 'format': media_format}
+
+
+class TestMediaProbe:
+    def test_accepts_recording_and_estimates_frames(self):
+        probe = summarize_probe(_probe(duration='600.5'), 1024)
+
+        assert probe.rejection_reason() is None
+        assert probe.duration == 600.5
+        assert probe.estimated_frames(2) == 1201
+
+    def test_duration_falls_back_to_streams_or_unknown(self):
+        assert summarize_probe(_probe(stream_duration='12.0'), 1024).duration == 12.0
+
+        probe = summarize_probe(_probe(), 1024)
+        assert probe.duration is None
+        assert probe.estimated_frames(2) is None
+        assert probe.rejection_reason() is None
+
+    def test_rejects_unanalyzable_media(self):
+        assert summarize_probe(_probe(duration='10'), 0).rejection_reason() == 'empty media'
+        assert summarize_probe(_probe(duration='10', codec_types=('audio',)), 1024).rejection_reason() == 'no video stream'
+        assert summarize_probe(_probe(duration='0'), 1024).rejection_reason() == 'zero-length media'
+
+    def test_packet_end_time(self):
+        packets = [
+            {'pts_time': '0.000000', 'duration_time': '0.033000'},
+            {'pts_time': '12.467000', 'duration_time': '0.033000'},
+            {'pts_time': '12.433000'},
+            {'pts_time': 'N/A'},
+        ]
+
+        assert packet_end_time(packets) == pytest.approx(12.5)
+        assert packet_end_time([{'pts_time': 'N/A'}]) is None
+        assert packet_end_time([]) is None
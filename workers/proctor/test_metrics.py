@@ -0,0 +1,94 @@
+"""
+Tests for the worker metrics registry and endpoint.
+"""
+import sys
+import os
+import json
+import urllib.request
+import urllib.error
+
+# Add the current directory to the path so we can import the analysis package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from analysis.metrics import MetricsRegistry, MetricsServer
+
+
+class TestMetrics:
+    def test_render_and_merge_from_another_process(self):
+        registry = MetricsRegistry()
+        stages = registry.histogram('stage_seconds', 'Stage time', ['stage'], buckets=(0.1, 1))
+        frames = registry.counter('frames_total', 'Frames')
+        stages.observe(0.05, stage='face')
+        stages.observe(0.5, stage='face')
+
+        # A slice worker records into its own registry and ships the deltas back
+        child = MetricsRegistry()
+        child.histogram('stage_seconds', 'Stage time', ['stage'], buckets=(0.1, 1)).observe(2, stage='face')
+        child.counter('frames_total', 'Frames').inc(3)
+        registry.merge(child.drain())
+
+        assert frames.value() == 3
+        assert stages.count(stage='face') == 3
+        assert child.drain() == {'stage_seconds': {}, 'frames_total': {}}
+
+        text = registry.render()
+        assert '# TYPE stage_seconds histogram' in text
+        assert 'stage_seconds_bucket{stage="face",le="0.1"} 1' in text
+        assert 'stage_seconds_bucket{stage="face",le="1.0"} 2' in text
+        assert 'stage_seconds_bucket{stage="face",le="+Inf"} 3' in text
+        assert 'stage_seconds_sum{stage="face"} 2.55' in text
+        assert 'frames_total 3' in text
+
+    def test_endpoint_serves_metrics_and_health(self):
+        registry = MetricsRegistry()
+        registry.counter('jobs_total', 'Jobs', ['outcome']).inc(outcome='completed')
+        healthy = {'value': True}
+        server = MetricsServer(0, lambda: (healthy['value'], {'database': healthy['value']}),
+                               host='127.0.0.1', registry=registry)
+        server.start()
+        try:
+            base = f"http://127.0.0.1:{server.port}"
+            with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+                assert 'jobs_total{outcome="completed"} 1' in response.read().decode()
+            with urllib.request.urlopen(f"{base}/healthz", timeout=5) as response:
+                assert json.loads(response.read()) == {'status': 'ok', 'database': True}
+
+            healthy['value'] = False
+            try:
+                urllib.request.urlopen(f"{base}/healthz", timeout=5)
+                assert False, "expected 503"
+            except urllib.error.HTTPError as e:
+                assert e.code == 503
+        finally:
+            server.stop()
+
+    def test_readiness_endpoint(self):
+        ready = {'value': False}
+        server = MetricsServer(0, lambda: (True, {}), host='127.0.0.1', registry=MetricsRegistry(),
+                               readiness_check=lambda: (ready['value'], {'ready': ready['value']}))
+        server.start()
+        try:
+            base = f"http://127.0.0.1:{server.port}"
+            try:
+                urllib.request.urlopen(f"{base}/readyz", timeout=5)
+                assert False, "expected 503"
+            except urllib.error.HTTPError as e:
+                assert e.code == 503
+                assert json.loads(e.read()) == {'status': 'not ready', 'ready': False}
+
+            ready['value'] = True
+            with urllib.request.urlopen(f"{base}/readyz", timeout=5) as response:
+                assert json.loads(response.read()) == {'status': 'ok', 'ready': True}
+        finally:
+            server.stop()
+
+    def test_readiness_endpoint_absent_without_check(self):
+        server = MetricsServer(0, lambda: (True, {}), host='127.0.0.1', registry=MetricsRegistry())
+        server.start()
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/readyz", timeout=5)
+            assert False, "expected 404"
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+        finally:
+            server.stop()
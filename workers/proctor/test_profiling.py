@@ -0,0 +1,54 @@
+"""
+Tests for opt-in job profiling.
+"""
+import sys
+import os
+import json
+import pstats
+import threading
+
+# Add the current directory to the path so we can import the analysis package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from analysis.profiling import JobProfiler
+
+
+def _busy_in_thread():
+    return sum(i * i for i in range(10000))
+
+
+class TestJobProfiler:
+    def test_sampling_needs_directory_and_honours_job_flag(self, tmp_path):
+        assert not JobProfiler(None, sample_rate=1.0).should_profile({'data': {'profile': True}})
+
+        profiler = JobProfiler(str(tmp_path), sample_rate=0.0)
+        assert profiler.should_profile({'data': {'profile': True}})
+        assert not profiler.should_profile({'data': {}})
+        assert JobProfiler(str(tmp_path), sample_rate=1.0).should_profile({'data': {}})
+
+    def test_profile_includes_worker_threads(self, tmp_path):
+        profiler = JobProfiler(str(tmp_path))
+
+        def analysis_thread():
+            with profiler.thread_profile():
+                _busy_in_thread()
+
+        with profiler.profile_job('job-1'):
+            thread = threading.Thread(target=analysis_thread)
+            thread.start()
+            thread.join()
+            data = [bytearray(1 << 20)]
+            del data
+
+        with open(tmp_path / 'job-1.json') as f:
+            summary = json.load(f)
+        assert summary['profiled_threads'] == 2
+        assert summary['peak_traced_memory_bytes'] >= 1 << 20
+
+        functions = {function for _, _, function in pstats.Stats(str(tmp_path / 'job-1.prof')).stats}
+        assert '_busy_in_thread' in functions
+
+        # Outside a profiled job, thread_profile() records nothing
+        with profiler.thread_profile():
+            _busy_in_thread()
+        assert profiler._thread_profiles == []
@@ -0,0 +1,58 @@
+"""
+Tests for the analysis result cache.
+"""
+import sys
+import os
+
+# Add the current directory to the path so we can import the analysis package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from analysis.metrics import ANALYSIS_CACHE_LOOKUPS
+from analysis.result_cache import AnalysisResultCache
+
+
+class FakeCacheConnection:
+    """A psycopg2-like connection whose SELECTs return `rows` in turn"""
+
+    def __init__(self, rows):
+        self.closed = 0
+        self.rows = list(rows)
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=()):
+                pass
+
+            def fetchone(self):
+                return connection.rows.pop(0)
+
+        return Cursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class TestAnalysisResultCache:
+    def test_lookups_are_counted(self):
+        hits_before = ANALYSIS_CACHE_LOOKUPS.value(result='hit')
+        misses_before = ANALYSIS_CACHE_LOOKUPS.value(result='miss')
+        cache = AnalysisResultCache(FakeCacheConnection([None, ([['LOOK_AWAY', 1.5, {'yaw': 45.0}]], None)]), 'v1')
+
+        assert cache.get('a' * 64) is None
+        cached = cache.get('b' * 64)
+
+        assert cached.events.to_dicts() == [{'type': 'LOOK_AWAY', 'timestamp': 1.5, 'extra': {'yaw': 45.0}}]
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert ANALYSIS_CACHE_LOOKUPS.value(result='hit') - hits_before == 1
+        assert ANALYSIS_CACHE_LOOKUPS.value(result='miss') - misses_before == 1
@@ -0,0 +1,216 @@
+"""
+Tests for the proctoring risk calculator.
+"""
+import sys
+import os
+import json
+from datetime import timezone
+
+# Add the current directory to the path so we can import the analysis package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from analysis.risk_calculator import ImprovedRiskCalculator
+from analysis.risk_rules import DEFAULT_RULES_PATH
+from analysis.event_batch import EventBatch
+from analysis.batch_scoring import BatchRiskScorer, EventColumns
+from analysis.incremental_scoring import IncrementalRiskScorer
+from analysis.risk_cache import MemoizedRiskCalculator, event_fingerprint
+
+
+def _event(event_type, timestamp, **extra):
+    event = {'type': event_type, 'timestamp': timestamp}
+    if extra:
+        event['extra'] = extra
+    return event
+
+
+class TestImprovedRiskCalculator:
+    """Scoring behaviour of ImprovedRiskCalculator."""
+
+    def setup_method(self):
+        self.calculator = ImprovedRiskCalculator()
+
+    def test_no_events(self):
+        result = self.calculator.calculate_risk_score([], test_duration_minutes=60, total_questions=30)
+        assert result['total_score'] == 0.0
+        assert result['risk_category'] == 'LOW'
+        assert result['violation_details']['total_violations'] == 0
+
+    def test_copy_search_pattern_within_lookahead(self):
+        events = [_event('COPY_DETECTED', 100), _event('TAB_HIDDEN', 120)]
+        result = self.calculator.calculate_risk_score(events, total_questions=30)
+        assert result['pattern_score'] == 10.0
+
+    def test_copy_search_pattern_outside_window(self):
+        events = [_event('COPY_DETECTED', 100), _event('TAB_HIDDEN', 131)]
+        result = self.calculator.calculate_risk_score(events, total_questions=30)
+        assert result['pattern_score'] == 0.0
+
+    def test_copy_search_pattern_beyond_nine_events(self):
+        events = [_event('COPY_DETECTED', 100)]
+        events += [_event('LOOK_AWAY', 101) for _ in range(9)]
+        events.append(_event('TAB_HIDDEN', 102))
+        result = self.calculator.calculate_risk_score(events, total_questions=30)
+        assert result['pattern_score'] == 0.0
+
+    def test_unsorted_input_is_ordered_by_timestamp(self):
+        events = [_event('TAB_SWITCH', 110), _event('TAB_SWITCH', 100), _event('TAB_SWITCH', 200)]
+        result = self.calculator.calculate_risk_score(events, total_questions=30)
+        # Three switches within 120 s at a 10% switching rate
+        assert result['pattern_score'] == 20.0
+
+    def test_temporal_clustering_per_minute(self):
+        events = [_event('PHONE_DETECTED', t) for t in (60, 70, 119)]
+        events.append(_event('PHONE_DETECTED', 120))
+        result = self.calculator.calculate_risk_score(events, total_questions=30)
+        assert result['temporal_score'] == 24.0
+
+    def test_rules_reload_on_file_change(self, tmp_path):
+        rules_path = tmp_path / 'risk_rules.json'
+        with open(DEFAULT_RULES_PATH) as f:
+            rules = json.load(f)
+        rules_path.write_text(json.dumps(rules))
+
+        calculator = ImprovedRiskCalculator(rules_path=str(rules_path))
+        calculator.rules_source.check_interval = 0
+        events = [_event('PASTE_DETECTED', 1)]
+        before = calculator.calculate_risk_score(events, total_questions=30)
+        assert before['rule_version'] == rules['version']
+
+        rules['version'] += 1
+        rules['risk_weights']['PASTE_DETECTED'] *= 2
+        rules_path.write_text(json.dumps(rules))
+        os.utime(rules_path, ns=(0, os.stat(rules_path).st_mtime_ns + 1))
+
+        after = calculator.calculate_risk_score(events, total_questions=30)
+        assert after['rule_version'] == rules['version']
+        assert after['base_score'] == before['base_score'] * 2
+
+    def test_rules_changed_without_version_bump_are_not_loaded(self, tmp_path):
+        rules_path = tmp_path / 'risk_rules.json'
+        with open(DEFAULT_RULES_PATH) as f:
+            rules = json.load(f)
+        rules_path.write_text(json.dumps(rules))
+
+        calculator = ImprovedRiskCalculator(rules_path=str(rules_path))
+        calculator.rules_source.check_interval = 0
+        events = [_event('PASTE_DETECTED', 1)]
+        before = calculator.calculate_risk_score(events, total_questions=30)
+
+        rules['risk_weights']['PASTE_DETECTED'] *= 2
+        rules_path.write_text(json.dumps(rules))
+        os.utime(rules_path, ns=(0, os.stat(rules_path).st_mtime_ns + 1))
+
+        assert calculator.calculate_risk_score(events, total_questions=30) == before
+
+    def test_event_batch_scores_like_dicts(self):
+        events = [
+            _event('LOOK_AWAY', 12.5, yaw=-72.0, pitch=3.0, roll=1.0, frame_number=25),
+            _event('PHONE_DETECTED', 13.0, confidence=0.9, frame_number=26, bbox=[1.0, 2.0, 3.0, 4.0]),
+            _event('TAB_HIDDEN', 14.0, duration_seconds=45.0),
+            _event('COPY_DETECTED', 2.0, text_length=80),
+            _event('LOOK_AWAY', 1.0, yaw=50.0),
+        ]
+        batch = EventBatch.from_dicts(events)
+
+        assert batch.to_dicts() == events
+        assert self.calculator.calculate_risk_score(batch, 45, 12) == self.calculator.calculate_risk_score(events, 45, 12)
+
+    def test_merged_batch_in_time_order(self):
+        browser = EventBatch.from_dicts([_event('TAB_HIDDEN', 1000.0, duration_seconds=40.0), _event('COPY_DETECTED', 1030.0)])
+        analysis = EventBatch.from_dicts([_event('PHONE_DETECTED', 20.0, confidence=0.8), _event('LOOK_AWAY', 5.0, yaw=60.0)])
+        analysis.shift_timestamps(1000.0)
+
+        merged = EventBatch.concat([browser, analysis])
+        merged = merged.take(merged.time_order())
+
+        assert [event['type'] for event in merged] == ['TAB_HIDDEN', 'LOOK_AWAY', 'PHONE_DETECTED', 'COPY_DETECTED']
+        assert merged[1] == _event('LOOK_AWAY', 1005.0, yaw=60.0)
+        expected = sorted(browser.to_dicts() + analysis.to_dicts(), key=lambda event: event['timestamp'])
+        assert self.calculator.calculate_risk_score(merged, 45, 12) == self.calculator.calculate_risk_score(expected, 45, 12)
+
+    def test_violation_summary_counts(self):
+        events = [_event('TAB_HIDDEN', 1), _event('LOOK_AWAY', 2, yaw=80), _event('TAB_HIDDEN', 3)]
+        result = self.calculator.calculate_risk_score(events, total_questions=30)
+        assert result['violation_details']['high_risk_violations'] == {'TAB_HIDDEN': 2}
+        assert result['violation_details']['total_violations'] == 3
+
+
+class TestBatchRiskScorer:
+    """Batch scoring must match per-attempt scoring exactly."""
+
+    def test_matches_calculate_risk_score(self):
+        calculator = ImprovedRiskCalculator()
+        attempts = {
+            'a': [_event('COPY_DETECTED', 100, text_length=120), _event('TAB_HIDDEN', 110, duration_seconds=40),
+                  _event('TAB_SWITCH', 150), _event('TAB_HIDDEN', 160, duration_seconds=30)],
+            'b': [],
+            'c': [_event('LOOK_AWAY', 5, yaw=50), _event('PHONE_DETECTED', 3), _event('PHONE_DETECTED', 30),
+                  _event('MULTIPLE_PEOPLE', 31), _event('DEVTOOLS_DETECTED', 40), _event('LOOK_AWAY', 2, yaw=80)],
+        }
+        durations = [20, 60, 150]
+        questions = [4, 30, 12]
+
+        columns = EventColumns.from_event_lists(list(attempts), list(attempts.values()))
+        results = BatchRiskScorer(calculator).score(columns, durations, questions)
+
+        for result, events, duration, total_questions in zip(results, attempts.values(), durations, questions):
+            assert result == calculator.calculate_risk_score(events, duration, total_questions)
+
+    def test_database_rows_are_read_as_utc(self, monkeypatch):
+        import time
+        from datetime import datetime
+        if not hasattr(time, 'tzset'):
+            return
+        monkeypatch.setenv('TZ', 'America/New_York')
+        time.tzset()
+        try:
+            columns = EventColumns.from_rows(['a'], [('a', 'TAB_SWITCH', datetime(2024, 1, 1, 12, 0), None)])
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+        assert columns.timestamp[0] == datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+
+
+class TestIncrementalRiskScorer:
+    """Incremental updates must match a full recompute."""
+
+    def test_out_of_order_updates_with_persisted_state(self):
+        calculator = ImprovedRiskCalculator()
+        events = [
+            _event('TAB_HIDDEN', 200, duration_seconds=20), _event('COPY_DETECTED', 190, text_length=60),
+            _event('LOOK_AWAY', 10, yaw=75), _event('TAB_SWITCH', 250), _event('COPY_DETECTED', 185),
+            _event('TAB_SWITCH', 195), _event('PHONE_DETECTED', 205), _event('TAB_HIDDEN', 210, duration_seconds=45),
+        ]
+
+        scorer = IncrementalRiskScorer(test_duration_minutes=25, total_questions=8, calculator=calculator)
+        for end in range(1, len(events) + 1):
+            result = scorer.update(events[end - 1:end])
+            assert result == calculator.calculate_risk_score(events[:end], 25, 8)
+            scorer = IncrementalRiskScorer.from_dict(json.loads(json.dumps(scorer.to_dict())), calculator)
+
+
+class TestMemoizedRiskCalculator:
+    """Memoized results must equal fresh ones and be keyed on all inputs."""
+
+    def test_hits_and_key_inputs(self):
+        from analysis.metrics import RISK_CACHE_LOOKUPS
+        hits_before, misses_before = RISK_CACHE_LOOKUPS.value(result='hit'), RISK_CACHE_LOOKUPS.value(result='miss')
+        calculator = ImprovedRiskCalculator()
+        memo = MemoizedRiskCalculator(calculator, max_entries=2)
+        events = [_event('TAB_HIDDEN', 1, duration_seconds=40), _event('LOOK_AWAY', 2, yaw=80)]
+        batch = EventBatch.from_dicts(events)
+
+        first = memo.calculate_risk_score(batch, 30, 10)
+        first['total_score'] = -1
+        assert memo.calculate_risk_score(EventBatch.from_dicts(events), 30, 10) == calculator.calculate_risk_score(events, 30, 10)
+        assert memo.stats()['hits'] == 1
+
+        memo.calculate_risk_score(batch, 30, 12)
+        memo.calculate_risk_score(events[::-1], 30, 10)
+        assert memo.stats()['misses'] == 3
+        assert memo.stats()['entries'] == 2
+        assert event_fingerprint(events) != event_fingerprint(events[::-1])
+        # Also exported on /metrics
+        assert RISK_CACHE_LOOKUPS.value(result='hit') - hits_before == 1
+        assert RISK_CACHE_LOOKUPS.value(result='miss') - misses_before == 3
@@ -0,0 +1,85 @@
+"""
+Tests for structured logging and trace spans.
+"""
+import sys
+import os
+import json
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Add the current directory to the path so we can import the analysis package
+sys.path.insert(0, os.path.dirname(__file__))
+
+from analysis.tracing import FileSpanExporter, JsonLogFormatter, Tracer, log_context, STATUS_ERROR
+
+
+def _spans(path):
+    with open(path) as f:
+        documents = [json.loads(line) for line in f]
+    return [
+        [span for resource in document['resourceSpans'] for scope in resource['scopeSpans'] for span in scope['spans']]
+        for document in documents
+    ]
+
+
+class TestTracing:
+    def test_job_trace_nests_spans_across_threads(self, tmp_path):
+        path = str(tmp_path / 'traces.jsonl')
+        tracer = Tracer()
+        tracer.configure([FileSpanExporter(path)])
+
+        def analysis(name):
+            with tracer.span(name):
+                with tracer.span('extract'):
+                    pass
+
+        with tracer.span('job', job_id='job-1') as job_span:
+            with tracer.span('claim'):
+                pass
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                for future in [executor.submit(contextvars.copy_context().run, analysis, name)
+                               for name in ('video', 'audio')]:
+                    future.result()
+
+        (spans,) = _spans(path)
+        by_name = {}
+        for span in spans:
+            by_name.setdefault(span['name'], []).append(span)
+        assert {span['traceId'] for span in spans} == {job_span.trace_id}
+        assert 'parentSpanId' not in by_name['job'][0]
+        assert by_name['job'][0]['attributes'] == [{'key': 'job_id', 'value': {'stringValue': 'job-1'}}]
+        for name in ('claim', 'video', 'audio'):
+            assert by_name[name][0]['parentSpanId'] == job_span.span_id
+        analysis_ids = {by_name['video'][0]['spanId'], by_name['audio'][0]['spanId']}
+        assert {span['parentSpanId'] for span in by_name['extract']} == analysis_ids
+
+    def test_discarded_and_failed_traces(self, tmp_path):
+        path = str(tmp_path / 'traces.jsonl')
+        tracer = Tracer()
+        tracer.configure([FileSpanExporter(path)])
+
+        with tracer.span('job') as job_span:
+            with tracer.span('claim'):
+                pass
+            job_span.discard()
+        with pytest.raises(ValueError):
+            with tracer.span('job'):
+                raise ValueError('corrupt media')
+
+        (spans,) = _spans(path)
+        assert spans[0]['status'] == {'code': STATUS_ERROR, 'message': 'ValueError: corrupt media'}
+
+    def test_json_logs_carry_context_and_span(self):
+        tracer = Tracer()
+        record = logging.LogRecord('worker', logging.INFO, __file__, 1, 'Processing job: %s', ('job-1',), None)
+        with log_context(job_id='job-1', attempt_id='attempt-1', asset_id=None):
+            with tracer.span('job') as span:
+                entry = json.loads(JsonLogFormatter().format(record))
+
+        assert entry['message'] == 'Processing job: job-1'
+        assert entry['job_id'] == 'job-1' and entry['attempt_id'] == 'attempt-1'
+        assert 'asset_id' not in entry
+        assert (entry['trace_id'], entry['span_id']) == (span.trace_id, span.span_id)
@@ -4,6 +4,7 @@ Basic tests for the proctor worker module.
 import pytest
 import sys
 import os
+import subprocess
 
 # Add the current directory to the path so we can import worker
 sys.path.insert(0, os.path.dirname(__file__))
@@ -18,6 +19,17 @@ def test_worker_module_imports():
         pytest.fail(f"Failed to import worker module: {e}")
 
 
+def test_worker_import_defers_heavy_dependencies():
+    """Importing the worker loads no model framework; analyzers import them when built."""
+    heavy = ('cv2', 'mediapipe', 'torch', 'ultralytics', 'pyannote', 'webrtcvad')
+    output = subprocess.run(
+        [sys.executable, '-c', f"import sys, worker; print(sorted(set({heavy!r}) & set(sys.modules)))"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+    ).stdout
+
+    assert output.strip() == '[]'
+
+
 def test_basic_math():
     """Simple test to ensure pytest is working."""
     assert 1 + 1 == 2
@@ -47,4 +59,451 @@ class TestWorkerFunctionality:
         """Test basic worker functionality."""
         # This is a placeholder test
         # Add actual worker function tests here as you develop
-        assert True 
\ No newline at end of file
+        assert True 
+
+class PipelineStubWorker:
+    """The parts of ProctorWorker the async pipeline uses, with timed stand-in stages"""
+
+    def __init__(self, job_count, analysis_seconds=0.2):
+        import threading
+        from worker import AsyncLeaseHeartbeat
+        from analysis.profiling import JobProfiler
+
+        self.worker_api_url, self.worker_api_token = 'http://queue', 'token'
+        self.shutdown_requested = threading.Event()
+        self.shutdown_grace_seconds = 5
+        self.current_checkpoint = None
+        self.heartbeat = AsyncLeaseHeartbeat(lambda job_ids: None, 60)
+        self.profiler = JobProfiler(None)
+        self.analysis_seconds = analysis_seconds
+        self.pending = [{'id': f"job-{i}", 'data': {'assetId': f"asset-{i}", 'attemptId': f"attempt-{i}"}}
+                        for i in range(job_count)]
+        self.log = []
+        self.outcomes = {}
+        self._lock = threading.Lock()
+
+    def _record(self, entry):
+        with self._lock:
+            self.log.append(entry)
+
+    def open_lane_connection(self):
+        pass
+
+    def clear_ready(self):
+        pass
+
+    def get_next_job(self):
+        with self._lock:
+            return self.pending.pop(0) if self.pending else None
+
+    def prepare_job(self, job):
+        import tempfile
+        from worker import PreparedJob
+        self._record(('prepared', job['id']))
+        return PreparedJob(job, tempfile.mkdtemp(prefix='pipeline_test_'))
+
+    def lookup_cached_analysis(self, prepared):
+        return True
+
+    def analyze_job(self, prepared):
+        import time
+        self._record(('analysis_started', prepared.job['id']))
+        time.sleep(self.analysis_seconds)
+        prepared.events = []
+        self._record(('analysis_finished', prepared.job['id']))
+        return True
+
+    def persist_job(self, prepared):
+        self._record(('persisted', prepared.job['id']))
+        return True
+
+    def complete_job(self, job_id, success=True, error=None, retry=True):
+        self.outcomes[job_id] = 'completed' if success else 'failed'
+        return True
+
+    def release_job(self, job_id):
+        self.outcomes[job_id] = 'released'
+        return True
+
+    def record_outcome(self, job, success, error):
+        if len(self.outcomes) == 3 and not self.pending:
+            self.shutdown_requested.set()
+
+
+class TestAsyncJobPipeline:
+    def test_next_job_is_downloaded_while_one_is_analyzed(self):
+        import asyncio
+        from worker import AsyncJobPipeline
+
+        worker = PipelineStubWorker(3)
+        pipeline = AsyncJobPipeline(worker, prefetch_jobs=1, idle_seconds=0.05)
+        asyncio.run(asyncio.wait_for(pipeline.run(), 30))
+
+        assert worker.outcomes == {'job-0': 'completed', 'job-1': 'completed', 'job-2': 'completed'}
+        log = worker.log
+        # Job 1 is downloaded before job 0's analysis ends, and jobs are analyzed one at a time in order
+        assert log.index(('prepared', 'job-1')) < log.index(('analysis_finished', 'job-0'))
+        analysis = [entry for entry in log if entry[0].startswith('analysis')]
+        assert analysis == [(stage, f"job-{i}") for i in range(3) for stage in ('analysis_started', 'analysis_finished')]
+        assert not pipeline.drain_timed_out
+
+    def test_shutdown_releases_prefetched_jobs(self):
+        import asyncio
+        import threading
+        from worker import AsyncJobPipeline
+
+        worker = PipelineStubWorker(3, analysis_seconds=0.5)
+        pipeline = AsyncJobPipeline(worker, prefetch_jobs=1, idle_seconds=0.05)
+        threading.Timer(0.2, worker.shutdown_requested.set).start()
+        asyncio.run(asyncio.wait_for(pipeline.run(), 30))
+
+        # The job being analyzed finishes; the prefetched one goes back to the queue
+        assert worker.outcomes == {'job-0': 'completed', 'job-1': 'released'}
+        assert worker.pending == [{'id': 'job-2', 'data': {'assetId': 'asset-2', 'attemptId': 'attempt-2'}}]
+
+    def test_shutdown_releases_prefetched_jobs_in_db(self, monkeypatch):
+        import asyncio
+        import threading
+        import worker as worker_module
+        from worker import AsyncJobPipeline, ProctorWorker
+
+        class DirectDbStubWorker(PipelineStubWorker):
+            """Direct DB mode: lane connections and the release go through ProctorWorker's own code"""
+            db_connection = ProctorWorker.db_connection
+            open_lane_connection = ProctorWorker.open_lane_connection
+            release_job = ProctorWorker.release_job
+            _release_job_in_db = ProctorWorker._release_job_in_db
+
+        opened = []
+
+        def connect(**params):
+            opened.append((threading.current_thread().name, RecordingConnection()))
+            return opened[-1][1]
+
+        monkeypatch.setattr(worker_module.psycopg2, 'connect', connect)
+        worker = DirectDbStubWorker(3, analysis_seconds=0.5)
+        worker.worker_api_url = worker.worker_api_token = None
+        worker.db_params = {}
+        worker._db_connection = RecordingConnection()
+        worker._lane = threading.local()
+        worker._lane_connections, worker._lane_connections_lock = [], threading.Lock()
+        pipeline = AsyncJobPipeline(worker, prefetch_jobs=1, idle_seconds=0.05)
+        threading.Timer(0.2, worker.shutdown_requested.set).start()
+        asyncio.run(asyncio.wait_for(pipeline.run(), 30))
+
+        # The prefetched job is released on the queue lane's own connection, undoing the claim's retry bump
+        assert worker.outcomes == {'job-0': 'completed'}
+        statements = [(thread, sql, params) for thread, connection in opened for sql, params in connection.statements]
+        (thread, sql, params), = statements
+        assert thread.startswith('queue') and params == ('job-1',)
+        assert sql.startswith("UPDATE pgboss.job SET state = 'created'") and 'retryCount - 1' in sql
+        assert worker._db_connection.statements == []
+
+    def test_drain_deadline_releases_job_being_analyzed(self):
+        import asyncio
+        import threading
+        from worker import AsyncJobPipeline
+
+        worker = PipelineStubWorker(1, analysis_seconds=1.0)
+        worker.shutdown_grace_seconds = 0.1
+        pipeline = AsyncJobPipeline(worker, prefetch_jobs=0, idle_seconds=0.05)
+        threading.Timer(0.2, worker.shutdown_requested.set).start()
+        asyncio.run(asyncio.wait_for(pipeline.run(), 30))
+
+        assert worker.outcomes == {'job-0': 'released'}
+        assert pipeline.drain_timed_out
+
+    def test_lane_connection_is_per_thread(self, monkeypatch):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        import worker as worker_module
+        from worker import ProctorWorker
+
+        monkeypatch.setattr(worker_module.psycopg2, 'connect', lambda **params: object())
+        worker = ProctorWorker.__new__(ProctorWorker)
+        worker.db_params = {}
+        worker._db_connection = object()
+        worker._lane = threading.local()
+        worker._lane_connections = []
+        worker._lane_connections_lock = threading.Lock()
+
+        lane = ThreadPoolExecutor(max_workers=1, initializer=worker.open_lane_connection)
+        try:
+            lane_connection = lane.submit(lambda: worker.db_connection).result()
+        finally:
+            lane.shutdown()
+
+        assert worker._lane_connections == [lane_connection]
+        assert worker.db_connection is worker._db_connection
+
+    @pytest.mark.skipif(not os.getenv('LOADTEST_DATABASE_URL'), reason="LOADTEST_DATABASE_URL not set")
+    def test_jobs_run_end_to_end_on_lane_connections(self, monkeypatch):
+        """Real download, scoring and persistence against a disposable Postgres database"""
+        import asyncio
+        import threading
+        from collections import defaultdict
+        from worker import AsyncJobPipeline
+        from benchmarks.load import _simulated_worker_class
+        from benchmarks.local_db import DisposableDatabase, synthetic_assets
+
+        monkeypatch.setenv('ASYNC_PIPELINE', '1')
+        monkeypatch.delenv('WORKER_API_URL', raising=False)
+        monkeypatch.delenv('WORKER_API_TOKEN', raising=False)
+
+        class ConnectionRecordingWorker(_simulated_worker_class(0.05)):
+            """Records which thread used which connection in each job stage"""
+
+            def _record(self, stage):
+                with self._usage_lock:
+                    self.usage[stage].add((threading.get_ident(), id(self.db_connection)))
+
+            def get_next_job(self):
+                self._record('claim')
+                return super().get_next_job()
+
+            def prepare_job(self, job_data):
+                self._record('prepare')
+                return super().prepare_job(job_data)
+
+            def persist_job(self, prepared):
+                self._record('persist')
+                return super().persist_job(prepared)
+
+        with DisposableDatabase(os.environ['LOADTEST_DATABASE_URL']) as db:
+            seeded = db.queue_jobs(db.seed(synthetic_assets(4, 64 * 1024)))
+            worker = ConnectionRecordingWorker(db.params)
+            worker.usage, worker._usage_lock = defaultdict(set), threading.Lock()
+
+            def stop_when_done():
+                while db.unfinished_jobs():
+                    threading.Event().wait(0.1)
+                worker.shutdown_requested.set()
+
+            threading.Thread(target=stop_when_done, daemon=True).start()
+            try:
+                asyncio.run(asyncio.wait_for(AsyncJobPipeline(worker, prefetch_jobs=2, idle_seconds=0.05).run(), 60))
+            finally:
+                worker.shutdown_requested.set()
+                worker.analysis_executor.shutdown()
+                for connection in [worker._db_connection, *worker._lane_connections]:
+                    connection.close()
+
+            assert {job['state'] for job in db.job_times()} == {'completed'}
+            with db.connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM "TestAttempt" WHERE "riskScore" IS NOT NULL')
+                assert cursor.fetchone()[0] == len(seeded)
+            db.connection.commit()
+
+        # One thread and one connection per lane: the queue and download lanes
+        # have their own, and persistence uses the worker's
+        users = defaultdict(set)
+        for stage, uses in worker.usage.items():
+            assert len({thread for thread, _ in uses}) == 1, stage
+            for thread, connection in uses:
+                users[connection].add(thread)
+        assert all(len(threads) == 1 for threads in users.values())
+        connections = {stage: {connection for _, connection in uses} for stage, uses in worker.usage.items()}
+        assert connections['persist'] == {id(worker._db_connection)}
+        assert len(connections['claim'] | connections['prepare'] | connections['persist']) == 3
+        assert len(worker._lane_connections) == 2
+
+
+class RecordingConnection:
+    """A psycopg2-like connection that records the statements it runs"""
+
+    def __init__(self):
+        self.closed = 0
+        self.statements = []
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=()):
+                connection.statements.append((' '.join(sql.split()), params))
+
+        return Cursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class TestRejectedMedia:
+    """Media rejected by pre-flight checks fails its job for good in both queue modes"""
+
+    def _worker(self, api_url=None, checkpoint_store=None):
+        import threading
+        from worker import MediaRejected, ProctorWorker
+        from analysis.profiling import JobProfiler
+
+        worker = ProctorWorker.__new__(ProctorWorker)
+        worker.worker_api_url, worker.worker_api_token = (api_url, 'secret') if api_url else (None, None)
+        worker._db_connection = RecordingConnection()
+        worker._lane = threading.local()
+        worker.profiler = JobProfiler(None)
+        worker.analyzer_version = 'v' * 64
+        worker.checkpoint_store = checkpoint_store
+        worker.checkpoint_max_age_seconds = 24 * 3600
+        worker._checkpoints_pruned_at = float('-inf')
+
+        def process_video(job):
+            if job['data']['assetId'] == 'empty':
+                raise MediaRejected("empty media for asset empty")
+            return False
+
+        worker.process_video = process_video
+        return worker
+
+    def test_api_mode_fails_rejected_job_without_retry(self):
+        from benchmarks.fake_queue import FakeQueue, FakeQueueServer
+
+        queue = FakeQueue()
+        server = FakeQueueServer(queue, token='secret')
+        server.start()
+        try:
+            worker = self._worker(server.url)
+            rejected = queue.enqueue({'schemaVersion': 1, 'assetId': 'empty'}, retry_limit=3)
+            failed = queue.enqueue({'schemaVersion': 1, 'assetId': 'other'}, retry_limit=3)
+            for _ in range(2):
+                job = queue.claim()
+                worker.handle_job({'id': job.id, 'data': job.data})
+        finally:
+            server.stop()
+
+        states = {job.id: (job.state, job.retry_count) for job in queue.jobs()}
+        assert states == {rejected: ('failed', 1), failed: ('retry', 1)}
+
+    def test_db_mode_fails_rejected_job(self):
+        worker = self._worker()
+
+        worker.handle_job({'id': 'job-1', 'data': {'assetId': 'empty'}})
+
+        (sql, params), = worker._db_connection.statements
+        assert "SET state = 'failed'" in sql
+        assert params == ('{"error": "empty media for asset empty"}', 'job-1')
+
+    def test_final_failure_clears_checkpoints(self, tmp_path):
+        from analysis.checkpoints import FileCheckpointStore
+
+        store = FileCheckpointStore(str(tmp_path))
+        for job_id in ('job-1', 'job-2'):
+            store.save(f"{job_id}.{'v' * 16}", 'video', b'state')
+
+        # Failures are final in direct DB mode
+        self._worker(checkpoint_store=store).complete_job('job-1', False)
+        assert store.load(f"job-1.{'v' * 16}", 'video') is None
+
+        # Through the API a retryable failure keeps its checkpoints for the next attempt
+        worker = self._worker('http://queue', checkpoint_store=store)
+        worker._complete_job_via_api = lambda job_id, success, error, retry: True
+        worker.complete_job('job-2', False)
+        assert store.load(f"job-2.{'v' * 16}", 'video') == b'state'
+        worker.complete_job('job-2', False, error='rejected', retry=False)
+        assert store.load(f"job-2.{'v' * 16}", 'video') is None
+
+
+class RecordingAnalysisCache:
+    def __init__(self):
+        self.puts = []
+
+    def get(self, content_hash):
+        return None
+
+    def put(self, content_hash, events, features):
+        self.puts.append((content_hash, events, features))
+
+
+class StubAudioAnalyzer:
+    def analyze_audio(self, video_path, audio_path, checkpoint=None):
+        from analysis.event_batch import EventBatch
+        events = EventBatch()
+        events.append('BACKGROUND_NOISE', 2.0, None)
+        return events
+
+
+class TestAnalysisCaching:
+    """Only analyses both analyzers completed may be cached"""
+
+    def _worker(self, video_analyzer):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from worker import ProctorWorker
+        from analysis.profiling import JobProfiler
+
+        worker = ProctorWorker.__new__(ProctorWorker)
+        worker.analysis_executor = ThreadPoolExecutor(max_workers=2)
+        worker.profiler = JobProfiler(None)
+        worker._analyzers_lock = threading.Lock()
+        worker._video_analyzer = video_analyzer
+        worker._audio_analyzer = StubAudioAnalyzer()
+        worker.analysis_cache = RecordingAnalysisCache()
+        worker.current_checkpoint = None
+        return worker
+
+    def _prepared(self, tmp_path):
+        from worker import PreparedJob
+        prepared = PreparedJob({'id': 'job-1', 'data': {'assetId': 'asset-1', 'attemptId': 'attempt-1'}},
+                               str(tmp_path))
+        prepared.content_hash = 'a' * 64
+        os.makedirs(prepared.frames_dir, exist_ok=True)
+        return prepared
+
+    def test_incomplete_video_analysis_is_not_cached(self, tmp_path):
+        from analysis.errors import AnalysisIncomplete
+
+        class FailingVideoAnalyzer:
+            def analyze_video(self, *args):
+                raise AnalysisIncomplete("Failed to extract frames")
+
+        worker = self._worker(FailingVideoAnalyzer())
+        prepared = self._prepared(tmp_path)
+        assert worker.analyze_job(prepared)
+        worker.cache_analysis(prepared)
+
+        # The job keeps the audio events, but nothing is cached for the content
+        assert not prepared.complete
+        assert [prepared.events.type_name(row) for row in range(len(prepared.events))] == ['BACKGROUND_NOISE']
+        assert worker.analysis_cache.puts == []
+
+    def test_complete_analysis_is_cached(self, tmp_path):
+        from analysis.event_batch import EventBatch
+
+        class EmptyVideoAnalyzer:
+            def analyze_video(self, *args):
+                return EventBatch()
+
+        worker = self._worker(EmptyVideoAnalyzer())
+        prepared = self._prepared(tmp_path)
+        assert worker.analyze_job(prepared)
+        worker.cache_analysis(prepared)
+
+        assert prepared.complete
+        assert len(worker.analysis_cache.puts) == 1
+
+    def test_failed_frame_extraction_is_not_cached(self, tmp_path):
+        pytest.importorskip('cv2')
+        pytest.importorskip('mediapipe')
+        from analysis.video_analysis import VideoAnalyzer
+
+        # No models are needed: analysis stops at frame extraction
+        video_analyzer = VideoAnalyzer.__new__(VideoAnalyzer)
+        video_analyzer.fps = 2
+        video_analyzer.slice_workers = 1
+        video_analyzer.extract_frames = lambda video_path, frames_dir, fps=2: False
+
+        worker = self._worker(video_analyzer)
+        prepared = self._prepared(tmp_path)
+        worker.analyze_job(prepared)
+        worker.cache_analysis(prepared)
+
+        assert not prepared.complete
+        assert worker.analysis_cache.puts == []
@@ -14,101 +14,679 @@ Uses PostgreSQL for job queue management (pg-boss schema)
 import os
 import sys
 import json
+import asyncio
+import hashlib
 import tempfile
 import shutil
 import logging
 import time
+import signal
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Set, Tuple, Any
+
+# Startup phases are timed from here; the standard library above is cheap
+_IMPORTS_STARTED = time.perf_counter()
+
+# Pin the process and size the BLAS / OpenMP pools before anything below
+# imports numpy. WORKER_CPU_BUDGET and WORKER_CPUS are read from the process
+# environment: .env is loaded too late for them.
+from analysis.cpu_budget import apply_process_budget, configure_native_threads, configured_cpu_budget, thread_report
+CPU_BUDGET = configured_cpu_budget()
+apply_process_budget(CPU_BUDGET, CPU_BUDGET.share(int(os.getenv("VIDEO_SLICE_WORKERS", "1"))))
+
 import requests
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
 from dotenv import load_dotenv
 
-# Import analysis modules
-from analysis.video_analysis import VideoAnalyzer
-from analysis.audio_analysis import AudioAnalyzer
+# Import analysis modules. The analyzers (OpenCV, MediaPipe, torch) are
+# imported when first built; see ProctorWorker.video_analyzer.
 from analysis.risk_calculator import ImprovedRiskCalculator as RiskCalculator
+from analysis.event_batch import ANALYSIS_EVENT_TYPES, EventBatch
+from analysis.frame_features import ANALYSIS_FPS, FrameFeatures, feature_store_path
+from analysis.errors import AnalysisIncomplete
+from analysis.result_cache import AnalysisResultCache, analyzer_version, configured_model_path
+from analysis.checkpoints import AnalysisCheckpointer, FileCheckpointStore, PostgresCheckpointStore
+from analysis.risk_cache import MemoizedRiskCalculator, PostgresRiskResultStore
+from analysis.media_probe import probe_media
+from analysis.profiling import JobProfiler
+from analysis.metrics import (
+    BYTES_READ, EVENTS_EMITTED, JOBS, QUEUE_CLAIM_SECONDS, STAGE_SECONDS, STARTUP_SECONDS, MetricsServer,
+    stage_timer, startup_timer,
+)
+from analysis.tracing import TRACER, FileSpanExporter, OtlpHttpSpanExporter, configure_logging, log_context
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORTS_STARTED
+STARTUP_SECONDS.observe(IMPORT_SECONDS, phase='imports')
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging; LOG_FORMAT=json writes one JSON object per line with
+# the job, attempt and asset ids and the trace and span ids
+configure_logging(json_format=os.getenv("LOG_FORMAT", "text") == "json")
 logger = logging.getLogger(__name__)
 PROCTOR_ANALYSIS_JOB_SCHEMA_VERSION = 1
 
+# Assets are read from the bytea column in slices of this size
+DOWNLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+# Claim order for JOB_SIZE_PREFERENCE: oldest first, smallest assets first, or largest first
+JOB_SIZE_PREFERENCES = ('fifo', 'small', 'large')
+
+
+class MediaRejected(Exception):
+    """The job's media failed pre-flight checks; retrying will not help"""
+
+
+class JobDrainTimeout(BaseException):
+    """Raised in the main thread when in-flight work outlives the shutdown deadline"""
+
+
+class PreparedJob:
+    """
+    A claimed job whose media has been downloaded and checked, with the
+    working files of its temporary directory and the analysis results the
+    later stages add
+    """
+
+    def __init__(self, job: Dict, temp_dir: str):
+        data = job['data']
+        self.job = job
+        self.asset_id = data['assetId']
+        self.attempt_id = data['attemptId']
+        self.temp_dir = temp_dir
+        self.video_path = os.path.join(temp_dir, 'video.webm')
+        self.frames_dir = os.path.join(temp_dir, 'frames')
+        self.audio_path = os.path.join(temp_dir, 'audio.wav')
+        self.features_path = feature_store_path(self.asset_id) or os.path.join(temp_dir, 'features.npz')
+        self.features_metadata = {'assetId': self.asset_id, 'attemptId': self.attempt_id}
+        self.content_hash: Optional[str] = None
+        self.checkpoint: Optional[AnalysisCheckpointer] = None
+        self.events: Optional[EventBatch] = None
+        self.cached = False      # events came from the analysis result cache
+        self.complete = False    # both analyzers succeeded
+
+    def close(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+class JobLeaseHeartbeat(threading.Thread):
+    """
+    Periodically extends the queue lease of the jobs this worker holds, so
+    that analyses longer than the pg-boss expiry are not handed to another
+    worker. Failures are logged and retried on the next beat.
+    """
+
+    def __init__(self, extend: Callable[[List[str]], None], interval_seconds: float):
+        super().__init__(name='job-heartbeat', daemon=True)
+        self.extend = extend
+        self.interval_seconds = interval_seconds
+        self._jobs: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def track(self, job_id: str):
+        with self._lock:
+            self._jobs.add(job_id)
+
+    def untrack(self, job_id: str):
+        with self._lock:
+            self._jobs.discard(job_id)
+
+    def run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            with self._lock:
+                job_ids = sorted(self._jobs)
+            if not job_ids:
+                continue
+            try:
+                self.extend(job_ids)
+            except Exception as e:
+                logger.error(f"Failed to extend job leases: {e}")
+
+    def stop(self):
+        self._stopped.set()
+
+
+class AsyncLeaseHeartbeat:
+    """
+    JobLeaseHeartbeat as a task on the async pipeline's event loop; each
+    extend call runs in a thread, so a slow queue never stalls the loop
+    """
+
+    def __init__(self, extend: Callable[[List[str]], None], interval_seconds: float):
+        self.extend = extend
+        self.interval_seconds = interval_seconds
+        self._jobs: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def track(self, job_id: str):
+        self._jobs.add(job_id)
+
+    def untrack(self, job_id: str):
+        self._jobs.discard(job_id)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run(), name='job-heartbeat')
+
+    def is_alive(self) -> bool:
+        # Not started yet (warm-up) counts as alive, as the thread version starts first
+        return self._task is None or not self._task.done()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            job_ids = sorted(self._jobs)
+            if not job_ids:
+                continue
+            try:
+                await asyncio.to_thread(self.extend, job_ids)
+            except Exception as e:
+                logger.error(f"Failed to extend job leases: {e}")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+class AsyncJobPipeline:
+    """
+    Experimental, enabled with ASYNC_PIPELINE=1.
+
+    Runs a ProctorWorker's jobs on an asyncio event loop so that queue and
+    database I/O overlap the analysis: while one job is analyzed, up to
+    `prefetch_jobs` more are claimed and downloaded, and finished ones are
+    scored, stored and completed. psycopg2 and requests block, so each kind
+    of I/O runs in its own single-thread lane, which also keeps every
+    connection on one thread at a time:
+
+    - queue: claim, complete and release (own connection in direct DB mode)
+    - download: media download and pre-flight (own connection)
+    - db: analysis cache, scoring inputs and persistence (the worker's connection)
+    - analysis: one job's analyzers at a time, in claim order
+
+    Lease heartbeats run on the loop. On shutdown no more jobs are claimed,
+    jobs not yet analyzing are released, and the rest get until the grace
+    deadline before they are cancelled and released.
+    """
+
+    def __init__(self, worker: 'ProctorWorker', prefetch_jobs: int = 1, idle_seconds: float = 5):
+        self.worker = worker
+        self.prefetch_jobs = max(0, prefetch_jobs)
+        self.idle_seconds = idle_seconds
+        self.drain_timed_out = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def _in_lane(self, lane: ThreadPoolExecutor, function, *args):
+        """Run a blocking call in `lane`, in a copy of this context (the job's span and log fields)"""
+        return await asyncio.get_running_loop().run_in_executor(
+            lane, contextvars.copy_context().run, function, *args
+        )
+
+    async def run(self):
+        """Claim and process jobs until the worker's shutdown is requested; returns once drained"""
+        loop = asyncio.get_running_loop()
+        worker = self.worker
+        direct_db = not (worker.worker_api_url and worker.worker_api_token)
+        self._queue_lane = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='queue', initializer=worker.open_lane_connection if direct_db else None
+        )
+        self._download_lane = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='download', initializer=worker.open_lane_connection
+        )
+        self._db_lane = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+        self._analysis_lane = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analyze')
+        # A slot is held from claim until analysis ends: one job analyzing plus the prefetched ones
+        self._slots = asyncio.Semaphore(1 + self.prefetch_jobs)
+        self._analysis_turn = asyncio.Lock()
+        self._stopping = asyncio.Event()
+
+        loop.add_signal_handler(signal.SIGTERM, self._handle_sigterm)
+        # shutdown_requested may also be set from another thread
+        threading.Thread(target=self._watch_shutdown, args=(loop,), name='shutdown-watch', daemon=True).start()
+        worker.heartbeat.start()
+        try:
+            await self._claim_jobs()
+            while self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            # Interrupted: hand back whatever is in flight before the lanes go away
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            raise
+        finally:
+            worker.heartbeat.stop()
+            loop.remove_signal_handler(signal.SIGTERM)
+            for lane in (self._queue_lane, self._download_lane, self._db_lane, self._analysis_lane):
+                lane.shutdown(wait=not self.drain_timed_out, cancel_futures=True)
+
+    def _handle_sigterm(self):
+        worker = self.worker
+        if worker.shutdown_requested.is_set():
+            return
+        logger.info(f"Received SIGTERM, draining (up to {worker.shutdown_grace_seconds:.0f}s)...")
+        worker.shutdown_requested.set()
+        worker.clear_ready()
+        checkpoint = worker.current_checkpoint
+        if checkpoint:
+            checkpoint.save_soon()
+
+    def _watch_shutdown(self, loop: asyncio.AbstractEventLoop):
+        self.worker.shutdown_requested.wait()
+        try:
+            loop.call_soon_threadsafe(self._begin_drain)
+        except RuntimeError:
+            pass  # The loop has already finished
+
+    def _begin_drain(self):
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        asyncio.get_running_loop().call_later(self.worker.shutdown_grace_seconds, self._drain_deadline)
+
+    def _drain_deadline(self):
+        if not self._tasks:
+            return
+        # Out of time: cancelled jobs are handed back; a retry resumes from its checkpoint
+        self.drain_timed_out = True
+        for task in self._tasks:
+            task.cancel()
+
+    async def _claim_jobs(self):
+        while not self._stopping.is_set():
+            await self._slots.acquire()
+            if self._stopping.is_set():
+                self._slots.release()
+                break
+            job = await self._in_lane(self._queue_lane, self.worker.get_next_job)
+            if job is None:
+                self._slots.release()
+                # No jobs available, wait a bit
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.idle_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._run_job(job), name=f"job-{job['id']}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _wait_for_analysis_turn(self) -> bool:
+        """Wait for this job's turn to analyze; False, without the turn, if shutdown comes first"""
+        turn = asyncio.ensure_future(self._analysis_turn.acquire())
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            await asyncio.wait({turn, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopping.cancel()
+            if not turn.done():
+                turn.cancel()
+                try:
+                    await turn
+                except asyncio.CancelledError:
+                    pass
+        acquired = not turn.cancelled()
+        if acquired and self._stopping.is_set():
+            self._analysis_turn.release()
+            return False
+        return acquired
+
+    def _analyze(self, job: Dict, prepared: PreparedJob) -> bool:
+        profiler = self.worker.profiler
+        with profiler.profile_job(job['id'], profiler.should_profile(job)):
+            return self.worker.analyze_job(prepared)
+
+    async def _release(self, job: Dict):
+        await self._in_lane(self._queue_lane, self.worker.release_job, job['id'])
+        JOBS.inc(outcome='released')
+
+    async def _run_job(self, job: Dict):
+        worker = self.worker
+        data = job.get('data') or {}
+        holds_slot = True
+        prepared = None
+        worker.heartbeat.track(job['id'])
+        try:
+            with log_context(job_id=job['id'], attempt_id=data.get('attemptId'), asset_id=data.get('assetId')), \
+                    TRACER.span('job', job_id=job['id'], attempt_id=data.get('attemptId'),
+                                asset_id=data.get('assetId')):
+                logger.info(f"Processing job: {job['id']}")
+                success, error = False, None
+                try:
+                    prepared = await self._in_lane(self._download_lane, worker.prepare_job, job)
+                except MediaRejected as e:
+                    logger.error(f"Job rejected: {job['id']}: {e}")
+                    error = str(e)
+
+                if prepared is not None:
+                    success = await self._in_lane(self._db_lane, worker.lookup_cached_analysis, prepared)
+                    if success and prepared.events is None:
+                        if not await self._wait_for_analysis_turn():
+                            logger.info(f"Shutting down before analysis, releasing job {job['id']}")
+                            await self._release(job)
+                            return
+                        try:
+                            success = await self._in_lane(self._analysis_lane, self._analyze, job, prepared)
+                        finally:
+                            self._analysis_turn.release()
+                    # Analysis is done; let the next job be claimed while this one is stored
+                    self._slots.release()
+                    holds_slot = False
+                    if success:
+                        success = await self._in_lane(self._db_lane, worker.persist_job, prepared)
+
+                with TRACER.span('complete', success=success):
+                    await self._in_lane(self._queue_lane, worker.complete_job, job['id'], success, error, error is None)
+                worker.record_outcome(job, success, error)
+        except asyncio.CancelledError:
+            logger.warning(f"Shutdown deadline reached, releasing job {job['id']}")
+            await self._release(job)
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error in worker loop: {e}")
+        finally:
+            if holds_slot:
+                self._slots.release()
+            worker.heartbeat.untrack(job['id'])
+            if prepared is not None:
+                prepared.close()
+
+
 class ProctorWorker:
     """Main worker class for proctoring analysis"""
     
     def __init__(self, db_params):
+        logger.info(f"Startup phase imports took {IMPORT_SECONDS:.2f}s")
         self.db_params = db_params
-        self.db_connection = psycopg2.connect(**self.db_params)
+        with startup_timer('database'):
+            self._db_connection = psycopg2.connect(**self.db_params)
+        # Threads set up with open_lane_connection use their own connection
+        self._lane = threading.local()
+        self._lane_connections: List[Any] = []
+        self._lane_connections_lock = threading.Lock()
         self.worker_api_url = os.getenv("WORKER_API_URL")
         self.worker_api_token = os.getenv("WORKER_API_TOKEN")
         
-        # Analysis components
-        self.video_analyzer = VideoAnalyzer()
-        self.audio_analyzer = AudioAnalyzer()
-        self.risk_calculator = RiskCalculator()
+        # Analysis components. The analyzers load their models when first used,
+        # or at startup in run() unless ANALYZER_WARMUP=0.
+        self._video_analyzer = None
+        self._audio_analyzer = None
+        self._analyzers_lock = threading.Lock()
+        self.warm_up_analyzers = os.getenv("ANALYZER_WARMUP", "1") != "0"
+        
+        # Readiness: set once warm-up is done, served at /readyz and, with
+        # READY_FILE set, written there for exec probes
+        self.ready = threading.Event()
+        self.ready_file = os.getenv("READY_FILE")
+        self.ready_seconds: Optional[float] = None
+        
+        with startup_timer('caches'):
+            self._init_caches()
+        
+        # Video and audio analysis are independent; run them side by side.
+        # Both spend most of their time in ffmpeg subprocesses and native code.
+        self.analysis_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='analysis')
+        
+        # Experimental: ASYNC_PIPELINE=1 runs jobs on an asyncio event loop,
+        # claiming and downloading up to PREFETCH_JOBS ahead and storing results
+        # while the next job is analyzed; see AsyncJobPipeline. The default is
+        # the one-job-at-a-time loop.
+        self.async_pipeline = os.getenv("ASYNC_PIPELINE") == "1"
+        self.prefetch_jobs = int(os.getenv("PREFETCH_JOBS", "1"))
+        
+        # Lease heartbeats and shutdown draining
+        self.lease_seconds = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+        heartbeat_class = AsyncLeaseHeartbeat if self.async_pipeline else JobLeaseHeartbeat
+        self.heartbeat = heartbeat_class(
+            self.extend_job_leases, float(os.getenv("JOB_HEARTBEAT_SECONDS", "60"))
+        )
+        self._heartbeat_connection = None
+        self.shutdown_grace_seconds = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "25"))
+        self.shutdown_requested = threading.Event()
+        self.current_checkpoint: Optional[AnalysisCheckpointer] = None
+        
+        # Cost-aware claiming. JOB_SIZE_PREFERENCE=small keeps short recordings
+        # from queueing behind long ones; JOB_MIN_BYTES / JOB_MAX_BYTES make
+        # dedicated workers for a size range (the fleet must cover every size).
+        # Jobs waiting longer than JOB_MAX_WAIT_SECONDS are claimed first regardless.
+        self.size_preference = os.getenv("JOB_SIZE_PREFERENCE", "fifo")
+        if self.size_preference not in JOB_SIZE_PREFERENCES:
+            logger.warning(f"Unknown JOB_SIZE_PREFERENCE {self.size_preference!r}; using fifo")
+            self.size_preference = 'fifo'
+        self.min_job_bytes = int(os.environ["JOB_MIN_BYTES"]) if os.getenv("JOB_MIN_BYTES") else None
+        self.max_job_bytes = int(os.environ["JOB_MAX_BYTES"]) if os.getenv("JOB_MAX_BYTES") else None
+        self.max_job_wait_seconds = int(os.getenv("JOB_MAX_WAIT_SECONDS", "1800"))
+        
+        # Opt-in profiling: with PROFILE_DIR set, jobs flagged `profile: true` and
+        # a PROFILE_SAMPLE_RATE fraction of the rest are profiled into it
+        self.profiler = JobProfiler(os.getenv("PROFILE_DIR"), float(os.getenv("PROFILE_SAMPLE_RATE", "0")))
+        
+        # Per-job trace spans, exported as OTLP/JSON lines to TRACE_FILE and/or
+        # to an OTLP/HTTP collector at OTEL_EXPORTER_OTLP_ENDPOINT
+        span_exporters = []
+        if os.getenv("TRACE_FILE"):
+            span_exporters.append(FileSpanExporter(os.environ["TRACE_FILE"]))
+        if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            span_exporters.append(OtlpHttpSpanExporter(os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"]))
+        TRACER.configure(span_exporters, service_name=os.getenv("OTEL_SERVICE_NAME", "proctor-worker"))
         
         if self.worker_api_url and self.worker_api_token:
             logger.info("ProctorWorker initialized with internal queue API")
         else:
             logger.warning("WORKER_API_URL or WORKER_API_TOKEN not set; falling back to direct DB queue access")
     
-    def download_video_from_database(self, asset_id: str, output_path: str) -> bool:
-        """Download video data from database and save to file"""
+    @property
+    def db_connection(self):
+        """The worker's connection, or the calling thread's own if it has one"""
+        connection = getattr(self._lane, 'connection', None)
+        return connection if connection is not None else self._db_connection
+
+    def open_lane_connection(self):
+        """Thread initializer: give the calling thread a database connection of its own"""
+        connection = psycopg2.connect(**self.db_params)
+        self._lane.connection = connection
+        with self._lane_connections_lock:
+            self._lane_connections.append(connection)
+
+    def _init_caches(self):
+        """Risk score, analysis result and checkpoint stores; their tables come from prisma/migrations"""
+        # Re-runs of the same events (retried jobs, re-uploads) reuse the stored score.
+        # RISK_CACHE_PERSIST=1 shares results between workers through the database.
+        risk_store = PostgresRiskResultStore(self.db_connection) if os.getenv("RISK_CACHE_PERSIST") == "1" else None
+        self.risk_calculator = MemoizedRiskCalculator(
+            RiskCalculator(),
+            max_entries=int(os.getenv("RISK_CACHE_SIZE", "1024")),
+            store=risk_store,
+        )
+        
+        # Identical recordings (redelivered jobs, duplicate uploads) reuse earlier
+        # analysis results; ANALYSIS_CACHE=0 turns this off
+        self.analyzer_version = analyzer_version(configured_model_path())
+        self.analysis_cache = None
+        if os.getenv("ANALYSIS_CACHE", "1") != "0":
+            self.analysis_cache = AnalysisResultCache(self.db_connection, self.analyzer_version)
+        
+        # Retried jobs resume from their last analysis checkpoint. Checkpoints go
+        # to CHECKPOINT_DIR when set, otherwise to the database; ANALYSIS_CHECKPOINTS=0
+        # turns this off
+        self.checkpoint_store = None
+        self.checkpoint_interval = float(os.getenv("CHECKPOINT_INTERVAL_SECONDS", "60"))
+        # Checkpoints of jobs that ran out of retries are never cleared by a
+        # success; they are deleted once CHECKPOINT_MAX_AGE_HOURS old
+        self.checkpoint_max_age_seconds = float(os.getenv("CHECKPOINT_MAX_AGE_HOURS", "24")) * 3600
+        self._checkpoints_pruned_at = float('-inf')
+        if os.getenv("ANALYSIS_CHECKPOINTS", "1") != "0":
+            checkpoint_dir = os.getenv("CHECKPOINT_DIR")
+            if checkpoint_dir:
+                self.checkpoint_store = FileCheckpointStore(checkpoint_dir)
+            else:
+                self.checkpoint_store = PostgresCheckpointStore(self.db_params)
+
+    @property
+    def video_analyzer(self):
+        """The VideoAnalyzer, built on first use"""
+        with self._analyzers_lock:
+            if self._video_analyzer is None:
+                with startup_timer('video_imports'):
+                    from analysis.video_analysis import VideoAnalyzer
+                with startup_timer('video_models'):
+                    self._video_analyzer = VideoAnalyzer()
+                # The worker's own OpenCV / torch pools get the whole budget;
+                # slice processes split it (see _init_slice_worker)
+                configure_native_threads(CPU_BUDGET.threads)
+            return self._video_analyzer
+
+    @property
+    def audio_analyzer(self):
+        """The AudioAnalyzer, built on first use"""
+        with self._analyzers_lock:
+            if self._audio_analyzer is None:
+                with startup_timer('audio_imports'):
+                    from analysis.audio_analysis import AudioAnalyzer
+                with startup_timer('audio_models'):
+                    self._audio_analyzer = AudioAnalyzer()
+            return self._audio_analyzer
+
+    def warm_up(self):
+        """
+        Build both analyzers and run each once on synthetic input, so the first
+        job pays neither for loading the models nor for their first-call setup
+        """
+        video_analyzer = self.video_analyzer
+        audio_analyzer = self.audio_analyzer
+        with startup_timer('video_warm_up'):
+            video_analyzer.warm_up()
+        with startup_timer('audio_warm_up'):
+            audio_analyzer.warm_up()
+
+    def mark_ready(self):
+        """Publish readiness: set the event and write READY_FILE if configured"""
+        self.ready_seconds = time.perf_counter() - _IMPORTS_STARTED
+        if self.ready_file:
+            temp_path = f"{self.ready_file}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({
+                    'pid': os.getpid(),
+                    'readyAt': datetime.now(timezone.utc).isoformat(),
+                    'startupSeconds': round(self.ready_seconds, 3),
+                }, f)
+            os.replace(temp_path, self.ready_file)
+        self.ready.set()
+        logger.info(f"Worker ready {self.ready_seconds:.2f}s after start")
+
+    def clear_ready(self):
+        """Withdraw readiness, e.g. when draining for shutdown"""
+        self.ready.clear()
+        if self.ready_file:
+            try:
+                os.remove(self.ready_file)
+            except FileNotFoundError:
+                pass
+    
+    def download_video_from_database(self, asset_id: str, output_path: str) -> Optional[str]:
+        """
+        Stream video data from the database to a file in chunks, hashing it on
+        the way. Returns the SHA-256 hex digest of the bytes, or None on failure.
+        """
         try:
+            digest = hashlib.sha256()
             with self.db_connection.cursor() as cursor:
                 cursor.execute("""
-                    SELECT data FROM "ProctorAsset" WHERE id = %s
+                    SELECT octet_length(data) FROM "ProctorAsset" WHERE id = %s
                 """, (asset_id,))
                 
                 result = cursor.fetchone()
-                if not result or not result['data']:
+                if not result:
                     logger.error(f"No video data found for asset {asset_id}")
-                    return False
+                    return None
+                if not result[0]:
+                    raise MediaRejected(f"empty media for asset {asset_id}")
+                size = result[0]
                 
-                # Write binary data to file
+                # Write binary data to file, one slice of the bytea at a time
                 with open(output_path, 'wb') as f:
-                    f.write(result['data'])
-                
-                logger.info(f"Downloaded video from database: {asset_id} -> {output_path}")
-                return True
+                    for offset in range(0, size, DOWNLOAD_CHUNK_BYTES):
+                        cursor.execute("""
+                            SELECT substring(data FROM %s FOR %s) FROM "ProctorAsset" WHERE id = %s
+                        """, (offset + 1, DOWNLOAD_CHUNK_BYTES, asset_id))
+                        chunk = cursor.fetchone()[0]
+                        BYTES_READ.inc(len(chunk))
+                        digest.update(chunk)
+                        f.write(chunk)
+            self.db_connection.commit()
+            
+            logger.info(f"Downloaded video from database: {asset_id} -> {output_path} ({size} bytes)")
+            return digest.hexdigest()
                 
+        except MediaRejected:
+            self.db_connection.rollback()
+            raise
         except Exception as e:
             logger.error(f"Failed to download video from database: {e}")
-            return False
+            self.db_connection.rollback()
+            return None
     
     def _get_next_job_from_db(self) -> Optional[Dict]:
         """Fetch the next job from pg-boss queue (legacy fallback)"""
         try:
-            with self.db_connection.cursor() as cursor:
+            with self.db_connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
                 # Fetch and claim a job from pgboss.job table
+                # Jobs past the wait limit first, then by asset size per the
+                # configured preference; jobs whose asset is gone sort first
+                # and fail fast
                 cursor.execute("""
                     UPDATE pgboss.job 
                     SET state = 'active', 
                         startedOn = NOW(),
                         retryCount = retryCount + 1
                     WHERE id = (
-                        SELECT id FROM pgboss.job 
-                        WHERE name = 'proctor.analyse' 
-                        AND state = 'created' 
-                        AND (startAfter IS NULL OR startAfter <= NOW())
-                        ORDER BY createdOn ASC 
+                        SELECT j.id FROM pgboss.job j
+                        LEFT JOIN "ProctorAsset" a ON a.id = j.data->>'assetId'
+                        WHERE j.name = 'proctor.analyse' 
+                        AND j.state = 'created' 
+                        AND (j.startAfter IS NULL OR j.startAfter <= NOW())
+                        AND (%(min_bytes)s::bigint IS NULL OR COALESCE(a."fileSize", 0) >= %(min_bytes)s)
+                        AND (%(max_bytes)s::bigint IS NULL OR COALESCE(a."fileSize", 0) <= %(max_bytes)s)
+                        ORDER BY j.createdOn < NOW() - make_interval(secs => %(max_wait)s) DESC,
+                                 CASE WHEN %(preference)s = 'small' THEN a."fileSize" END ASC NULLS FIRST,
+                                 CASE WHEN %(preference)s = 'large' THEN a."fileSize" END DESC NULLS FIRST,
+                                 j.createdOn ASC 
                         LIMIT 1
-                        FOR UPDATE SKIP LOCKED
+                        FOR UPDATE OF j SKIP LOCKED
                     )
                     RETURNING id, data;
-                """)
+                """, {
+                    'min_bytes': self.min_job_bytes,
+                    'max_bytes': self.max_job_bytes,
+                    'max_wait': self.max_job_wait_seconds,
+                    'preference': self.size_preference,
+                })
                 
                 result = cursor.fetchone()
                 if not result:
-                return None
+                    return None
+                
+                self.db_connection.commit()
+                
+                job_data = {
+                    'id': result['id'],
+                    'data': result['data'] if isinstance(result['data'], dict) else json.loads(result['data'])
+                }
+                
+                logger.info(f"Claimed job: {job_data['id']}")
+                return job_data
+                
+        except Exception as e:
+            logger.error(f"Failed to fetch job: {e}")
+            self.db_connection.rollback()
+            return None
 
     def _get_next_job_via_api(self) -> Optional[Dict]:
         """Fetch the next job from internal queue API"""
@@ -116,6 +694,12 @@ class ProctorWorker:
             response = requests.post(
                 f"{self.worker_api_url}/api/internal/queue/claim",
                 headers={"x-worker-token": self.worker_api_token},
+                json={
+                    "sizePreference": self.size_preference,
+                    "minBytes": self.min_job_bytes,
+                    "maxBytes": self.max_job_bytes,
+                    "maxWaitSeconds": self.max_job_wait_seconds,
+                },
                 timeout=10,
             )
             if response.status_code == 204:
@@ -135,27 +719,92 @@ class ProctorWorker:
 
     def get_next_job(self) -> Optional[Dict]:
         """Fetch the next job from pg-boss queue via API when configured"""
+        start = time.perf_counter()
         if self.worker_api_url and self.worker_api_token:
-            return self._get_next_job_via_api()
-        return self._get_next_job_from_db()
-                
-                self.db_connection.commit()
-                
-                job_data = {
-                    'id': result['id'],
-                    'data': result['data'] if isinstance(result['data'], dict) else json.loads(result['data'])
-                }
-                
-                logger.info(f"Claimed job: {job_data['id']}")
-                return job_data
-                
+            job = self._get_next_job_via_api()
+        else:
+            job = self._get_next_job_from_db()
+        QUEUE_CLAIM_SECONDS.observe(time.perf_counter() - start, result='job' if job else 'empty')
+        return job
+    
+    def _extend_leases_in_db(self, job_ids: List[str]):
+        # Runs on the heartbeat thread, so it has its own connection
+        if self._heartbeat_connection is None or self._heartbeat_connection.closed:
+            self._heartbeat_connection = psycopg2.connect(**self.db_params)
+        try:
+            with self._heartbeat_connection.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE pgboss.job
+                    SET expireIn = GREATEST(expireIn, (NOW() - startedOn) + make_interval(secs => %s))
+                    WHERE id = ANY(%s::uuid[]) AND state = 'active'
+                """, (self.lease_seconds, job_ids))
+            self._heartbeat_connection.commit()
+        except Exception:
+            self._heartbeat_connection.rollback()
+            raise
+
+    def _extend_leases_via_api(self, job_ids: List[str]):
+        response = requests.post(
+            f"{self.worker_api_url}/api/internal/queue/heartbeat",
+            headers={"x-worker-token": self.worker_api_token},
+            json={"jobIds": job_ids, "leaseSeconds": self.lease_seconds},
+            timeout=10,
+        )
+        response.raise_for_status()
+
+    def extend_job_leases(self, job_ids: List[str]):
+        """
+        Keep active jobs from expiring for at least `lease_seconds` more; a
+        longer expiry, like the queue's default, is never shortened
+        """
+        if self.worker_api_url and self.worker_api_token:
+            self._extend_leases_via_api(job_ids)
+        else:
+            self._extend_leases_in_db(job_ids)
+        logger.debug(f"Extended leases of {len(job_ids)} jobs by {self.lease_seconds}s")
+
+    def _release_job_in_db(self, job_id: str) -> bool:
+        """Return an active job to the queue (legacy fallback)"""
+        try:
+            with self.db_connection.cursor() as cursor:
+                # Undo the retryCount bump of the claim: this attempt did not fail
+                cursor.execute("""
+                    UPDATE pgboss.job
+                    SET state = 'created', startedOn = NULL, retryCount = GREATEST(retryCount - 1, 0)
+                    WHERE id = %s AND state = 'active'
+                """, (job_id,))
+            self.db_connection.commit()
+            logger.info(f"Job {job_id} released")
+            return True
         except Exception as e:
-            logger.error(f"Failed to fetch job: {e}")
+            logger.error(f"Failed to release job: {e}")
             self.db_connection.rollback()
-            return None
-    
-    def _complete_job_in_db(self, job_id: str, success: bool = True) -> bool:
-        """Mark job as completed or failed (legacy fallback)"""
+            return False
+
+    def _release_job_via_api(self, job_id: str) -> bool:
+        """Return an active job to the queue via internal queue API"""
+        try:
+            response = requests.post(
+                f"{self.worker_api_url}/api/internal/queue/release",
+                headers={"x-worker-token": self.worker_api_token},
+                json={"jobId": job_id},
+                timeout=10,
+            )
+            response.raise_for_status()
+            logger.info(f"Job {job_id} released via API")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to release job via API: {e}")
+            return False
+
+    def release_job(self, job_id: str) -> bool:
+        """Give an unfinished job back to the queue so another worker can take it"""
+        if self.worker_api_url and self.worker_api_token:
+            return self._release_job_via_api(job_id)
+        return self._release_job_in_db(job_id)
+
+    def _complete_job_in_db(self, job_id: str, success: bool = True, error: Optional[str] = None) -> bool:
+        """Mark job as completed or failed (legacy fallback). Failures are final here."""
         try:
             with self.db_connection.cursor() as cursor:
                 if success:
@@ -167,9 +816,9 @@ class ProctorWorker:
                 else:
                     cursor.execute("""
                         UPDATE pgboss.job 
-                        SET state = 'failed', completedOn = NOW()
+                        SET state = 'failed', completedOn = NOW(), output = COALESCE(%s::jsonb, output)
                         WHERE id = %s
-                    """, (job_id,))
+                    """, (json.dumps({'error': error}) if error else None, job_id))
                 
                 self.db_connection.commit()
                 logger.info(f"Job {job_id} marked as {'completed' if success else 'failed'}")
@@ -180,14 +829,20 @@ class ProctorWorker:
             self.db_connection.rollback()
             return False
 
-    def _complete_job_via_api(self, job_id: str, success: bool = True) -> bool:
+    def _complete_job_via_api(self, job_id: str, success: bool = True, error: Optional[str] = None,
+                              retry: bool = True) -> bool:
         """Mark job as completed or failed via internal queue API"""
         try:
             endpoint = "complete" if success else "fail"
+            payload = {"jobId": job_id}
+            if error:
+                payload["error"] = {"error": error}
+            if not success and not retry:
+                payload["retry"] = False
             response = requests.post(
                 f"{self.worker_api_url}/api/internal/queue/{endpoint}",
                 headers={"x-worker-token": self.worker_api_token},
-                json={"jobId": job_id},
+                json=payload,
                 timeout=10,
             )
             response.raise_for_status()
@@ -197,26 +852,70 @@ class ProctorWorker:
             logger.error(f"Failed to update job status via API: {e}")
             return False
 
-    def complete_job(self, job_id: str, success: bool = True) -> bool:
-        """Mark job as completed or failed"""
-        if self.worker_api_url and self.worker_api_token:
-            return self._complete_job_via_api(job_id, success)
-        return self._complete_job_in_db(job_id, success)
+    def complete_job(self, job_id: str, success: bool = True, error: Optional[str] = None,
+                     retry: bool = True) -> bool:
+        """
+        Mark job as completed or failed, recording `error` as the failure
+        reason. With `retry` False a failed job is never retried, e.g. when
+        its media was rejected.
+        """
+        via_api = bool(self.worker_api_url and self.worker_api_token)
+        if via_api:
+            completed = self._complete_job_via_api(job_id, success, error, retry)
+        else:
+            completed = self._complete_job_in_db(job_id, success, error)
+        # Failures are final in direct DB mode; no later attempt resumes from the checkpoints
+        if completed and not success and not (retry and via_api):
+            self.clear_checkpoints(job_id)
+        self.prune_checkpoints()
+        return completed
+
+    def _checkpoint_key(self, job_id: str) -> str:
+        # Keyed by job and analyzer version: never resume with a different model
+        return f"{job_id}.{self.analyzer_version[:16]}"
+
+    def clear_checkpoints(self, job_id: str):
+        """Delete the job's analysis checkpoints"""
+        if self.checkpoint_store is not None:
+            AnalysisCheckpointer(self.checkpoint_store, self._checkpoint_key(job_id)).clear()
+
+    def prune_checkpoints(self):
+        """Delete checkpoints older than checkpoint_max_age_seconds, at most once an hour"""
+        if self.checkpoint_store is None or time.monotonic() - self._checkpoints_pruned_at < 3600:
+            return
+        self._checkpoints_pruned_at = time.monotonic()
+        try:
+            pruned = self.checkpoint_store.prune(self.checkpoint_max_age_seconds)
+            if pruned:
+                logger.info(f"Pruned {pruned} stale analysis checkpoints")
+        except Exception as e:
+            logger.warning(f"Failed to prune analysis checkpoints: {e}")
     
-    def save_proctor_events(self, attempt_id: str, events: List[Dict]) -> bool:
-        """Save detected proctor events to database"""
+    def save_proctor_events(self, attempt_id: str, events: EventBatch, is_public: bool = False) -> bool:
+        """
+        Save detected proctor events to database with one multi-row INSERT,
+        replacing analysis events stored by an earlier run of the same job
+        """
+        table = '"PublicProctorEvent"' if is_public else '"ProctorEvent"'
         try:
+            rows = [
+                (
+                    attempt_id,
+                    events.type_name(row),
+                    datetime.fromtimestamp(events.timestamp(row), tz=timezone.utc).replace(tzinfo=None),
+                    events.extra_json(row)
+                )
+                for row in range(len(events))
+            ]
             with self.db_connection.cursor() as cursor:
-                for event in events:
-                    cursor.execute("""
-                        INSERT INTO "ProctorEvent" (id, "attemptId", type, ts, extra)
-                        VALUES (gen_random_uuid(), %s, %s, %s, %s)
-                    """, (
-                        attempt_id,
-                        event['type'],
-                        datetime.fromtimestamp(event['timestamp']),
-                        json.dumps(event.get('extra', {}))
-                    ))
+                cursor.execute(f"""
+                    DELETE FROM {table}
+                    WHERE "attemptId" = %s AND type = ANY(%s)
+                """, (attempt_id, list(ANALYSIS_EVENT_TYPES)))
+                psycopg2.extras.execute_values(cursor, f"""
+                    INSERT INTO {table} (id, "attemptId", type, ts, extra)
+                    VALUES %s
+                """, rows, template="(gen_random_uuid(), %s, %s, %s, %s)", page_size=1000)
                 
                 self.db_connection.commit()
                 logger.info(f"Saved {len(events)} proctor events for attempt {attempt_id}")
@@ -255,7 +954,7 @@ class ProctorWorker:
 
     def get_test_details(self, attempt_id: str) -> Dict[str, Any]:
         """Fetch test details like question count and duration for risk analysis."""
-        details = {'total_questions': 30, 'duration_minutes': 60, 'is_public': False} # Defaults
+        details = {'total_questions': 30, 'duration_minutes': 60, 'is_public': False, 'started_at': None} # Defaults
 
         try:
             with self.db_connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
@@ -288,6 +987,9 @@ class ProctorWorker:
                 if attempt and attempt['questionCount'] > 0:
                     details['total_questions'] = attempt['questionCount']
 
+                if attempt and attempt['startedAt']:
+                    details['started_at'] = attempt['startedAt']
+
                 if attempt and attempt['startedAt'] and attempt['completedAt']:
                     duration = attempt['completedAt'] - attempt['startedAt']
                     details['duration_minutes'] = max(1, duration.total_seconds() // 60)
@@ -298,106 +1000,477 @@ class ProctorWorker:
 
         return details
     
-    def process_video(self, job_data: Dict) -> bool:
-        """Main video processing pipeline"""
+    def load_browser_events(self, attempt_id: str, is_public: bool) -> EventBatch:
+        """
+        Stream the attempt's stored browser events, in timestamp order, into an
+        EventBatch. Uses the ("attemptId", ts) index; rows are fetched in pages
+        from a server-side cursor.
+        """
+        table = '"PublicProctorEvent"' if is_public else '"ProctorEvent"'
+        events = EventBatch()
+        try:
+            with self.db_connection.cursor(name='browser_events') as cursor:
+                cursor.itersize = 5000
+                cursor.execute(f"""
+                    SELECT type, ts, extra
+                    FROM {table}
+                    WHERE "attemptId" = %s AND type <> ALL(%s)
+                    ORDER BY ts, id
+                """, (attempt_id, list(ANALYSIS_EVENT_TYPES)))
+                for event_type, ts, extra in cursor:
+                    events.append(event_type, ts.replace(tzinfo=timezone.utc).timestamp(),
+                                  extra if isinstance(extra, dict) else None)
+            self.db_connection.commit()
+        except Exception as e:
+            logger.error(f"Failed to load browser events for attempt {attempt_id}: {e}")
+            self.db_connection.rollback()
+            return EventBatch()
+
+        logger.info(f"Loaded {len(events)} browser events for attempt {attempt_id}")
+        return events
+
+    def _timed_analysis(self, name: str, analyze, *args) -> Tuple[EventBatch, float, bool]:
+        """
+        Run one analyzer, isolating failures. Returns (events, seconds,
+        succeeded); an incomplete analysis keeps its events but did not succeed.
+        """
+        start = time.monotonic()
+        try:
+            with TRACER.span(name.lower()), self.profiler.thread_profile():
+                events = analyze(*args)
+            elapsed = time.monotonic() - start
+            logger.info(f"{name} analysis finished in {elapsed:.2f}s with {len(events)} events")
+            STAGE_SECONDS.observe(elapsed, stage=name.lower())
+            EVENTS_EMITTED.inc(len(events), analyzer=name.lower())
+            return events, elapsed, True
+        except AnalysisIncomplete as e:
+            elapsed = time.monotonic() - start
+            logger.error(f"{name} analysis incomplete after {elapsed:.2f}s with {len(e.events)} events: {e}")
+            STAGE_SECONDS.observe(elapsed, stage=name.lower())
+            EVENTS_EMITTED.inc(len(e.events), analyzer=name.lower())
+            return e.events, elapsed, False
+        except Exception as e:
+            elapsed = time.monotonic() - start
+            logger.error(f"{name} analysis failed after {elapsed:.2f}s: {e}")
+            STAGE_SECONDS.observe(elapsed, stage=name.lower())
+            return EventBatch(), elapsed, False
+
+    def run_analyzers(self, video_path: str, frames_dir: str, audio_path: str,
+                      features_path: Optional[str] = None,
+                      features_metadata: Optional[Dict[str, str]] = None,
+                      checkpoint: Optional[AnalysisCheckpointer] = None) -> Tuple[Optional[EventBatch], bool]:
+        """Run video and audio analysis concurrently and merge their events.
+
+        Returns (events, complete). Events are None only when both analyzers
+        fail; otherwise those found, including the partial events of an
+        incomplete analyzer, and `complete` tells whether both succeeded. Per-frame video features are saved to
+        `features_path` when given; both analyzers checkpoint to `checkpoint`.
+        """
+        start = time.monotonic()
+        # Each task runs in a copy of this context, so its spans and log
+        # fields belong to the current job
+        video_future = self.analysis_executor.submit(
+            contextvars.copy_context().run, self._timed_analysis, 'Video', self.video_analyzer.analyze_video, video_path, frames_dir,
+            features_path, features_metadata, checkpoint
+        )
+        audio_future = self.analysis_executor.submit(
+            contextvars.copy_context().run, self._timed_analysis, 'Audio', self.audio_analyzer.analyze_audio, video_path, audio_path, checkpoint
+        )
+        video_events, video_seconds, video_ok = video_future.result()
+        audio_events, audio_seconds, audio_ok = audio_future.result()
+        
+        logger.info(
+            f"Analysis wall time {time.monotonic() - start:.2f}s "
+            f"(video {video_seconds:.2f}s, audio {audio_seconds:.2f}s)"
+        )
+        
+        if not video_ok and not audio_ok:
+            return None, False
+        return EventBatch.concat([video_events, audio_events]), video_ok and audio_ok
+    
+    def _store_cached_features(self, asset_id: str, features: Optional[bytes], metadata: Dict[str, str]):
+        """Write cached frame features to this asset's feature store entry, if configured"""
+        features_path = feature_store_path(asset_id)
+        if not features_path or features is None:
+            return
+        try:
+            frame_features = FrameFeatures.from_bytes(features)
+            frame_features.metadata = dict(metadata)
+            frame_features.save(features_path)
+        except Exception as e:
+            logger.warning(f"Failed to store cached frame features for asset {asset_id}: {e}")
+    
+    def preflight_media(self, asset_id: str, video_path: str):
+        """Probe the downloaded media and log its estimated cost. Raises MediaRejected."""
+        size_bytes = os.path.getsize(video_path)
+        try:
+            probe = probe_media(video_path, size_bytes)
+        except Exception as e:
+            raise MediaRejected(f"unreadable media for asset {asset_id}: {e}")
+        reason = probe.rejection_reason()
+        if reason:
+            raise MediaRejected(f"{reason} for asset {asset_id}")
+        
+        frames = probe.estimated_frames(ANALYSIS_FPS)
+        duration = f"{probe.duration:.0f}s" if probe.duration is not None else "unknown duration"
+        logger.info(
+            f"Pre-flight: asset {asset_id}, {size_bytes} bytes, {duration}, "
+            f"~{frames if frames is not None else '?'} frames to analyze"
+            f"{'' if probe.has_audio else ', no audio stream'}"
+        )
+    
+    def prepare_job(self, job_data: Dict) -> Optional['PreparedJob']:
+        """
+        First stage of a job: download and pre-flight its media into a new
+        temporary directory. Returns None if the job cannot be processed;
+        raises MediaRejected for media that cannot be analyzed.
+        """
         data = job_data['data']
         schema_version = data.get('schemaVersion', PROCTOR_ANALYSIS_JOB_SCHEMA_VERSION)
         if schema_version != PROCTOR_ANALYSIS_JOB_SCHEMA_VERSION:
             logger.error(f"Unsupported job schema version: {schema_version}")
-            return False
-        asset_id = data['assetId']
-        attempt_id = data['attemptId']
-        database_stored = data.get('databaseStored', True)  # Default to database storage
-        
-        logger.info(f"Processing video for attempt {attempt_id}, asset {asset_id}")
+            return None
         
-        # Create temporary directory for processing
-        with tempfile.TemporaryDirectory(prefix='proctor_') as temp_dir:
-            video_path = os.path.join(temp_dir, 'video.webm')
-            
+        prepared = PreparedJob(job_data, tempfile.mkdtemp(prefix='proctor_'))
+        logger.info(f"Processing video for attempt {prepared.attempt_id}, asset {prepared.asset_id}")
+        try:
             # Download video from database
-            if not self.download_video_from_database(asset_id, video_path):
+            with stage_timer('download'):
+                prepared.content_hash = self.download_video_from_database(prepared.asset_id, prepared.video_path)
+            if not prepared.content_hash:
                 logger.error(f"Failed to download video from database")
-                return False
+                prepared.close()
+                return None
             
-            # Extract frames and audio
-            frames_dir = os.path.join(temp_dir, 'frames')
-            audio_path = os.path.join(temp_dir, 'audio.wav')
+            # Pre-flight: read container metadata only, so corrupt or empty
+            # media is rejected before any frame is decoded
+            with stage_timer('probe'):
+                self.preflight_media(prepared.asset_id, prepared.video_path)
             
-            os.makedirs(frames_dir, exist_ok=True)
+            os.makedirs(prepared.frames_dir, exist_ok=True)
+            if self.checkpoint_store is not None and job_data.get('id'):
+                prepared.checkpoint = AnalysisCheckpointer(
+                    self.checkpoint_store, self._checkpoint_key(job_data['id']), self.checkpoint_interval
+                )
+        except BaseException:
+            prepared.close()
+            raise
+        return prepared
+    
+    def lookup_cached_analysis(self, prepared: 'PreparedJob') -> bool:
+        """Take the events of an earlier analysis of identical content, if cached. False on error."""
+        try:
+            cached = self.analysis_cache.get(prepared.content_hash) if self.analysis_cache else None
+            if cached is not None:
+                logger.info(
+                    f"Reusing analysis of identical content {prepared.content_hash[:12]} for asset {prepared.asset_id}"
+                )
+                prepared.events = cached.events
+                prepared.cached = True
+                self._store_cached_features(prepared.asset_id, cached.features, prepared.features_metadata)
+            return True
+        except Exception as e:
+            logger.error(f"Error during video analysis: {e}")
+            return False
+    
+    def analyze_job(self, prepared: 'PreparedJob') -> bool:
+        """Run the analyzers unless cached events were found. False if both analyzers fail."""
+        if prepared.events is not None:
+            return True
+        self.current_checkpoint = prepared.checkpoint
+        try:
+            events, prepared.complete = self.run_analyzers(
+                prepared.video_path, prepared.frames_dir, prepared.audio_path,
+                features_path=prepared.features_path,
+                features_metadata=prepared.features_metadata,
+                checkpoint=prepared.checkpoint,
+            )
+            if events is None:
+                logger.error(f"Both video and audio analysis failed for attempt {prepared.attempt_id}")
+                return False
+            prepared.events = events
+            return True
+        except Exception as e:
+            logger.error(f"Error during video analysis: {e}")
+            return False
+        finally:
+            self.current_checkpoint = None
+    
+    def cache_analysis(self, prepared: 'PreparedJob'):
+        """
+        Store the job's analysis results for identical content. Only results
+        both analyzers completed are cached, so a retry can still complete
+        partial ones.
+        """
+        if not prepared.complete or prepared.cached or not self.analysis_cache:
+            return
+        features = None
+        if os.path.exists(prepared.features_path):
+            with open(prepared.features_path, 'rb') as f:
+                features = f.read()
+        self.analysis_cache.put(prepared.content_hash, prepared.events, features)
+    
+    def persist_job(self, prepared: 'PreparedJob') -> bool:
+        """
+        Last stage of a job: cache complete analysis results, score the
+        analysis events together with the attempt's browser events and store
+        events and score. False on error.
+        """
+        attempt_id = prepared.attempt_id
+        all_events = prepared.events
+        try:
+            self.cache_analysis(prepared)
             
-            # Process video
-            try:
-                video_events = self.video_analyzer.analyze_video(video_path, frames_dir)
-                audio_events = self.audio_analyzer.analyze_audio(video_path, audio_path)
-                
-                # Combine all events
-                all_events = video_events + audio_events
-                
+            with stage_timer('load_events'):
                 # Get test context for the risk calculator
                 test_details = self.get_test_details(attempt_id)
 
-                # Calculate risk score
+                # Analysis timestamps are seconds into the recording; put them on
+                # the browser clock (UTC epoch seconds), starting at the attempt start
+                browser_events = self.load_browser_events(attempt_id, test_details['is_public'])
+            all_events.shift_to_attempt_clock(test_details['started_at'], browser_events)
+
+            # Score browser and analysis events together, in timestamp order
+            merged_events = EventBatch.concat([browser_events, all_events])
+            merged_events = merged_events.take(merged_events.time_order())
+
+            # Calculate risk score
+            with stage_timer('score'):
                 risk_data = self.risk_calculator.calculate_risk_score(
-                    all_events,
+                    merged_events,
                     test_duration_minutes=test_details['duration_minutes'],
                     total_questions=test_details['total_questions']
                 )
 
+            with stage_timer('persist'):
                 # Save events to database
                 if all_events:
-                    self.save_proctor_events(attempt_id, all_events)
+                    self.save_proctor_events(attempt_id, all_events, test_details['is_public'])
 
                 # Update risk score and breakdown
                 self.update_risk_score_and_breakdown(attempt_id, test_details['is_public'], risk_data)
 
-                risk_score = risk_data.get('total_score', 0)
-                logger.info(f"Analysis complete for attempt {attempt_id}. Risk Score: {risk_score:.2f}")
-                return True
-                
-            except Exception as e:
-                logger.error(f"Error during video analysis: {e}")
-                return False
+            risk_score = risk_data.get('total_score', 0)
+            logger.info(f"Analysis complete for attempt {attempt_id}. Risk Score: {risk_score:.2f}")
+            cache_stats = self.risk_calculator.stats()
+            logger.info(
+                f"Risk cache: {cache_stats['hits']} hits, {cache_stats['store_hits']} store hits, "
+                f"{cache_stats['misses']} misses (hit rate {cache_stats['hit_rate']:.1%})"
+            )
+            
+            # Results are persisted; a redelivery of this job has nothing to resume
+            if prepared.checkpoint:
+                prepared.checkpoint.clear()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error during video analysis: {e}")
+            return False
     
+    def process_video(self, job_data: Dict) -> bool:
+        """Main video processing pipeline. Raises MediaRejected for media that cannot be analyzed."""
+        prepared = self.prepare_job(job_data)
+        if prepared is None:
+            return False
+        try:
+            return (
+                self.lookup_cached_analysis(prepared)
+                and self.analyze_job(prepared)
+                and self.persist_job(prepared)
+            )
+        finally:
+            prepared.close()
+    
+    def _handle_sigterm(self, signum, frame):
+        """Stop claiming jobs; give in-flight work until the grace deadline"""
+        if self.shutdown_requested.is_set():
+            return
+        logger.info(f"Received SIGTERM, draining (up to {self.shutdown_grace_seconds:.0f}s)...")
+        self.shutdown_requested.set()
+        self.clear_ready()
+        checkpoint = self.current_checkpoint
+        if checkpoint:
+            checkpoint.save_soon()
+        signal.setitimer(signal.ITIMER_REAL, self.shutdown_grace_seconds)
+
+    def _handle_drain_deadline(self, signum, frame):
+        raise JobDrainTimeout()
+
+    def handle_job(self, job: Dict):
+        """Process one claimed job and report its outcome to the queue"""
+        logger.info(f"Processing job: {job['id']}")
+        error = None
+        try:
+            # Process the video
+            with self.profiler.profile_job(job['id'], self.profiler.should_profile(job)):
+                success = self.process_video(job)
+        except MediaRejected as e:
+            logger.error(f"Job rejected: {job['id']}: {e}")
+            success, error = False, str(e)
+        
+        # Mark job as completed or failed
+        with TRACER.span('complete', success=success):
+            # Only rejected media sets an error; another attempt would be rejected again
+            self.complete_job(job['id'], success, error=error, retry=error is None)
+        self.record_outcome(job, success, error)
+
+    def record_outcome(self, job: Dict, success: bool, error: Optional[str]):
+        JOBS.inc(outcome='completed' if success else 'rejected' if error else 'failed')
+        if success:
+            logger.info(f"Job completed successfully: {job['id']}")
+        else:
+            logger.error(f"Job failed: {job['id']}")
+
+    def health_check(self) -> Tuple[bool, Dict[str, Any]]:
+        """Liveness for /healthz: the worker loop is running and its DB connection is open"""
+        details = {
+            'shuttingDown': self.shutdown_requested.is_set(),
+            'heartbeat': self.heartbeat.is_alive(),
+            'database': not self.db_connection.closed,
+        }
+        return details['heartbeat'] and details['database'], details
+
+    def readiness_check(self) -> Tuple[bool, Dict[str, Any]]:
+        """Readiness for /readyz: warmed up, not draining, and the DB connection is open"""
+        details = {
+            'ready': self.ready.is_set(),
+            'shuttingDown': self.shutdown_requested.is_set(),
+            'database': not self.db_connection.closed,
+            'startupSeconds': self.ready_seconds,
+        }
+        return details['ready'] and not details['shuttingDown'] and details['database'], details
+
     def run(self):
         """Main worker loop"""
         logger.info("Starting ProctorWorker (PostgreSQL mode)...")
         
-        while True:
+        signal.signal(signal.SIGTERM, self._handle_sigterm)
+        signal.signal(signal.SIGALRM, self._handle_drain_deadline)
+        if not self.async_pipeline:
+            self.heartbeat.start()
+        
+        # /metrics, /healthz and /readyz; METRICS_PORT=0 turns the endpoint off
+        metrics_server = None
+        metrics_port = int(os.getenv("METRICS_PORT", "9100"))
+        if metrics_port:
+            try:
+                metrics_server = MetricsServer(
+                    metrics_port, self.health_check, host=os.getenv("METRICS_HOST", "0.0.0.0"),
+                    readiness_check=self.readiness_check,
+                )
+                metrics_server.start()
+            except OSError as e:
+                logger.error(f"Failed to start metrics endpoint on port {metrics_port}: {e}")
+
+        # Load and exercise the models before claiming, so no job waits on them.
+        # /healthz is already up, so the container counts as live meanwhile,
+        # but /readyz and READY_FILE only report ready once this is done. A
+        # failure here propagates: a worker that cannot run its models exits.
+        if self.warm_up_analyzers:
+            self.warm_up()
+        logger.info(f"Native threads: {json.dumps(thread_report())}")
+        self.mark_ready()
+
+        try:
+            if self.async_pipeline:
+                drain_timed_out = self._run_pipeline()
+            else:
+                drain_timed_out = self._run_jobs()
+        except JobDrainTimeout:
+            # The deadline passed after the last job was finished or released
+            drain_timed_out = False
+        finally:
+            # Disarm the drain deadline before cleanup: JobDrainTimeout is a
+            # BaseException and would abort it
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        
+        # Cleanup
+        self.clear_ready()
+        self.heartbeat.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        self.analysis_executor.shutdown(wait=not drain_timed_out, cancel_futures=True)
+        if self._video_analyzer is not None:
+            self._video_analyzer.close()
+        self._db_connection.close()
+        for connection in self._lane_connections:
+            connection.close()
+        if self._heartbeat_connection is not None:
+            self._heartbeat_connection.close()
+        logger.info("ProctorWorker shutdown complete")
+        
+        if drain_timed_out:
+            # Abandoned analysis threads would otherwise keep the process alive
+            logging.shutdown()
+            os._exit(0)
+
+    def _run_pipeline(self) -> bool:
+        """Process jobs with the async pipeline until shutdown. True if the drain deadline passed."""
+        logger.info(f"Running the experimental async job pipeline, prefetching up to {self.prefetch_jobs} jobs")
+        pipeline = AsyncJobPipeline(self, prefetch_jobs=self.prefetch_jobs)
+        try:
+            asyncio.run(pipeline.run())
+        except KeyboardInterrupt:
+            logger.info("Received interrupt signal, shutting down...")
+        return pipeline.drain_timed_out
+
+    def _run_jobs(self) -> bool:
+        """Claim and process one job at a time until shutdown. True if the drain deadline passed."""
+        drain_timed_out = False
+        while not self.shutdown_requested.is_set():
+            job = None
             try:
-                # Check for new jobs
-                job = self.get_next_job()
+                # One trace per claimed job: claim -> download -> ... -> complete
+                with TRACER.span('job') as job_span:
+                    # Check for new jobs
+                    with TRACER.span('claim'):
+                        job = self.get_next_job()
+                    
+                    if job is None:
+                        job_span.discard()
+                    else:
+                        data = job.get('data') or {}
+                        job_span.set_attributes(
+                            job_id=job['id'], attempt_id=data.get('attemptId'), asset_id=data.get('assetId')
+                        )
+                        with log_context(job_id=job['id'], attempt_id=data.get('attemptId'),
+                                         asset_id=data.get('assetId')):
+                            self.heartbeat.track(job['id'])
+                            self.handle_job(job)
                 
                 if job is None:
                     # No jobs available, wait a bit
-                    time.sleep(5)
+                    self.shutdown_requested.wait(5)
                     continue
-                
-                logger.info(f"Processing job: {job['id']}")
-                
-                # Process the video
-                success = self.process_video(job)
-                
-                # Mark job as completed or failed
-                self.complete_job(job['id'], success)
-                
-                if success:
-                    logger.info(f"Job completed successfully: {job['id']}")
-                else:
-                    logger.error(f"Job failed: {job['id']}")
                     
+            except JobDrainTimeout:
+                # Out of time: hand the job back; a retry resumes from its checkpoint
+                drain_timed_out = True
+                if job is not None:
+                    logger.warning(f"Shutdown deadline reached, releasing job {job['id']}")
+                    self.release_job(job['id'])
+                    JOBS.inc(outcome='released')
+                break
             except KeyboardInterrupt:
                 logger.info("Received interrupt signal, shutting down...")
+                if job is not None:
+                    self.release_job(job['id'])
+                    JOBS.inc(outcome='released')
                 break
             except Exception as e:
                 logger.error(f"Unexpected error in worker loop: {e}")
-                time.sleep(10)  # Wait before retrying
+                self.shutdown_requested.wait(10)  # Wait before retrying
                 continue
-        
-        # Cleanup
-        self.db_connection.close()
-        logger.info("ProctorWorker shutdown complete")
+            finally:
+                if job is not None:
+                    self.heartbeat.untrack(job['id'])
+        return drain_timed_out
 
 if __name__ == '__main__':
-    worker = ProctorWorker()
-    worker.run() 
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        logger.error("DATABASE_URL is not set")
+        sys.exit(1)
+    worker = ProctorWorker(psycopg2.extensions.parse_dsn(database_url))
+    worker.run()
+ 